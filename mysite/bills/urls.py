@@ -4,4 +4,7 @@ from . import views
 
 urlpatterns = [
     path('', views.IndexView.as_view(), name='billindex'),
+    path('timeline/', views.timeline, name='timeline'),
+    path('funnel/<str:dimension>/<str:value>/', views.funnel, name='funnel'),
+    path('<int:congress>/<str:title>/', views.view, name='billview'),
 ]
@@ -1,4 +1,8 @@
+from datetime import datetime
+
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.template import loader
 from django.views.generic import TemplateView, ListView
 
 # Create your views here.
@@ -9,12 +13,140 @@ if '/Users/hunterheidenreich/git/democracy-now/tools/us/federal/house' not in sy
     sys.path.append('/Users/hunterheidenreich/git/democracy-now/tools/us/federal/house')
 
 
-from house import HOUSE
+from image import current_image
+from timeline import next_cursor
+
+from mysite.executor import run_coalesced
+
+# Timeline events per page, by default and at most
+TIMELINE_LIMIT = 100
+TIMELINE_MAX_LIMIT = 1000
+
+# Served while no corpus image has been written
+NO_IMAGE = 'The corpus image has not been written yet; run tools/us/federal/house/image.py.'
 
 
 class IndexView(ListView):
     template_name = 'bills/index.html'
     context_object_name = 'bills'
 
+    def get(self, request, *args, **kwargs):
+        try:
+            return super().get(request, *args, **kwargs)
+        except FileNotFoundError:
+            return HttpResponse(NO_IMAGE, status=503)
+
     def get_queryset(self):
-        return HOUSE._bills
+        return list(current_image().records('bills'))
+
+
+def view(request, congress, title):
+    template = loader.get_template('bills/view.html')
+    try:
+        image = current_image()
+    except FileNotFoundError:
+        return HttpResponse(NO_IMAGE, status=503)
+    ids = image.lookup('bills', 'title', [congress, title.replace(' ', '.').lower()])
+    if len(ids):
+        bill = image.record('bills', ids[0])
+        context = {
+            'bill': bill,
+            'similar': bill['similar'],
+            'related': bill['related'],
+        }
+        return HttpResponse(template.render(context, request))
+    else:
+        return HttpResponse(template.render({}, request))
+
+
+def _timeline(image, start, end, types, chamber, bill, limit, after):
+    """
+    Gets a page of timeline events as a JSON-able payload,
+    with the cursor of the next page (None after the last)
+    """
+    # One more than asked for, to tell whether there's a next page
+    events = image.timeline(start, end, types, chamber, bill, limit + 1, after)
+    more = len(events) > limit
+    events = events[:limit]
+
+    cursor = None
+    if more:
+        cursor = '{!r}:{}'.format(*next_cursor(events, after))
+    return {'res': events, 'next': cursor}
+
+
+async def timeline(request):
+    """
+    Events between ?start= and ?end= (YYYY-MM-DD), optionally
+    filtered by ?type= (repeatable), ?chamber= and ?bill= (bill key).
+    Returns ?limit= events (at most TIMELINE_MAX_LIMIT) and the 'next'
+    cursor, which is passed back as ?cursor= for the following page.
+    """
+    def date(s):
+        return datetime.strptime(s, '%Y-%m-%d').timestamp() if s else None
+
+    try:
+        start = date(request.GET.get('start'))
+        end = date(request.GET.get('end'))
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+
+    try:
+        limit = min(int(request.GET.get('limit', TIMELINE_LIMIT)), TIMELINE_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'Limit must be a number'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'Limit must be positive'}, status=400)
+
+    after = None
+    if request.GET.get('cursor'):
+        try:
+            t, n = request.GET['cursor'].rsplit(':', 1)
+            after = (float(t), int(n))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    if end is not None:
+        # Include the whole end day
+        end += 24 * 60 * 60 - 1
+
+    types = tuple(sorted(request.GET.getlist('type'))) or None
+    chamber = request.GET.get('chamber')
+    bill = request.GET.get('bill')
+
+    try:
+        image = current_image()
+    except FileNotFoundError:
+        return JsonResponse({'error': NO_IMAGE}, status=503)
+    res = await run_coalesced(('timeline', image.version, start, end, types, chamber, bill, limit, after),
+                              _timeline, image, start, end, types, chamber, bill, limit, after)
+    return JsonResponse(res)
+
+
+def _funnel(image, dimension, value):
+    """
+    Gets the progress funnel of a group, or an error payload
+    """
+    try:
+        return image.funnel(dimension, value)
+    except ValueError as e:
+        return {'error': str(e)}
+
+
+async def funnel(request, dimension, value):
+    """
+    The progress funnel of the bills of a congress, subject,
+    sponsor party or committee
+    """
+    if dimension == 'congress':
+        try:
+            value = int(value)
+        except ValueError:
+            return JsonResponse({'error': 'Congress must be a number'}, status=400)
+
+    try:
+        image = current_image()
+    except FileNotFoundError:
+        return JsonResponse({'error': NO_IMAGE}, status=503)
+    res = await run_coalesced(('funnel', image.version, dimension, value),
+                              _funnel, image, dimension, value)
+    return JsonResponse(res, status=400 if 'error' in res else 200)
@@ -0,0 +1,99 @@
+"""
+A small load tester for the data endpoints.
+
+Start the site under an ASGI server, e.g.
+
+    uvicorn mysite.asgi:application --port 8000
+
+and then fire concurrent requests at it:
+
+    python loadtest.py /reps/Dwight%20Evans/data/count/sponsor_subj/ -c 64 -n 2000
+
+Latency percentiles are reported so the tail can be compared
+across server configurations.
+"""
+
+import argparse
+import asyncio
+import time
+
+
+async def fetch(host, port, path):
+    """
+    Issues a single HTTP/1.0 GET and reads the full response
+
+    :param host: The host to connect to - str
+    :param port: The port to connect to - int
+    :param path: The path to request - str
+    :return: The status code and the elapsed seconds
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write('GET {} HTTP/1.0\r\nHost: {}\r\n\r\n'.format(path, host).encode())
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    status = int(data.split(b' ', 2)[1]) if data else 0
+    return status, time.perf_counter() - start
+
+
+async def run(host, port, path, concurrency, total):
+    """
+    Runs the load test
+
+    :param host: The host to connect to - str
+    :param port: The port to connect to - int
+    :param path: The path to request - str
+    :param concurrency: The number of requests in flight - int
+    :param total: The total number of requests - int
+    :return: The latencies and the number of failed requests
+    """
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            try:
+                status, elapsed = await fetch(host, port, path)
+            except OSError:
+                errors += 1
+                continue
+            if status != 200:
+                errors += 1
+            latencies.append(elapsed)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors
+
+
+def percentile(values, pct):
+    """
+    Returns the pct-th percentile of an already sorted list
+    """
+    if not values:
+        return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test a data endpoint')
+    parser.add_argument('path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('-c', '--concurrency', type=int, default=32)
+    parser.add_argument('-n', '--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    lat, errs = asyncio.run(run(args.host, args.port, args.path,
+                                args.concurrency, args.requests))
+    wall = time.perf_counter() - start
+    lat.sort()
+
+    print('Requests: {} ({} errors) in {:.2f}s -> {:.1f} req/s'.format(
+        len(lat), errs, wall, len(lat) / wall if wall else 0.0))
+    for p in (50, 90, 99, 99.9):
+        print('p{:<5} {:8.1f} ms'.format(p, percentile(lat, p) * 1000))
@@ -0,0 +1,46 @@
+"""
+Bounded executor for the async data endpoints.
+
+Corpus searches and aggregates are CPU-bound and touch the shared
+in-memory house, so they are pushed onto a small thread pool rather
+than run on the event loop.  Concurrent requests for the same
+computation are coalesced onto a single future.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = int(os.environ.get('DATA_EXECUTOR_WORKERS', 4))
+
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                              thread_name_prefix='data-executor')
+
+# key -> future of the computation currently running for that key
+_in_flight = {}
+
+
+async def run_coalesced(key, func, *args):
+    """
+    Runs func(*args) on the bounded executor, sharing the result
+    with any other caller awaiting the same key at the same time.
+
+    :param key: A hashable identifying the computation
+    :param func: The (blocking) function to run
+    :param args: Positional arguments for func
+    :return: The result of func(*args)
+    """
+    future = _in_flight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(EXECUTOR, func, *args)
+        _in_flight[key] = future
+
+        def _release(done, key=key):
+            if _in_flight.get(key) is done:
+                del _in_flight[key]
+
+        future.add_done_callback(_release)
+
+    # Shield so one client disconnecting doesn't cancel the shared work
+    return await asyncio.shield(future)
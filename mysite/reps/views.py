@@ -6,96 +6,136 @@ from collections import Counter
 
 import sys
 
+import us
+
 if 'tools/us/federal/house' not in sys.path:
     sys.path.append('tools/us/federal/house')
 
-from house import HOUSE
+from image import current_image
+from representative import name_matches
+
+from mysite.executor import run_coalesced
+
+# Served while no corpus image has been written
+NO_IMAGE = 'The corpus image has not been written yet; run tools/us/federal/house/image.py.'
+
+# Rep titles by chamber
+TITLES = {
+    'House': 'Representative',
+    'Senate': 'Senator'
+}
 
 
 class IndexView(ListView):
     template_name = 'reps/index.html'
     context_object_name = 'rep_list'
 
+    def get(self, request, *args, **kwargs):
+        try:
+            return super().get(request, *args, **kwargs)
+        except FileNotFoundError:
+            return HttpResponse(NO_IMAGE, status=503)
+
     def get_queryset(self):
-        reps = set(HOUSE._reps)
+        image = current_image()
 
         active = self.request.GET.get('active')
-        if active:
-            reps &= HOUSE.search('reps', 'active', bool(active))
-        else:
-            reps &= HOUSE.search('reps', 'active', True)
-
-        name = self.request.GET.get('name')
-        if name:
-            reps &= HOUSE.search('reps', 'name', name)
-
-        chamber = self.request.GET.get('chamberOpt')
-        if chamber and chamber != 'Both':
-            reps &= HOUSE.search('reps', 'chamber', chamber)
+        ids = set(image.lookup('reps', 'active', bool(active) if active else True))
 
         party = self.request.GET.get('party')
         if party and party != 'All':
-            reps &= HOUSE.search('reps', 'party', party)
+            ids &= set(image.lookup('reps', 'party', party))
 
         state = self.request.GET.get('state')
         if state and state != 'All':
-            reps &= HOUSE.search('reps', 'state', state)
+            ids &= set(image.lookup('reps', 'state', us.states.lookup(state).name))
+
+        reps = [image.record('reps', i) for i in sorted(ids)]
+
+        name = self.request.GET.get('name')
+        if name:
+            reps = [r for r in reps if name_matches(name, r['name'])]
+
+        chamber = self.request.GET.get('chamberOpt')
+        if chamber and chamber != 'Both':
+            reps = [r for r in reps if r['title'] == TITLES.get(chamber)]
 
         return reps
 
 
 def view(request, name):
     template = loader.get_template('reps/view.html')
-    rep = list(HOUSE.search('reps', 'name', name))
+    try:
+        image = current_image()
+    except FileNotFoundError:
+        return HttpResponse(NO_IMAGE, status=503)
+    rep = next((r for r in image.records('reps') if name_matches(name, r['name'])), None)
     if rep:
-        rep = rep[0]
-
-        sponsored = HOUSE.search('reps', 'sponsor', rep.sources['url'])
-        sponsored_now = [b for b in sponsored if b.search('congress', 116)]
-
-        cosponsor = HOUSE.search('reps', 'cosponsor', rep.sources['url'])
-        cosponsor &= HOUSE.search('bills', 'congress', 116)
-        cosponsor = sorted(cosponsor,
-                           key=lambda bill: bill.get_overview()['sponsor']['date'],
+        sponsored = [image.record('bills', i)
+                     for i in image.lookup('bills', 'sponsor url', rep['url'])]
+        sponsored_now = [b for b in sponsored if b['congress'] == 116]
+
+        cosponsor = set(image.lookup('bills', 'cosponsor url', rep['url']))
+        cosponsor &= set(image.lookup('bills', 'congress', 116))
+        cosponsor = sorted([image.record('bills', i) for i in cosponsor],
+                           key=lambda bill: bill['sponsor']['date'],
                            reverse=True)
 
+        voting = None
+        if rep['state']:
+            matrix = image.vote_matrix(116)
+            row = matrix.find(rep['name'], us.states.lookup(rep['state']).abbr, rep['id'])
+            if row is not None:
+                voting = matrix.stats(row)
+
         context = {
             'rep': rep,
             'sponsored': sponsored,
             'sponsored now': sponsored_now,
             'cosponsor': cosponsor,
+            'voting': voting,
         }
         return HttpResponse(template.render(context, request))
     else:
         return HttpResponse(template.render({}, request))
 
 
-def count_data(request, name, data):
-    rep = list(HOUSE.search('reps', 'name', name))
+def _count_data(image, name, data):
+    """
+    Counts the subjects of the bills a rep (co)sponsored
+
+    :param image: The corpus image to count from
+    :param name: The name of the rep
+    :param data: The type of count requested
+    :return: The response payload as a dict
+    """
+    rep = next((r for r in image.records('reps') if name_matches(name, r['name'])), None)
     res = {}
     if rep:
-        rep = rep[0]
-        if data == 'sponsor_subj':
-            sponsor = HOUSE.search('reps', 'sponsor', rep.sources['url'])
-            cnt = Counter([bill.subjects['main']['title'] for bill in sponsor if 'main' in bill.subjects])
-            cnt = sorted([{'label': k, 'value': v} for k, v in cnt.items()],
-                         key=lambda x: x['value'], reverse=True)
-            res['res'] = cnt
-        elif data == 'sponsor_subj_now':
-            sponsor = HOUSE.search('reps', 'sponsor', rep.sources['url'])
-            sponsor = [b for b in sponsor if b.search('congress', 116)]
-            cnt = Counter(
-                [bill.subjects['main']['title'] for bill in sponsor if
-                 'main' in bill.subjects])
-            cnt = sorted([{'label': k, 'value': v} for k, v in cnt.items()],
-                         key=lambda x: x['value'], reverse=True)
-            res['res'] = cnt
+        if data in ('sponsor_subj', 'sponsor_subj_now'):
+            bills = [image.record('bills', i)
+                     for i in image.lookup('bills', 'sponsor url', rep['url'])]
+            if data == 'sponsor_subj_now':
+                bills = [b for b in bills if b['congress'] == 116]
         elif data == 'cosponsor_subj':
-            cosp = HOUSE.search('reps', 'cosponsor', rep.sources['url'])
-            cnt = Counter([bill.subjects['main']['title'] for bill in cosp if 'main' in bill.subjects])
-            cnt = sorted([{'label': k, 'value': v} for k, v in cnt.items()],
-                         key=lambda x: x['value'], reverse=True)
-            res['res'] = cnt
+            bills = [image.record('bills', i)
+                     for i in image.lookup('bills', 'cosponsor url', rep['url'])]
+        else:
+            return res
 
-    return JsonResponse(res)
+        cnt = Counter([bill['subject'] for bill in bills if bill['subject']])
+        cnt = sorted([{'label': k, 'value': v} for k, v in cnt.items()],
+                     key=lambda x: x['value'], reverse=True)
+        res['res'] = cnt
 
+    return res
+
+
+async def count_data(request, name, data):
+    try:
+        image = current_image()
+    except FileNotFoundError:
+        return JsonResponse({'error': NO_IMAGE}, status=503)
+    res = await run_coalesced(('count', image.version, name, data),
+                              _count_data, image, name, data)
+    return JsonResponse(res)
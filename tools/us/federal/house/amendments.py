@@ -0,0 +1,179 @@
+import re
+from collections import defaultdict
+
+from resolver import url_member_id
+from persist import write_json
+
+# Latest action text -> status, first match wins
+STATUSES = [
+    (re.compile(r'Not Agreed to|Failed', re.I), 'failed'),
+    (re.compile(r'Agreed to', re.I), 'agreed'),
+    (re.compile(r'Withdrawn', re.I), 'withdrawn'),
+    (re.compile(r'Fell when|ruled out of order|point of order', re.I), 'fell'),
+]
+
+KEYS = ('sponsor', 'bill', 'congress', 'status')
+
+
+def amendment_status(latest_action):
+    """
+    Classifies an amendment's latest action
+
+    :param latest_action: str
+    :return: 'agreed', 'failed', 'withdrawn', 'fell' or 'pending'
+    """
+    for pattern, status in STATUSES:
+        if pattern.search(latest_action or ''):
+            return status
+    return 'pending'
+
+
+def _amendments(bill):
+    """
+    The amendment records of a bill
+    """
+    records = []
+    for a in bill._amendments:
+        if not a['amendment']:
+            continue
+        sponsor = a['sponsor'] or {}
+        records.append({
+            'url': a['amendment']['url'],
+            'title': a['amendment']['title'],
+            'bill': bill.get_key(),
+            'congress': bill.get_congress(),
+            'sponsor': {
+                'name': sponsor.get('name'),
+                'url': sponsor.get('url'),
+                'id': url_member_id(sponsor['url']) if sponsor.get('url') else None
+            },
+            'purpose': a['purpose'],
+            'description': a['description'],
+            'committees': a['committees'],
+            'latest_action': a['latest_action'],
+            'status': amendment_status(a['latest_action'])
+        })
+    return records
+
+
+class AmendmentIndex:
+
+    """
+    Every amendment of the loaded bills, keyed by (bill key, amendment URL),
+    as bills can list the same amendment, and indexed by sponsor ID,
+    bill key, congress and status
+    """
+
+    def __init__(self):
+        # (bill key, amendment URL) -> record
+        self._amendments = {}
+
+        # Index key -> value -> set of (bill key, amendment URL)
+        self._index = {k: defaultdict(set) for k in KEYS}
+
+        # Bill -> the (bill key, amendment URL) it contributed
+        self._contributed = {}
+
+        # (bill key, amendment URL) -> the number of loaded bills listing it,
+        # as a bill and its replacement can both be held for a while
+        self._refs = defaultdict(int)
+
+    def __contains__(self, bill):
+        return bill in self._contributed
+
+    def __iter__(self):
+        return iter(list(self._contributed))
+
+    def __len__(self):
+        return len(self._amendments)
+
+    @staticmethod
+    def _key(record):
+        return record['bill'] or '', record['url']
+
+    @staticmethod
+    def _values(record):
+        return {
+            'sponsor': record['sponsor']['id'],
+            'bill': record['bill'],
+            'congress': record['congress'],
+            'status': record['status']
+        }
+
+    def add(self, bill):
+        """
+        Adds the amendments of a bill
+        """
+        self.remove(bill)
+        keys = []
+        for record in _amendments(bill):
+            key = self._key(record)
+            old = self._amendments.get(key)
+            if old:
+                self._unindex(old)
+            self._amendments[key] = record
+            for k, v in self._values(record).items():
+                self._index[k][v].add(key)
+            if key not in keys:
+                keys.append(key)
+                self._refs[key] += 1
+        self._contributed[bill] = keys
+
+    def _unindex(self, record):
+        key = self._key(record)
+        for k, v in self._values(record).items():
+            self._index[k][v].discard(key)
+
+    def remove(self, bill):
+        """
+        Removes the amendments of a bill
+        """
+        for key in self._contributed.pop(bill, []):
+            self._refs[key] -= 1
+            # Kept while another copy of the bill still lists it
+            if not self._refs[key]:
+                del self._refs[key]
+                self._unindex(self._amendments.pop(key))
+
+    def get(self, url):
+        """
+        The records of an amendment by its URL, one per bill listing it
+        """
+        return [r for k, r in sorted(self._amendments.items()) if k[1] == url]
+
+    def search(self, sponsor=None, bill=None, congress=None, status=None):
+        """
+        Finds amendments matching every given property
+
+        :param sponsor: The sponsor's member ID or congress.gov URL - str
+        :param bill: The bill key (see utils.bill_key) - str
+        :param congress: The congress - int
+        :param status: 'agreed', 'failed', 'withdrawn', 'fell' or 'pending'
+        :return: List of amendment records
+        """
+        if sponsor and '/' in sponsor:
+            sponsor = url_member_id(sponsor)
+
+        found = None
+        for k, v in zip(KEYS, (sponsor, bill, congress, status)):
+            if v is None:
+                continue
+            keys = self._index[k].get(v, set())
+            found = set(keys) if found is None else found & keys
+
+        if found is None:
+            found = self._amendments.keys()
+        return [self._amendments[k] for k in sorted(found, key=lambda k: (k[1], k[0]))]
+
+    def to_json(self, filename):
+        """
+        Dumps the collection to a JSON file
+
+        :param filename: The location on the local disk - str
+        """
+        write_json(filename, list(self._amendments.values()))
+
+
+if __name__ == '__main__':
+    from house import HOUSE
+    HOUSE.amendment_index().to_json(HOUSE.ROOT_DIR + 'amendments.json')
@@ -0,0 +1,313 @@
+from collections import defaultdict
+
+from image import VOTE_CODES
+
+
+def popcount(bits):
+    """
+    The number of set bits in an int
+    """
+    return bin(bits).count('1')
+
+
+def member_key(record):
+    """
+    The key identifying the legislator of a recorded vote:
+    their member ID once resolved (see resolver.MemberResolver)
+
+    :param record: An entry of Vote._votes['recorded'] - dict
+    :return: A hashable key
+    """
+    if record.get('member_id'):
+        return record['member_id']
+    return record['name'], record['state'], record['party']
+
+
+class VoteMatrix:
+
+    """
+    The members x votes matrix of a single congress.
+    Each member's row is kept as bitsets over the vote columns
+    (one per position taken), so the pairwise and per-party
+    metrics are computed with whole-row bit operations.
+    """
+
+    def __init__(self, congress):
+        self.congress = congress
+
+        # Columns: vote source url -> column
+        self.columns = {}
+
+        # Rows: member key -> row, and the member's details by row
+        self.rows = {}
+        self.members = []
+
+        # Row -> bitset of the votes cast Yea, Nay, Present
+        # and of every vote the member was on the roll for
+        self.yea = []
+        self.nay = []
+        self.present = []
+        self.roll = []
+
+        # Party initial -> bitset of the votes where the party's majority
+        # voted Yea (or Nay)
+        self.party_yea = defaultdict(int)
+        self.party_nay = defaultdict(int)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def _row(self, record):
+        key = member_key(record)
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.members)
+            self.rows[key] = row
+            self.members.append({
+                'id': record.get('member_id'),
+                'name': record['name'],
+                'state': record['state'],
+                'party': record['party']
+            })
+            self.yea.append(0)
+            self.nay.append(0)
+            self.present.append(0)
+            self.roll.append(0)
+        return row
+
+    def copy(self):
+        """
+        A copy to change, leaving this matrix as its readers see it
+        """
+        m = VoteMatrix(self.congress)
+        m.columns = dict(self.columns)
+        m.rows = dict(self.rows)
+        m.members = list(self.members)
+        m.yea = list(self.yea)
+        m.nay = list(self.nay)
+        m.present = list(self.present)
+        m.roll = list(self.roll)
+        m.party_yea = defaultdict(int, self.party_yea)
+        m.party_nay = defaultdict(int, self.party_nay)
+        return m
+
+    def _clear(self, bit):
+        """
+        Clears a column from every row and party
+        """
+        mask = ~bit
+        for bits in (self.yea, self.nay, self.present, self.roll):
+            bits[:] = [b & mask for b in bits]
+        for bits in (self.party_yea, self.party_nay):
+            for party in bits:
+                bits[party] &= mask
+
+    def add(self, vote):
+        """
+        Adds a vote as a new column or, for a vote added
+        before (e.g. since re-parsed), rebuilds its column
+
+        :param vote: The Vote
+        :return: True if the vote was added
+        """
+        if 'recorded' not in vote._votes:
+            return False
+
+        self.add_column(vote._sources.get('url'),
+                        [(rec, VOTE_CODES.get(rec['vote'], 4)) for rec in vote._votes['recorded']],
+                        vote._votes.get('totals', {}).get('by_party', {}))
+        return True
+
+    def add_column(self, url, positions, by_party):
+        """
+        Adds or rebuilds the column of a vote
+
+        :param url: The vote's source URL - str
+        :param positions: (recorded vote, VOTE_CODES value) per member;
+                          the records need 'name', 'state', 'party'
+                          and, once resolved, 'member_id'
+        :param by_party: The vote's totals by party, e.g.
+                         {'Democratic': {'Yea': 230, 'Nay': 5, ...}} - dict
+        """
+        if url in self.columns:
+            bit = 1 << self.columns[url]
+            self._clear(bit)
+        else:
+            bit = 1 << len(self.columns)
+            self.columns[url] = len(self.columns)
+
+        for rec, code in positions:
+            row = self._row(rec)
+            self.roll[row] |= bit
+            if code == 1:
+                self.yea[row] |= bit
+            elif code == 2:
+                self.nay[row] |= bit
+            elif code == 3:
+                self.present[row] |= bit
+
+        for party, totals in by_party.items():
+            initial = party[:1]
+            if totals['Yea'] > totals['Nay']:
+                self.party_yea[initial] |= bit
+            elif totals['Nay'] > totals['Yea']:
+                self.party_nay[initial] |= bit
+
+    def find(self, name, state, mid=None):
+        """
+        Finds the row of a legislator by member ID or,
+        failing that, by the end of their full name and
+        their state abbreviation
+
+        :param name: The full name, e.g. 'Dwight Evans' - str
+        :param state: The state abbreviation, e.g. 'PA' - str
+        :param mid: The member ID - str
+        :return: The row, or None
+        """
+        if mid in self.rows:
+            return self.rows[mid]
+
+        name = name.lower()
+        for row, m in enumerate(self.members):
+            if m['state'] != state:
+                continue
+            surname = m['name'].split(' (')[0].lower()
+            if name.endswith(surname):
+                return row
+        return None
+
+    def agreement(self, a, b):
+        """
+        The share of votes where both members took
+        a Yea/Nay position and took the same one
+
+        :param a: A row - int
+        :param b: A row - int
+        :return: float in [0, 1], or None if they never both voted
+        """
+        both = (self.yea[a] | self.nay[a]) & (self.yea[b] | self.nay[b])
+        n = popcount(both)
+        if not n:
+            return None
+        same = (self.yea[a] & self.yea[b]) | (self.nay[a] & self.nay[b])
+        return popcount(same) / n
+
+    def agreements(self, row):
+        """
+        The agreement of a member with every other member
+
+        :param row: A row - int
+        :return: List of (row, agreement), most agreeing first
+        """
+        res = [(other, self.agreement(row, other))
+               for other in range(len(self.members)) if other != row]
+        res = [(o, a) for o, a in res if a is not None]
+        return sorted(res, key=lambda x: x[1], reverse=True)
+
+    def unity_votes(self):
+        """
+        Bitset of the party-unity votes: those where a majority
+        of Democrats opposed a majority of Republicans
+        """
+        return (self.party_yea['D'] & self.party_nay['R']) | \
+               (self.party_nay['D'] & self.party_yea['R'])
+
+    def party_unity(self, row):
+        """
+        The share of party-unity votes where the member
+        sided with the majority of their party
+
+        :param row: A row - int
+        :return: float in [0, 1], or None
+        """
+        party = self.members[row]['party']
+        unity = self.unity_votes()
+        voted = popcount((self.yea[row] | self.nay[row]) & unity)
+        if not voted:
+            return None
+        agreed = (self.yea[row] & self.party_yea[party]) | \
+                 (self.nay[row] & self.party_nay[party])
+        return popcount(agreed & unity) / voted
+
+    def attendance(self, row):
+        """
+        The share of roll calls the member was on where they voted
+
+        :param row: A row - int
+        :return: float in [0, 1], or None
+        """
+        roll = popcount(self.roll[row])
+        if not roll:
+            return None
+        voted = self.yea[row] | self.nay[row] | self.present[row]
+        return popcount(voted) / roll
+
+    def stats(self, row, top=5):
+        """
+        A summary of a member's voting behaviour
+
+        :param row: A row - int
+        :param top: The number of closest and furthest members - int
+        :return: dict
+        """
+        agreements = [{'member': self.members[o], 'agreement': a}
+                      for o, a in self.agreements(row)]
+        return {
+            'congress': self.congress,
+            'votes': popcount(self.roll[row]),
+            'attendance': self.attendance(row),
+            'party_unity': self.party_unity(row),
+            'most_agreement': agreements[:top],
+            'least_agreement': agreements[-top:][::-1]
+        }
+
+
+class VoteAnalytics:
+
+    """
+    A cache of VoteMatrix per congress, kept up to date as votes
+    are loaded and re-parsed. A matrix is never changed once
+    published: a congress whose votes change gets a new one.
+    """
+
+    def __init__(self):
+        self._matrices = {}
+
+        # Vote URL -> the Vote its column was built from
+        self._votes = {}
+
+    def update(self, votes):
+        """
+        Adds the votes new to their congress's matrix and
+        rebuilds the columns of votes re-parsed since
+
+        :param votes: An iterable of Votes
+        :return: The number of votes added or rebuilt
+        """
+        added = 0
+        changed = {}
+        for vote in votes:
+            url = vote._sources.get('url')
+            if self._votes.get(url) is vote:
+                continue
+            self._votes[url] = vote
+            try:
+                congress = int(vote._congress['congress'])
+            except (KeyError, ValueError):
+                continue
+            if congress not in changed:
+                matrix = self._matrices.get(congress)
+                changed[congress] = matrix.copy() if matrix else VoteMatrix(congress)
+            added += changed[congress].add(vote)
+        self._matrices.update(changed)
+        return added
+
+    def matrix(self, congress):
+        """
+        The matrix of a congress (empty if no votes were seen).
+        It won't change, so it can be read without a lock.
+
+        :param congress: The congress - int
+        :return: VoteMatrix
+        """
+        return self._matrices.get(congress) or VoteMatrix(congress)
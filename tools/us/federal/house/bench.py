@@ -0,0 +1,150 @@
+"""
+Benchmarks the page parsers on synthetic pages (see fixtures.py),
+offline: the pages are written to the page caches of a scratch
+directory, then loaded through Bill, Vote, Representative and Session
+as a crawl would load them.
+
+Throughput is reported by page type, and time by extraction step.
+Record a baseline on a machine, then compare later runs against it;
+a run fails (exits 1) when a page type's throughput or a step's mean
+time regresses by more than the tolerance:
+
+    python bench.py --save-baseline
+    python bench.py --scale 2 --tolerance 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from bill import Bill
+from vote import Vote
+from session import Session
+from representative import Representative
+
+from fixtures import write_fixtures
+from metrics import METRICS
+
+BASELINE = 'data/us/federal/house/bench/baseline.json'
+
+LOADERS = {
+    'bill': lambda url: Bill(url=url),
+    'vote': lambda url: Vote(url=url),
+    'rep': lambda url: Representative(url=url),
+    'session': lambda name: Session(url=name)
+}
+
+# Steps faster than this (in seconds) are too noisy to compare
+MIN_STEP_SECONDS = 0.0005
+
+
+def run(pages, repeat=3):
+    """
+    Loads every page repeat times, by page type
+
+    :param pages: dict of page type -> URLs (see fixtures.write_fixtures)
+    :param repeat: int
+    :return: {'pages_per_second': {page: float},
+              'steps': {'page/step': mean seconds}}
+    """
+    res = {'pages_per_second': {}, 'steps': {}}
+    METRICS.reset()
+    for page, urls in pages.items():
+        n = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for url in urls:
+                LOADERS[page](url)
+                n += 1
+        res['pages_per_second'][page] = n / (time.perf_counter() - start)
+
+    steps = METRICS.summary()['histograms'].get('house_extract_seconds', {})
+    for labels, stats in steps.items():
+        labels = dict(pair.split('=') for pair in labels.split(','))
+        res['steps']['{}/{}'.format(labels['page'], labels['step'])] = stats['mean']
+    return res
+
+
+def compare(res, baseline, tolerance=0.2):
+    """
+    The regressions of a run against a baseline
+
+    :param res: The run (see run)
+    :param baseline: A run saved earlier
+    :param tolerance: The fraction of slowdown allowed - float
+    :return: List of str
+    """
+    regressions = []
+    for page, rate in baseline['pages_per_second'].items():
+        now = res['pages_per_second'].get(page)
+        if now is not None and now < rate * (1 - tolerance):
+            regressions.append('{}: {:.1f} pages/s, baseline {:.1f}'.format(page, now, rate))
+    for step, mean in baseline['steps'].items():
+        now = res['steps'].get(step)
+        if now is not None and mean >= MIN_STEP_SECONDS and now > mean * (1 + tolerance):
+            regressions.append('{}: {:.2f}ms, baseline {:.2f}ms'.format(
+                step, now * 1000, mean * 1000))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the page parsers')
+    parser.add_argument('--bills', type=int, default=10)
+    parser.add_argument('--votes', type=int, default=10)
+    parser.add_argument('--members', type=int, default=20)
+    parser.add_argument('--floors', type=int, default=1)
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Multiplies the size of every page')
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='The fraction of slowdown allowed')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Record this run as the baseline')
+    args = parser.parse_args()
+
+    baseline_path = os.path.abspath(args.baseline)
+    home = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix='house-bench-')
+    try:
+        pages = write_fixtures(scratch, args.bills, args.votes, args.members,
+                               args.floors, args.scale)
+        os.chdir(scratch)
+        res = run(pages, args.repeat)
+    finally:
+        os.chdir(home)
+        shutil.rmtree(scratch)
+
+    res['config'] = {k: getattr(args, k) for k in
+                     ('bills', 'votes', 'members', 'floors', 'scale', 'repeat')}
+    for page, rate in sorted(res['pages_per_second'].items()):
+        print('{:<8} {:>9.1f} pages/s'.format(page, rate))
+    for step, mean in sorted(res['steps'].items()):
+        print('{:<32} {:>8.2f}ms'.format(step, mean * 1000))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        tmp = baseline_path + '.tmp'
+        with open(tmp, 'w+') as out_file:
+            json.dump(res, out_file, indent=2, sort_keys=True)
+        os.replace(tmp, baseline_path)
+        print('Saved the baseline to {}.'.format(baseline_path))
+        sys.exit(0)
+
+    try:
+        with open(baseline_path) as in_file:
+            baseline = json.load(in_file)
+    except FileNotFoundError:
+        print('No baseline at {}; record one with --save-baseline.'.format(baseline_path))
+        sys.exit(0)
+
+    if baseline.get('config') != res['config']:
+        print('The baseline was recorded with {}; comparing anyway.'.format(baseline.get('config')))
+    regressions = compare(res, baseline, args.tolerance)
+    for r in regressions:
+        print('Regression: ' + r)
+    sys.exit(1 if regressions else 0)
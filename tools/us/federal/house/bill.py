@@ -1,10 +1,66 @@
+import os
 import re
 import json
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from bs4 import BeautifulSoup
 
-from utils import download_file, get_bill_urls
+from utils import download_file, get_bill_urls, get_jsons, bill_key, title_key, ParseError
+from minhash import signature
+from persist import write_json
+from metrics import METRICS, loader, extractor
+
+
+# Progress stages as small int codes, shared by every bill.
+# Stages not seen before are appended as they're loaded.
+STAGES = [
+    'Introduced',
+    'Agreed to in House',
+    'Passed House',
+    'Agreed to in Senate',
+    'Passed Senate',
+    'Resolving Differences',
+    'To President',
+    'Became Law'
+]
+STAGE_CODES = {s: i for i, s in enumerate(STAGES)}
+
+# Guards registering new stages, as bills load from several threads
+_stages_lock = threading.Lock()
+
+
+def stage_code(name):
+    """
+    Gets the code of a progress stage, registering it if new
+
+    :param name: The stage as shown on the progress bar - str
+    :return: int
+    """
+    code = STAGE_CODES.get(name)
+    if code is None:
+        with _stages_lock:
+            if name not in STAGE_CODES:
+                # Append first, so a code is never handed out before its stage exists
+                STAGES.append(name)
+                STAGE_CODES[name] = len(STAGES) - 1
+            code = STAGE_CODES[name]
+    return code
+
+
+def text_url(url):
+    """
+    The URL of a bill's text page, from its all-info URL
+    """
+    return '/'.join(url.split('/')[:-1]) + '/text?format=txt'
+
+
+def amendments_url(url):
+    """
+    The URL of a bill's amendments page, from its all-info URL
+    """
+    return '/'.join(url.split('/')[:-1]) + '/amendments'
 
 
 class Bill:
@@ -19,7 +75,10 @@ class Bill:
     ROOT_DIR = 'data/us/federal/house/bills/'
     ROOT_URL = 'https://www.congress.gov'
 
-    def __init__(self, url=None, filename=None):
+    # The JSONs of a single congress
+    SHARD_PATTERN = 'json/{}_*.json'
+
+    def __init__(self, url=None, filename=None, force_reload=False):
 
         self.title = None  # The title of the bill
         self._congress = None  # The congressional session
@@ -36,6 +95,10 @@ class Bill:
         # Progress of bill
         self._bill_progress = {}
 
+        # Codes of the stages reached, and of the current stage
+        self._stages_reached = []
+        self._stage = None
+
         self.title_info = []
 
         self._action_overview = []
@@ -53,12 +116,15 @@ class Bill:
 
         self._text = ''
 
+        # MinHash signature of the text (see minhash.py)
+        self._minhash = []
+
         self._amendments = []
 
         self._cost_estimates = []
 
         if url:
-            self.load_from_url(url)
+            self.load_from_url(url, force_reload=force_reload)
         elif filename:
             self.from_json(filename)
         else:
@@ -67,6 +133,7 @@ class Bill:
     def __repr__(self):
         return self.title
 
+    @loader('bill')
     def load_from_url(self, url, force_reload=False):
         """
         Given a URL, this will generate the values
@@ -81,7 +148,8 @@ class Bill:
         self._sources['html'] = self.ROOT_DIR + 'web/' + cache
 
         data = download_file(self._sources['url'], self._sources['html'], force_reload)
-        soup = BeautifulSoup(data, 'html.parser')
+        with METRICS.timer('house_extract_seconds', page='bill', step='soup'):
+            soup = BeautifulSoup(data, 'html.parser')
 
         self.title = next(
             soup.find('h1', attrs={'class': 'legDetail'}).strings)
@@ -123,15 +191,17 @@ class Bill:
         summ = soup.find('div', attrs={'id': 'latestSummary-content'})
         self._extract_summary(summ)
 
-        self._extract_text()
+        self._extract_text(force_reload)
+        self._minhash = signature(self._text)
 
-        self._extract_amendments()
+        self._extract_amendments(force_reload)
 
         costs = soup.find('div', attrs={'id': 'cboEstimate'})
         self._extract_cost(costs)
 
         self.to_json()
 
+    @extractor('bill')
     def _extract_overview(self, overview):
         """
         Given a BeautifulSoup HTML overview extracted
@@ -165,8 +235,8 @@ class Bill:
                                                       '%m/%d/%Y').timestamp()
                         }
                 else:
-                    import pdb
-                    pdb.set_trace()
+                    raise ParseError('No introduction date for the sponsor of {}'.format(
+                        self._sources['url']))
             elif th == 'Committees:':
                 td = tr.find('td').text
                 if 'House' in td:
@@ -218,10 +288,10 @@ class Bill:
                 # other than grabbing the text
                 self._overview['notes'] = tr.find('td').text
             else:
-                print('New Overview in Bill Identified!')
-                import pdb
-                pdb.set_trace()
+                raise ParseError('New overview {!r} in {}'.format(
+                    th, self._sources['url']))
 
+    @extractor('bill')
     def _extract_bill_progress(self, progress):
         """
         Extracts the information contained in the HTML progress bar
@@ -246,6 +316,21 @@ class Bill:
                 if c in states:
                     self._bill_progress[text] = states[c]
 
+        self._encode_progress()
+
+    def _encode_progress(self):
+        """
+        Encodes the progress bar into stage codes
+        """
+        self._stages_reached = [stage_code(k) for k, v in
+                                self._bill_progress.items() if v >= 0]
+        self._stage = None
+        for k, v in self._bill_progress.items():
+            if v == 0:
+                self._stage = stage_code(k)
+                break
+
+    @extractor('bill')
     def _extracttitle_info(self, titles):
         """
         Extracts all title information from a bill
@@ -319,6 +404,7 @@ class Bill:
                     'chamber': 'Senate'
                 })
 
+    @extractor('bill')
     def _extract_action_overview(self, overview):
         """
         Extracts the overview of the actions taken on this bill
@@ -334,6 +420,7 @@ class Bill:
                 'action': action
             })
 
+    @extractor('bill')
     def _extract_actions(self, actions):
         """
         Extracts the full list of actions on a bill
@@ -374,6 +461,7 @@ class Bill:
                     'action': action
                 })
 
+    @extractor('bill')
     def _extract_cosponsors(self, cos):
         """
         Extracts the cosponsor information
@@ -421,9 +509,10 @@ class Bill:
                             'explanation': exp_text
                         })
                     else:
-                        import pdb
-                        pdb.set_trace()
+                        raise ParseError('Unexpected cosponsor row in {}'.format(
+                            self._sources['url']))
 
+    @extractor('bill')
     def _extract_committees(self, com):
         """
         Extracts the committee information
@@ -463,6 +552,7 @@ class Bill:
                     'report': rep
                 })
 
+    @extractor('bill')
     def _extract_related(self, table):
         """
         Extracts related bill data
@@ -507,6 +597,7 @@ class Bill:
                             'latest_action': act.text
                         })
 
+    @extractor('bill')
     def _extract_subjects(self, div):
         """
         Extracts subject data
@@ -537,6 +628,7 @@ class Bill:
                     'url': self.ROOT_URL + a.get('href')
                 })
 
+    @extractor('bill')
     def _extract_summary(self, div):
         """
         Extracts the summary of a bill
@@ -547,14 +639,15 @@ class Bill:
         ps = div.find_all('p')
         self.summary = '\n'.join([p.text.strip() for p in ps])
 
+    @extractor('bill')
     def _extract_text(self, force_reload=False):
         """
         Extracts the text of a Bill
         """
-        text_url = '/'.join(self._sources['url'].split('/')[:-1]) + '/text?format=txt'
-        text_html = self.ROOT_DIR + 'web/' + text_url.split('://')[-1].replace('/', '_')
+        url = text_url(self._sources['url'])
+        text_html = self.ROOT_DIR + 'web/' + url.split('://')[-1].replace('/', '_')
 
-        html = download_file(text_url, text_html, force_reload)
+        html = download_file(url, text_html, force_reload)
 
         soup = BeautifulSoup(html, 'html.parser')
         container = soup.find('pre', attrs={'id': 'billTextContainer'})
@@ -563,17 +656,17 @@ class Bill:
         except AttributeError:
             self._text = ''
 
+    @extractor('bill')
     def _extract_amendments(self, force_reload=False):
         """
         Extract amendment data
         :param force_reload: Whether or not to force a refresh
         """
-        text_url = '/'.join(
-            self._sources['url'].split('/')[:-1]) + '/amendments'
-        text_html = self.ROOT_DIR + 'web/' + text_url.split('://')[-1].replace(
+        url = amendments_url(self._sources['url'])
+        text_html = self.ROOT_DIR + 'web/' + url.split('://')[-1].replace(
             '/', '_')
 
-        html = download_file(text_url, text_html, force_reload)
+        html = download_file(url, text_html, force_reload)
         soup = BeautifulSoup(html, 'html.parser')
 
         main = soup.find('div', attrs={'id': 'main'})
@@ -623,6 +716,7 @@ class Bill:
                     'committees': committees
                 })
 
+    @extractor('bill')
     def _extract_cost(self, div):
         """
         Extract cost estimates
@@ -631,21 +725,26 @@ class Bill:
         """
         pass
 
-    def refresh(self):
+    def refresh(self, force_reload=False):
         """
-        Does a soft refresh of the HTML content
+        Does a soft refresh of the HTML content,
+        starting from an empty bill so nothing is extracted twice
+
+        :param force_reload: Whether or not to perform a hard refresh
         """
-        self.load_from_url(url=self._sources['url'])
-        self.to_json()
+        self.__init__(url=self._sources['url'], force_reload=force_reload)
 
     def to_json(self):
         """
-        Dumps the Bill to a JSON readable format
+        Dumps the Bill to a JSON readable format,
+        unless the file already holds it
+
+        :return: The change record, or None if unchanged (see persist.write_json)
         """
         filename = '{}_{}.json'.format(self._congress,
                                        self.title.split(' - ')[0])
 
-        json.dump({
+        return write_json(self.ROOT_DIR + 'json/' + filename, {
             'title': self.title,
             'congress': self._congress,
             'sources': self._sources,
@@ -660,9 +759,10 @@ class Bill:
             'subjects': self.subjects,
             'summary': self.summary,
             'text': self._text,
+            'minhash': self._minhash,
             'amendments': self._amendments,
             'cost': self._cost_estimates
-        }, open(self.ROOT_DIR + 'json/' + filename, 'w+'))
+        }, kind='bill', key=self.get_key())
 
     def from_json(self, filename):
         """
@@ -677,6 +777,7 @@ class Bill:
         self._sources = data['sources']
         self._overview = data['overview']
         self._bill_progress = data['progress']
+        self._encode_progress()
         self.title_info = data['title_info']
         self._action_overview = data['action_overview']
         self._actions = data['actions']
@@ -686,6 +787,7 @@ class Bill:
         self.subjects = data['subjects']
         self.summary = data['summary']
         self._text = data['text']
+        self._minhash = data.get('minhash', [])
         self._amendments = data['amendments']
         self._cost_estimates = data['cost']
 
@@ -696,9 +798,23 @@ class Bill:
         """
         Gets the current progress of the bill
         """
-        for k, v in self._bill_progress.items():
-            if v == 0:
-                return k
+        if self._stage is not None:
+            return STAGES[self._stage]
+
+    def get_key(self):
+        """
+        Gets the canonical key of the bill (see utils.bill_key)
+        """
+        return bill_key(self._sources.get('url'))
+
+    def get_minhash(self):
+        """
+        Gets the MinHash signature of the text,
+        computing it for bills stored without one
+        """
+        if not self._minhash and self._text:
+            self._minhash = signature(self._text)
+        return self._minhash
 
     def get_subjects(self):
         return self.subjects
@@ -743,6 +859,47 @@ class Bill:
         return False
 
 
+def stored_bill_keys():
+    """
+    The keys of the bills stored on disk, read from the
+    JSON file names ('{congress}_{title}.json') without opening them
+
+    :return: set of bill keys (see utils.bill_key)
+    """
+    keys = set()
+    for f in get_jsons(Bill.ROOT_DIR):
+        congress, _, title = os.path.basename(f)[:-len('.json')].partition('_')
+        key = title_key(congress, title)
+        if key:
+            keys.add(key)
+    return keys
+
+
+def fetch_bills(urls, workers=8):
+    """
+    Downloads and parses bills in parallel
+
+    :param urls: The bill URLs
+    :param workers: The number of bills in flight - int
+    :return: (the Bills, dict of URL -> exception for those that failed)
+    """
+    def fetch(url):
+        try:
+            return url, Bill(url=url), None
+        except Exception as e:
+            return url, None, e
+
+    bills = []
+    failed = {}
+    with ThreadPoolExecutor(workers) as pool:
+        for url, bill, error in pool.map(fetch, urls):
+            if error is None:
+                bills.append(bill)
+            else:
+                failed[url] = error
+    return bills, failed
+
+
 if __name__ == '__main__':
     from tqdm import tqdm
     new, old = get_bill_urls()
@@ -750,3 +907,6 @@ if __name__ == '__main__':
         Bill(url=f)
     # for f in tqdm(old):
     #     Bill(url=f).refresh()
+
+    from image import update_image
+    update_image()
@@ -0,0 +1,227 @@
+import os
+import json
+import fcntl
+
+
+class ChangeLog:
+
+    """
+    An append-only log of the changes written to the corpus,
+    one JSON record per line.  Every record gets the next corpus
+    version, and is addressed by its byte offset in the log so
+    consumers can resume from wherever they stopped.
+
+    Records look like:
+        {'version': 12, 'kind': 'bill', 'key': '116-house-bill-1',
+         'type': 'updated', 'fields': ['actions', 'overview'],
+         'path': ..., 'hash': ..., 'time': ...}
+    """
+
+    PATH = 'data/us/federal/house/changes/log.jsonl'
+
+    def __init__(self, path=PATH):
+        self._path = path
+
+    def _last_version(self, log):
+        """
+        The version of the last complete record of an open log
+        """
+        pos = log.seek(0, os.SEEK_END)
+        tail = b''
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            log.seek(pos)
+            tail = log.read(step) + tail
+            # The piece after the last newline is a record cut off by a crash
+            lines = tail.split(b'\n')[:-1]
+            if len(lines) > 1 or (lines and pos == 0):
+                return json.loads(lines[-1])['version']
+        return 0
+
+    def _complete_end(self, log):
+        """
+        The offset after the last complete record of an open log
+        """
+        end = log.seek(0, os.SEEK_END)
+        if not end:
+            return 0
+        log.seek(end - 1)
+        if log.read(1) == b'\n':
+            return end
+
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            log.seek(pos)
+            cut = log.read(step).rfind(b'\n')
+            if cut >= 0:
+                return pos + cut + 1
+        return 0
+
+    def _repair(self, log):
+        """
+        Truncates a record cut off by a crash mid-append,
+        so the next record starts on a line of its own.
+        The log must be locked exclusively.
+        """
+        end = self._complete_end(log)
+        if end != log.seek(0, os.SEEK_END):
+            log.truncate(end)
+
+    def append(self, change, apply=None):
+        """
+        Appends a change record (see persist.write_json),
+        stamping it with the next corpus version.
+        Safe to call from several processes at once.
+
+        :param change: The change record - dict
+        :param apply: Makes the change, e.g. swaps the changed file in.
+                      It's called once the record is written, before the
+                      log is unlocked: a crash can't make a change that
+                      wasn't logged, and readers of the log (who lock it
+                      too) never see a record before its change.
+        :return: The record as logged
+        """
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'a+b') as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                self._repair(log)
+                record = dict(change, version=self._last_version(log) + 1)
+                log.seek(0, os.SEEK_END)
+                log.write(json.dumps(record, sort_keys=True).encode() + b'\n')
+                log.flush()
+                if apply:
+                    apply()
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+        return record
+
+    def read(self, offset=0, limit=None):
+        """
+        Reads the records written at or after an offset.
+        A record still being appended is left for the next read.
+
+        :param offset: The byte offset to read from - int
+        :param limit: The most records to return - int
+        :return: (list of records, the offset after the last one);
+                 each record carries its own 'offset'
+        """
+        records = []
+        try:
+            log = open(self._path, 'rb')
+        except FileNotFoundError:
+            return records, offset
+
+        with log:
+            fcntl.flock(log, fcntl.LOCK_SH)
+            try:
+                log.seek(offset)
+                for line in log:
+                    if not line.endswith(b'\n') or (limit is not None and len(records) >= limit):
+                        break
+                    records.append(dict(json.loads(line), offset=offset))
+                    offset += len(line)
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+        return records, offset
+
+    def end(self):
+        """
+        The offset after the last complete record,
+        where the records still to come will start
+        """
+        try:
+            with open(self._path, 'rb') as log:
+                fcntl.flock(log, fcntl.LOCK_SH)
+                try:
+                    return self._complete_end(log)
+                finally:
+                    fcntl.flock(log, fcntl.LOCK_UN)
+        except FileNotFoundError:
+            return 0
+
+    def version(self):
+        """
+        The current corpus version: that of the last record
+        """
+        try:
+            with open(self._path, 'rb') as log:
+                fcntl.flock(log, fcntl.LOCK_SH)
+                try:
+                    return self._last_version(log)
+                finally:
+                    fcntl.flock(log, fcntl.LOCK_UN)
+        except FileNotFoundError:
+            return 0
+
+    def consumer(self, name=None):
+        """
+        A consumer of the log (see ChangeConsumer)
+
+        :param name: The name its offset is kept on disk under; an unnamed
+                     consumer reads only the records to come, and keeps
+                     its offset in memory, e.g. for an in-memory index
+        """
+        return ChangeConsumer(self, name)
+
+
+class ChangeConsumer:
+
+    """
+    Reads the change log from a committed offset that's kept
+    on disk under its name, so each derived structure picks up
+    exactly the changes it hasn't applied yet
+    """
+
+    def __init__(self, log, name=None):
+        self._log = log
+        self._name = name
+
+        if name is None:
+            self._path = None
+            self.offset = log.end()
+        else:
+            self._path = os.path.join(os.path.dirname(log._path), 'consumers', name + '.json')
+            try:
+                with open(self._path) as in_file:
+                    self.offset = json.load(in_file)['offset']
+            except FileNotFoundError:
+                self.offset = 0
+
+        # Where the records handed out by poll end
+        self._next = self.offset
+
+    def poll(self, limit=None):
+        """
+        The records after those last handed out
+
+        :param limit: The most records to return - int
+        :return: List of records
+        """
+        records, self._next = self._log.read(self._next, limit)
+        return records
+
+    def commit(self):
+        """
+        Marks every record handed out so far as applied
+        """
+        self.offset = self._next
+        if self._path is None:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w+') as out_file:
+            json.dump({'offset': self.offset}, out_file)
+        os.replace(tmp, self._path)
+
+    def rewind(self):
+        """
+        Forgets the records handed out since the last commit
+        """
+        self._next = self.offset
+
+
+CHANGELOG = ChangeLog()
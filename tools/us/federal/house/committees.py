@@ -0,0 +1,248 @@
+import re
+from collections import defaultdict
+
+# Words that differ between the overview's and the committee table's names
+_NOISE = {'committee', 'house', 'the', 'on'}
+
+DAY = 24 * 60 * 60
+
+
+def committee_key(name):
+    """
+    Normalizes a committee name so 'Ways and Means',
+    'Ways and Means Committee' and 'House Committee on Ways and Means'
+    share one key
+
+    :param name: str
+    :return: str
+    """
+    words = re.findall(r'[a-z]+', (name or '').lower())
+    return ' '.join(w for w in words if w not in _NOISE)
+
+
+def subcommittee_key(parent, name):
+    """
+    The key of a subcommittee: its parent committee's key and its own
+    normalized name, e.g. 'energy and commerce/health'
+
+    :param parent: The parent committee's name - str
+    :param name: The subcommittee's name - str
+    :return: str
+    """
+    words = [w for w in committee_key(name).split(' ') if w != 'subcommittee']
+    return '{}/{}'.format(committee_key(parent), ' '.join(words))
+
+
+def _day(timestamp):
+    return int(timestamp // DAY) if timestamp else None
+
+
+def _activity(bill):
+    """
+    A bill's committee activity, with an entry per committee and
+    per subcommittee (linked to its committee by 'parent')
+
+    :param bill: The Bill
+    :return: dict of committee or subcommittee key -> dict
+    """
+    key = bill.get_key()
+    congress = bill.get_congress()
+    overview = bill.get_overview()
+    res = {}
+
+    def entry(ck, name, parent=None):
+        if ck not in res:
+            res[ck] = {
+                'name': name,
+                'parent': parent,
+                'congress': congress,
+                'actions': [],
+                'reports': [],
+                'meetings': [],
+                'subcommittees': set(),
+                'reported': False
+            }
+        return res[ck]
+
+    for c in bill._committees:
+        if not c['committee']:
+            continue
+        ck = committee_key(c['committee'])
+        e = entry(ck, c['committee'])
+        action = {
+            'bill': key,
+            'datetime': c['datetime'],
+            'action': c['action'],
+            'subcommittee': c['subcommittee']
+        }
+        e['actions'].append(action)
+        if c['subcommittee']:
+            sk = subcommittee_key(c['committee'], c['subcommittee'])
+            e['subcommittees'].add(sk)
+            sub = entry(sk, c['subcommittee'], parent=ck)
+            sub['actions'].append(action)
+            if re.match(r'Reported|Forwarded|Discharged', c['action']):
+                sub['reported'] = True
+        if c['report']:
+            e['reports'].append(dict(c['report'], bill=key))
+        if not c['subcommittee'] and re.match(r'Reported|Discharged', c['action']):
+            e['reported'] = True
+
+    # The overview names the House committees the bill sits with
+    names = overview.get('committees', [])
+    for name in names:
+        e = entry(committee_key(name), name)
+        if 'committee_report' in overview:
+            report = dict(overview['committee_report'], bill=key)
+            if report not in e['reports']:
+                e['reports'].append(report)
+
+    # The overview's meetings don't say whose they are: each goes to one
+    # committee, the first to act on the bill that day or else the first
+    # the bill sits with, so a meeting isn't counted once per committee
+    if names:
+        first = committee_key(names[0])
+        acted = {}
+        for ck, e in res.items():
+            if e['parent'] is None:
+                for a in e['actions']:
+                    acted.setdefault(_day(a['datetime']), ck)
+        for m in overview.get('meetings', []):
+            ck = acted.get(_day(m['datetime']), first)
+            res[ck]['meetings'].append(dict(m, bill=key))
+
+    pending = bill.get_progress() in (None, 'Introduced')
+    for e in res.values():
+        e['pending'] = pending and not e['reported']
+    return res
+
+
+class CommitteeIndex:
+
+    """
+    Committee and subcommittee activity gathered from every bill:
+    the bills referred, dated actions, reports and meetings, with
+    workload counts per congress kept up to date as bills change.
+    Subcommittees are entries of their own (see subcommittee_key),
+    linked to their committee.
+    """
+
+    def __init__(self):
+        # Committee or subcommittee key -> display name
+        self._names = {}
+
+        # Subcommittee key -> its committee's key
+        self._parents = {}
+
+        # Committee key -> its subcommittees' keys
+        self._children = defaultdict(set)
+
+        # (committee key, congress, meeting URL) -> the number of bills
+        # listing it; a meeting taking up several bills counts once
+        self._meetings = defaultdict(int)
+
+        # Committee key -> bill key -> activity of that bill
+        self._activity = defaultdict(dict)
+
+        # Committee key -> congress -> workload counts
+        self._workload = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+
+        # Bill -> its activity by committee key
+        self._contributed = {}
+
+    def __contains__(self, bill):
+        return bill in self._contributed
+
+    def __iter__(self):
+        return iter(list(self._contributed))
+
+    def _count(self, ck, e, sign):
+        counts = self._workload[ck][e['congress']]
+        counts['referred'] += sign
+        counts['reported'] += sign * e['reported']
+        counts['pending'] += sign * e['pending']
+        counts['reports'] += sign * len(e['reports'])
+        counts.setdefault('meetings', 0)
+        for url in {m['url'] for m in e['meetings']}:
+            k = (ck, e['congress'], url)
+            if sign > 0:
+                self._meetings[k] += 1
+                if self._meetings[k] == 1:
+                    counts['meetings'] += 1
+            else:
+                self._meetings[k] -= 1
+                if not self._meetings[k]:
+                    del self._meetings[k]
+                    counts['meetings'] -= 1
+
+    def add(self, bill):
+        """
+        Adds a bill's committee activity
+        """
+        key = bill.get_key()
+        activity = _activity(bill)
+        for ck, e in activity.items():
+            self._names.setdefault(ck, e['name'])
+            if e['parent']:
+                self._parents[ck] = e['parent']
+                self._children[e['parent']].add(ck)
+            self._activity[ck][key] = e
+            self._count(ck, e, 1)
+        self._contributed[bill] = activity
+
+    def remove(self, bill):
+        """
+        Removes a bill's committee activity
+        """
+        key = bill.get_key()
+        for ck, e in self._contributed.pop(bill, {}).items():
+            if self._activity[ck].get(key) is e:
+                del self._activity[ck][key]
+                self._count(ck, e, -1)
+
+    def committees(self):
+        """
+        Every committee with its workload per congress
+
+        :return: List of dicts, by name
+        """
+        return sorted([{
+            'key': ck,
+            'name': self._names[ck],
+            'parent': self._parents.get(ck),
+            'workload': {c: dict(counts) for c, counts in self._workload[ck].items()}
+        } for ck in self._names], key=lambda c: c['name'])
+
+    def committee(self, name, congress=None):
+        """
+        The activity of a committee or subcommittee
+
+        :param name: Any form of the committee's name,
+                     or a committee or subcommittee key - str
+        :param congress: Only include this congress - int
+        :return: dict, or None if unknown
+        """
+        ck = name if name in self._names else committee_key(name)
+        if ck not in self._names:
+            return None
+
+        activity = [e for e in self._activity[ck].values()
+                    if congress is None or e['congress'] == congress]
+        by_time = lambda x: x['datetime'] or 0
+        return {
+            'key': ck,
+            'name': self._names[ck],
+            'bills': sorted(b for b, e in self._activity[ck].items()
+                            if congress is None or e['congress'] == congress),
+            'pending': sorted(b for b, e in self._activity[ck].items()
+                              if e['pending'] and (congress is None or e['congress'] == congress)),
+            'parent': self._parents.get(ck),
+            'subcommittees': sorted([{'key': sk, 'name': self._names[sk]}
+                                     for sk in self._children.get(ck, ())],
+                                    key=lambda c: c['name']),
+            'actions': sorted([a for e in activity for a in e['actions']], key=by_time),
+            'reports': [r for e in activity for r in e['reports']],
+            'meetings': sorted([m for e in activity for m in e['meetings']], key=by_time),
+            'workload': {c: dict(counts) for c, counts in self._workload[ck].items()
+                         if congress is None or c == congress}
+        }
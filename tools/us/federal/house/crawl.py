@@ -0,0 +1,456 @@
+"""
+Crawls the House corpus from the floor sessions outwards.
+
+Floor sessions seed the frontier with the bills and votes taken up on
+the floor; every page parsed adds the pages it links to (a bill's
+sponsor and cosponsors and related bills, a vote's bill). Pages are
+fetched by a pool of threads and parsed by a pool of processes, and
+the frontier is checkpointed so an interrupted crawl picks up where
+it stopped:
+
+    python crawl.py --floor HDoc-116-1-FloorProceedings.xml -f 8 -p 4
+
+Pages that keep failing are quarantined rather than retried forever;
+list them with --quarantine, and requeue them with --retry-quarantine.
+"""
+
+import os
+import json
+import time
+import argparse
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, \
+    wait, FIRST_COMPLETED
+
+from session import Session, ingest_floor
+from bill import Bill, text_url, amendments_url
+from representative import Representative
+from vote import Vote
+
+import utils
+from utils import download_file, get_jsons, bill_key, bill_url, legis_key, THROTTLE
+from metrics import METRICS
+
+KINDS = {
+    'bill': Bill,
+    'rep': Representative,
+    'vote': Vote
+}
+
+ROOT_URL = 'https://www.congress.gov'
+
+
+def _cache_path(kind, url):
+    """
+    Where a page's class caches it (see e.g. Bill.load_from_url)
+    """
+    return KINDS[kind].ROOT_DIR + 'web/' + url.split('://')[-1].replace('/', '_')
+
+
+def _pages(kind, url):
+    """
+    Every page a parse of a page reads: a bill's text and
+    amendments pages as well as its all-info page
+    """
+    if kind == 'bill':
+        return [url, text_url(url), amendments_url(url)]
+    return [url]
+
+
+def _links(kind, obj):
+    """
+    The pages a parsed page links to
+
+    :param kind: 'bill', 'rep' or 'vote'
+    :param obj: The parsed Bill, Representative or Vote
+    :return: List of (kind, url)
+    """
+    links = []
+    if kind == 'bill':
+        sponsor = obj.get_overview().get('sponsor', {})
+        if 'url' in sponsor:
+            links.append(('rep', sponsor['url']))
+        for co in obj._cosponsors:
+            url = co['cosponsors']['url']
+            links.append(('rep', url if 'congress.gov' in url else ROOT_URL + url))
+        for rel in obj._related:
+            key = bill_key(rel['bill']['url'])
+            if key:
+                links.append(('bill', bill_url(key)))
+    elif kind == 'vote':
+        key = legis_key(obj._congress.get('congress'), obj._congress.get('legis_num'))
+        if key:
+            links.append(('bill', bill_url(key)))
+    return links
+
+
+def _fetch(kind, url):
+    """
+    Fetches every page a parse reads (see _pages) into its class's cache
+
+    :return: (the pages downloaded rather than found cached, the seconds spent)
+    """
+    start = time.perf_counter()
+    fetched = 0
+    for page in _pages(kind, url):
+        path = _cache_path(kind, page)
+        fetched += not os.path.exists(path)
+        download_file(page, path)
+    return fetched, time.perf_counter() - start
+
+
+def _init_parser():
+    """
+    Makes a parse worker read only the cache, so all
+    requests go through the fetch pool and its throttle
+    """
+    utils.CACHE_ONLY = True
+
+
+def _parse(kind, url):
+    """
+    Parses a cached page, writing its JSON.
+    Runs in a parse worker process, which never fetches
+    (see _init_parser).
+
+    :return: (links, the seconds spent, the metrics recorded
+             - see metrics.Metrics.snapshot, the error raised or None).
+             A failed parse returns its error rather than raising it,
+             so the metrics it recorded still reach the parent.
+    """
+    METRICS.reset()
+    start = time.perf_counter()
+    try:
+        obj = KINDS[kind](url=url)
+        links = _links(kind, obj)
+    except Exception as e:
+        return [], time.perf_counter() - start, METRICS.snapshot(), e
+    return links, time.perf_counter() - start, METRICS.snapshot(), None
+
+
+class CrawlState:
+
+    """
+    The persistent state of a crawl: the frontier of pages to
+    visit, every page ever queued, and the quarantined pages
+    """
+
+    PATH = 'data/us/federal/house/crawl/state.json'
+
+    def __init__(self, path=PATH):
+        self._path = path
+
+        # Pages to visit, as (kind, url)
+        self.frontier = deque()
+
+        # Pages being worked on; kept in checkpoints so they're
+        # visited again if the crawl dies before finishing them
+        self.in_flight = {}
+
+        # URL of every page queued, visited or quarantined
+        self.seen = set()
+
+        # URL -> number of failed attempts
+        self.attempts = defaultdict(int)
+
+        # URL -> {'kind', 'error', 'attempts', 'time'}
+        self.quarantine = {}
+
+        try:
+            with open(path) as in_file:
+                data = json.load(in_file)
+        except FileNotFoundError:
+            return
+
+        self.frontier.extend(tuple(p) for p in data['frontier'])
+        self.seen = set(data['seen'])
+        self.attempts.update(data['attempts'])
+        self.quarantine = data['quarantine']
+
+    def push(self, kind, url):
+        """
+        Queues a page unless already seen
+
+        :return: True if queued
+        """
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self.frontier.append((kind, url))
+        return True
+
+    def requeue(self, kind, url, front=False):
+        """
+        Queues a page again, e.g. after a failure
+        """
+        if front:
+            self.frontier.appendleft((kind, url))
+        else:
+            self.frontier.append((kind, url))
+
+    def fail(self, kind, url, error, max_attempts):
+        """
+        Records a failed attempt at a page, quarantining it
+        once it has failed max_attempts times
+
+        :return: True if quarantined
+        """
+        self.attempts[url] += 1
+        if self.attempts[url] < max_attempts:
+            self.requeue(kind, url)
+            return False
+        self.quarantine[url] = {
+            'kind': kind,
+            'error': '{}: {}'.format(type(error).__name__, error),
+            'attempts': self.attempts.pop(url),
+            'time': time.time()
+        }
+        return True
+
+    def release(self):
+        """
+        Requeues every quarantined page
+
+        :return: The number of pages requeued
+        """
+        n = len(self.quarantine)
+        for url, q in self.quarantine.items():
+            self.requeue(q['kind'], url)
+        self.quarantine = {}
+        return n
+
+    def checkpoint(self):
+        """
+        Writes the state beside its path and atomically swaps it in
+        """
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w+') as out_file:
+            json.dump({
+                'frontier': list(self.in_flight.values()) + list(self.frontier),
+                'seen': sorted(self.seen),
+                'attempts': self.attempts,
+                'quarantine': self.quarantine
+            }, out_file)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(tmp, self._path)
+
+
+class Crawler:
+
+    """
+    Runs a crawl: fetch workers (threads) pull pages into the
+    local cache and parse workers (processes) turn them into JSONs
+    and report the pages they link to
+    """
+
+    def __init__(self, state, fetchers=8, parsers=None, max_attempts=3,
+                 checkpoint_every=50, follow=('bill', 'rep', 'vote'), delay=0.5):
+        """
+        :param state: The CrawlState
+        :param fetchers: The number of fetch threads - int
+        :param parsers: The number of parse processes - int
+                        (default: the number of CPUs)
+        :param max_attempts: Failures before a page is quarantined - int
+        :param checkpoint_every: Pages finished between checkpoints - int
+        :param follow: The kinds of linked pages to queue
+        :param delay: The least seconds between requests to a host,
+                      across the fetchers (see utils.Throttle) - float
+        """
+        self.state = state
+        self.fetchers = fetchers
+        self.parsers = parsers or os.cpu_count()
+        self.max_attempts = max_attempts
+        self.checkpoint_every = checkpoint_every
+        self.follow = set(follow)
+        THROTTLE.delay = delay
+
+        self.stats = {
+            'fetched': 0,
+            'parsed': defaultdict(int),
+            'failed': 0,
+            'quarantined': 0,
+            'queued': 0,
+            'fetch seconds': 0.0,
+            'parse seconds': 0.0
+        }
+
+    def _queue(self, links):
+        for kind, url in links:
+            if kind in self.follow and self.state.push(kind, url):
+                self.stats['queued'] += 1
+
+    def seed(self, floors=(), force_reload=False):
+        """
+        Seeds the frontier from floor sessions: the sessions
+        already on disk and the new floor actions of any named
+        floor proceedings
+
+        :param floors: Floor proceedings file names,
+                       e.g. 'HDoc-116-1-FloorProceedings.xml'
+        :param force_reload: Whether to refresh the named proceedings - bool
+        """
+        for f in get_jsons(Session.ROOT_DIR):
+            self._queue(Session(filename=f).get_links())
+        for floor in floors:
+            session, actions = ingest_floor(floor, force_reload=force_reload)
+            self._queue(session.get_links(actions))
+
+    def _failed(self, kind, url, error):
+        METRICS.inc('house_crawl_errors_total', page=kind, error=type(error).__name__)
+        self.stats['failed'] += 1
+        if self.state.fail(kind, url, error, self.max_attempts):
+            self.stats['quarantined'] += 1
+            print('Quarantined {} ({})'.format(url, self.state.quarantine[url]['error']))
+
+    def run(self, limit=None):
+        """
+        Crawls until the frontier is empty
+
+        :param limit: Stop after this many pages are parsed - int
+        :return: The stats of the run
+        """
+        state = self.state
+        fetching = {}
+        parsing = {}
+        finished = 0
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(self.fetchers) as fetch_pool, \
+                ProcessPoolExecutor(self.parsers, initializer=_init_parser) as parse_pool:
+            try:
+                while True:
+                    # Keep both pools busy, without reading far ahead
+                    while state.frontier and len(fetching) < 2 * self.fetchers and \
+                            len(parsing) < 4 * self.parsers and \
+                            (limit is None or finished + len(state.in_flight) < limit):
+                        kind, url = state.frontier.popleft()
+                        state.in_flight[url] = (kind, url)
+                        fetching[fetch_pool.submit(_fetch, kind, url)] = (kind, url)
+
+                    if not fetching and not parsing:
+                        break
+
+                    done, _ = wait(list(fetching) + list(parsing),
+                                   return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        if fut in fetching:
+                            kind, url = fetching.pop(fut)
+                            try:
+                                pages, seconds = fut.result()
+                            except Exception as e:
+                                del state.in_flight[url]
+                                self._failed(kind, url, e)
+                                continue
+                            self.stats['fetched'] += pages
+                            self.stats['fetch seconds'] += seconds
+                            parsing[parse_pool.submit(_parse, kind, url)] = (kind, url)
+                        else:
+                            kind, url = parsing.pop(fut)
+                            del state.in_flight[url]
+                            try:
+                                links, seconds, metrics, error = fut.result()
+                            except Exception as e:
+                                self._failed(kind, url, e)
+                                continue
+                            METRICS.merge(metrics)
+                            if error:
+                                self._failed(kind, url, error)
+                                continue
+                            state.attempts.pop(url, None)
+                            self.stats['parsed'][kind] += 1
+                            self.stats['parse seconds'] += seconds
+                            self._queue(links)
+
+                            finished += 1
+                            if finished % self.checkpoint_every == 0:
+                                state.checkpoint()
+            except KeyboardInterrupt:
+                print('Interrupted; checkpointing the frontier.')
+                for fut in list(fetching) + list(parsing):
+                    fut.cancel()
+                raise
+            finally:
+                state.checkpoint()
+
+        self.stats['seconds'] = time.perf_counter() - start
+        return self.stats
+
+    def summary(self):
+        """
+        A printable summary of the throughput of the run
+        """
+        s = self.stats
+        seconds = s.get('seconds', 0.0)
+        parsed = sum(s['parsed'].values())
+        lines = [
+            'Parsed {} pages ({}) in {:.1f}s -> {:.2f} pages/s'.format(
+                parsed,
+                ', '.join('{} {}s'.format(n, k) for k, n in sorted(s['parsed'].items())) or 'none',
+                seconds, parsed / seconds if seconds else 0.0),
+            'Fetched {} pages, {:.2f}s per page across {} fetchers'.format(
+                s['fetched'], s['fetch seconds'] / s['fetched'] if s['fetched'] else 0.0,
+                self.fetchers),
+            'Parse time {:.2f}s per page across {} parsers'.format(
+                s['parse seconds'] / parsed if parsed else 0.0, self.parsers),
+            'Failed attempts {}, newly quarantined {}, {} quarantined in all'.format(
+                s['failed'], s['quarantined'], len(self.state.quarantine)),
+            'Queued {} new pages, {} left in the frontier'.format(
+                s['queued'], len(self.state.frontier))
+        ]
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl the House corpus')
+    parser.add_argument('--floor', action='append', default=[],
+                        help='Floor proceedings to seed from, e.g. HDoc-116-1-FloorProceedings.xml')
+    parser.add_argument('--refresh-floor', action='store_true',
+                        help='Download the named floor proceedings again')
+    parser.add_argument('--no-seed', action='store_true',
+                        help='Only resume the saved frontier')
+    parser.add_argument('-f', '--fetchers', type=int, default=8)
+    parser.add_argument('-p', '--parsers', type=int, default=None)
+    parser.add_argument('-n', '--limit', type=int, default=None,
+                        help='Stop after parsing this many pages')
+    parser.add_argument('--follow', default='bill,rep,vote',
+                        help='The kinds of linked pages to queue')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--delay', type=float, default=0.5,
+                        help='The least seconds between requests to a host')
+    parser.add_argument('--state', default=CrawlState.PATH)
+    parser.add_argument('--no-image', action='store_true',
+                        help="Don't rewrite the corpus image when done")
+    parser.add_argument('--quarantine', action='store_true',
+                        help='List the quarantined pages and exit')
+    parser.add_argument('--retry-quarantine', action='store_true',
+                        help='Requeue the quarantined pages')
+    args = parser.parse_args()
+
+    state = CrawlState(args.state)
+    if args.quarantine:
+        for url, q in sorted(state.quarantine.items()):
+            print('{}\t{}\t{}'.format(q['kind'], url, q['error']))
+        raise SystemExit
+
+    if args.retry_quarantine:
+        print('Requeued {} quarantined pages.'.format(state.release()))
+
+    crawler = Crawler(state, fetchers=args.fetchers, parsers=args.parsers,
+                      max_attempts=args.max_attempts,
+                      follow=args.follow.split(','), delay=args.delay)
+    if not args.no_seed:
+        print('Seeding from floor sessions.')
+        crawler.seed(args.floor, force_reload=args.refresh_floor)
+
+    print('Crawling {} pages.'.format(len(state.frontier)))
+    try:
+        crawler.run(limit=args.limit)
+    finally:
+        print(crawler.summary())
+        print('Metrics written to {} and {}.'.format(*METRICS.export('crawl')))
+
+    if not args.no_image:
+        from image import update_image
+        update_image()
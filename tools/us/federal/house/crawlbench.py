@@ -0,0 +1,89 @@
+"""
+Measures end-to-end crawl throughput against the fixture server
+(see fixtureserver.py): a crawl is seeded from a served floor
+proceedings file and run in a scratch directory, through the same
+fetch and parse pools as crawl.py, then pages per second and the
+requests the server saw are reported.
+
+    python crawlbench.py -n 200 -f 16 -p 4 --latency 0.25 --error-rate 0.05
+"""
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+
+from crawl import Crawler, CrawlState
+from fixtures import make_dirs
+from fixtureserver import FixtureServer, ETAG_MODES
+from metrics import METRICS
+
+
+def bench(server, floor, limit=200, fetchers=8, parsers=None, max_attempts=3, delay=0.0):
+    """
+    Crawls from the fixture server, in the current directory
+
+    :param server: A started FixtureServer
+    :param floor: The floor proceedings file to seed from - str
+    :param limit: Stop after this many pages are parsed - int
+    :param delay: The least seconds between requests (see utils.Throttle) - float
+    :return: The crawler, after its run
+    """
+    os.environ['HOUSE_ORIGIN'] = server.url
+    make_dirs('.')
+    METRICS.reset()
+
+    crawler = Crawler(CrawlState(), fetchers=fetchers, parsers=parsers,
+                      max_attempts=max_attempts, delay=delay)
+    crawler.seed(floors=[floor])
+    crawler.run(limit=limit)
+    return crawler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark a crawl against the fixture server')
+    parser.add_argument('-n', '--limit', type=int, default=200,
+                        help='Pages to parse')
+    parser.add_argument('-f', '--fetchers', type=int, default=8)
+    parser.add_argument('-p', '--parsers', type=int, default=None)
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='The least seconds between requests')
+    parser.add_argument('--floor', default='HDoc-116-1-FloorProceedings.xml')
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help='Mean seconds the server adds to each response')
+    parser.add_argument('--jitter', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--etag', choices=ETAG_MODES, default='strong')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', action='store_true',
+                        help='Keep the scratch directory')
+    args = parser.parse_args()
+
+    server = FixtureServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           etag=args.etag, scale=args.scale, seed=args.seed)
+    server.start()
+    home = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix='house-crawlbench-')
+    try:
+        os.chdir(scratch)
+        crawler = bench(server, args.floor, args.limit, args.fetchers,
+                        args.parsers, args.max_attempts, args.delay)
+        print(crawler.summary())
+        METRICS.export('crawlbench')
+    finally:
+        os.chdir(home)
+        server.stop()
+        if args.keep:
+            print('Kept the crawl in {}.'.format(scratch))
+        else:
+            shutil.rmtree(scratch)
+
+    stats = server.stats()
+    print('Server: {} requests, {:.1f} MB; by status {}'.format(
+        stats['requests'], stats['bytes_out'] / 1e6, json.dumps(stats['statuses'], sort_keys=True)))
+    for route, statuses in sorted(stats['routes'].items()):
+        print('  {:<11} {}'.format(route, ', '.join(
+            '{} {}'.format(n, s) for s, n in sorted(statuses.items()))))
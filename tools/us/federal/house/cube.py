@@ -0,0 +1,140 @@
+from datetime import datetime
+from collections import defaultdict
+
+from utils import party_initial
+from committees import committee_key
+
+DIMENSIONS = ('congress', 'month', 'subject', 'committee', 'party', 'stage')
+
+
+def _coordinates(bill):
+    """
+    The cube coordinates of a bill, one per committee it was referred to
+
+    :param bill: The Bill
+    :return: List of dicts of dimension -> value
+    """
+    sponsor = bill.get_overview().get('sponsor', {})
+    month = None
+    if sponsor.get('date'):
+        month = datetime.fromtimestamp(sponsor['date']).strftime('%Y-%m')
+
+    # Keyed by committee_key, as the overview and the committee
+    # table name the same committee differently
+    names = bill.get_overview().get('committees') or \
+        sorted({c['committee'] for c in bill._committees if c['committee']})
+    committees = list(dict.fromkeys(committee_key(n) for n in names)) or [None]
+
+    return [{
+        'congress': bill.get_congress(),
+        'month': month,
+        'subject': bill.subjects.get('main', {}).get('title'),
+        'committee': com,
+        'party': party_initial(sponsor.get('name')),
+        'stage': bill.get_progress()
+    } for com in committees]
+
+
+class TrendCube:
+
+    """
+    Bill counts pre-aggregated by (congress, month, subject,
+    committee, sponsor party, progress stage).
+    Dimension values are dictionary-encoded to small ints and
+    each cell holds two measures: the number of bills and the
+    number of committee referrals. A bill referred to several
+    committees counts once as a bill but once per committee
+    as a referral, so roll-ups over committees don't double count.
+    """
+
+    def __init__(self):
+        # Dimension -> value -> code, and the reverse
+        self._codes = {d: {} for d in DIMENSIONS}
+        self._values = {d: [] for d in DIMENSIONS}
+
+        # Cell (tuple of codes) -> [bills, referrals]
+        self._cells = defaultdict(lambda: [0, 0])
+
+        # Bill -> the cells it contributed to
+        self._contributed = {}
+
+    def __contains__(self, bill):
+        return bill in self._contributed
+
+    def __iter__(self):
+        return iter(list(self._contributed))
+
+    def _encode(self, dim, value):
+        codes = self._codes[dim]
+        if value not in codes:
+            codes[value] = len(self._values[dim])
+            self._values[dim].append(value)
+        return codes[value]
+
+    def add(self, bill):
+        """
+        Adds a bill to the cube
+        """
+        cells = []
+        for i, coord in enumerate(_coordinates(bill)):
+            cell = tuple(self._encode(d, coord[d]) for d in DIMENSIONS)
+            measures = self._cells[cell]
+            if i == 0:
+                measures[0] += 1
+            measures[1] += 1
+            cells.append(cell)
+        self._contributed[bill] = cells
+
+    def remove(self, bill):
+        """
+        Removes a bill from the cube
+        """
+        for i, cell in enumerate(self._contributed.pop(bill, [])):
+            measures = self._cells[cell]
+            if i == 0:
+                measures[0] -= 1
+            measures[1] -= 1
+            if not measures[1]:
+                del self._cells[cell]
+
+    def query(self, group_by=(), **filters):
+        """
+        Slices the cube by the filters and rolls it up
+        to the group_by dimensions
+
+        e.g. query(('month',), congress=116, subject='Taxation')
+
+        :param group_by: The dimensions to keep - tuple of str
+        :param filters: dimension=value, or dimension=collection of values;
+                        committees may be given in any form of their name
+        :return: dict of group tuple -> count; counts are referrals when
+                 grouping or filtering by committee, bills otherwise.
+                 Committees are grouped by their keys (see committees.committee_key).
+        """
+        for d in tuple(group_by) + tuple(filters):
+            if d not in DIMENSIONS:
+                raise ValueError('ValueError: Unknown dimension {}.'.format(d))
+
+        if 'committee' in filters:
+            v = filters['committee']
+            values = v if isinstance(v, (set, frozenset, list, tuple)) else [v]
+            filters['committee'] = {committee_key(x) if x else x for x in values}
+
+        allowed = {}
+        for d, v in filters.items():
+            values = v if isinstance(v, (set, frozenset, list, tuple)) else [v]
+            allowed[DIMENSIONS.index(d)] = {self._codes[d][x] for x in values
+                                            if x in self._codes[d]}
+
+        measure = 1 if 'committee' in group_by or 'committee' in filters else 0
+        idx = [DIMENSIONS.index(d) for d in group_by]
+
+        res = defaultdict(int)
+        for cell, measures in self._cells.items():
+            if any(cell[i] not in codes for i, codes in allowed.items()):
+                continue
+            if measures[measure]:
+                res[tuple(cell[i] for i in idx)] += measures[measure]
+
+        return {tuple(self._values[group_by[j]][c] for j, c in enumerate(key)): n
+                for key, n in res.items()}
@@ -0,0 +1,418 @@
+"""
+Generates synthetic congress.gov and clerk pages for benchmarking
+the parsers offline (see bench.py).
+
+The pages follow the markup the parsers expect and are written to
+the page caches under a data root, so loading them never touches
+the network:
+
+    python fixtures.py /tmp/house-fixtures --bills 20 --scale 2
+"""
+
+import os
+import random
+import argparse
+from datetime import date, timedelta
+
+ROOT_URL = 'https://www.congress.gov'
+CLERK_URL = 'http://clerk.house.gov'
+
+WORDS = ('act', 'federal', 'program', 'state', 'grant', 'secretary', 'health',
+         'energy', 'tax', 'credit', 'amend', 'section', 'public', 'law', 'fund',
+         'agency', 'report', 'election', 'security', 'service', 'education',
+         'water', 'rural', 'veteran', 'benefit', 'year', 'fiscal', 'authorize')
+
+COMMITTEES = ('Ways and Means', 'Judiciary', 'Energy and Commerce',
+              'Financial Services', 'Armed Services', 'Oversight and Reform')
+
+SUBJECTS = ('Taxation', 'Health', 'Crime and Law Enforcement', 'Education',
+            'Armed Forces and National Security', 'Government Operations and Politics')
+
+STATES = ('PA', 'NY', 'CA', 'TX', 'FL', 'OH', 'GA', 'NC', 'MI', 'IL')
+
+PARTIES = (('D', 'Democratic'), ('R', 'Republican'))
+
+STAGES = ('Introduced', 'Passed House', 'Passed Senate', 'To President', 'Became Law')
+
+
+def _text(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def _date(rng, start=date(2019, 1, 3), days=700):
+    return start + timedelta(days=rng.randrange(days))
+
+
+def _member(rng, i):
+    """
+    A synthetic member: (bioguide ID, URL path, display name, party, state)
+    """
+    party, _ = PARTIES[i % 2]
+    state = STATES[i % len(STATES)]
+    surname = 'Member{}'.format(i)
+    mid = '{}{:06d}'.format(surname[0], i)
+    return (mid, '/member/{}/{}'.format(surname.lower(), mid),
+            'Rep. {}, Pat [{}-{}-{}]'.format(surname, party, state, i % 20 + 1),
+            party, state)
+
+
+def bill_url(congress, number):
+    return '{}/bill/{}th-congress/house-bill/{}/all-info'.format(ROOT_URL, congress, number)
+
+
+def bill_page(rng, congress, number, scale=1):
+    """
+    A bill's all-info page
+
+    :param rng: random.Random
+    :param congress: int
+    :param number: The bill number - int
+    :param scale: Multiplies the number of actions, cosponsors, etc. - int
+    :return: str
+    """
+    intro = _date(rng)
+    mid, path, name, _, _ = _member(rng, rng.randrange(400))
+    stage = rng.randrange(len(STAGES))
+    committee = rng.choice(COMMITTEES)
+
+    overview = [
+        '<tr><th>Sponsor:</th><td><a href="{}">{}</a> (Introduced {})</td></tr>'.format(
+            path, name, intro.strftime('%m/%d/%Y')),
+        '<tr><th>Committees:</th><td>House - {}; {}</td></tr>'.format(
+            committee, rng.choice(COMMITTEES)),
+        '<tr><th>Committee Reports:</th><td><a href="/congressional-report/{0}th-congress/'
+        'house-report/{1}">H. Rept. {0}-{1}</a></td></tr>'.format(congress, number),
+        '<tr><th>Latest Action:</th><td>House - {} {}.\xa0 (All Actions)</td></tr>'.format(
+            (intro + timedelta(days=30)).strftime('%m/%d/%Y'), _text(rng, 8)),
+        '<tr><th>Roll Call Votes:</th><td>There have been <a href="#">{} roll call votes</a>'
+        '</td></tr>'.format(rng.randrange(1, 6)),
+        '<tr><th>Committee Meetings:</th><td>{}<a href="/meetings">(All Meetings)</a></td></tr>'.format(
+            ''.join('<a href="/event/{}/{}">{} {}:{:02d}{}</a> '.format(
+                number, k, _date(rng).strftime('%m/%d/%y'), rng.randrange(1, 13),
+                rng.choice((0, 15, 30)), rng.choice(('AM', 'PM')))
+                for k in range(2 * scale)))
+    ]
+
+    progress = ''.join(
+        '<li class="{}">{}<div class="sol-step-info">{}</div></li>'.format(
+            'passed' if i < stage else 'selected' if i == stage else '', s, _text(rng, 3))
+        for i, s in enumerate(STAGES))
+
+    titles = (
+        '<div id="titles-content">\n'
+        '<div class="shortTitles">\n<h3>Short Titles</h3>\n<h4>Short Titles as Introduced</h4>\n'
+        '<p>{0}</p>\n</div>\n'
+        '<div class="titles-row">\n<div class="house-column">\n<h4>House</h4>\n'
+        '<h4>Short Titles as Passed House</h4>\n<p>{0}</p>\n</div>\n'
+        '<div class="senate-column">\n<h4>Senate</h4>\n</div>\n</div>\n'
+        '<div class="officialTitles">\n<div class="house-column">\n<h4>Official Titles - House</h4>\n'
+        '<h4>Official Title as Introduced</h4>\n<p>{1}</p>\n</div>\n</div>\n'
+        '</div>').format(_text(rng, 5).title() + ' Act', 'To ' + _text(rng, 30) + '.')
+
+    action_days = sorted(_date(rng, intro, 300) for _ in range(40 * scale))
+    action_overview = ''.join(
+        '<tr><td class="date">{}</td><td class="actions">{}</td></tr>'.format(
+            d.strftime('%m/%d/%Y'), _text(rng, 10)) for d in action_days[::8])
+    actions = ''.join(
+        '<tr><td>{}-{}:{:02d}{}</td><td>House</td><td>{}</td></tr>'.format(
+            d.strftime('%m/%d/%Y'), rng.randrange(1, 13), rng.randrange(60),
+            rng.choice(('am', 'pm')), _text(rng, 12))
+        if k % 3 else
+        '<tr><td>{}</td><td>{}</td></tr>'.format(d.strftime('%m/%d/%Y'), _text(rng, 12))
+        for k, d in enumerate(action_days))
+
+    cosponsors = []
+    for i in rng.sample(range(400), min(400, 50 * scale)):
+        _, cpath, cname, _, _ = _member(rng, i)
+        cosponsors.append('<tr><td><a href="{}">{}{}</a></td><td>{}</td></tr>'.format(
+            cpath, cname, '*' if rng.random() < 0.5 else '', _date(rng).strftime('%m/%d/%Y')))
+
+    committees = []
+    for c in rng.sample(COMMITTEES, 2):
+        committees.append(
+            '<tr class="committee"><th>{} Committee</th><td>{}</td><td>Referred to</td>'
+            '<td></td></tr>'.format(c, intro.strftime('%m/%d/%Y')))
+        for k in range(scale):
+            committees.append(
+                '<tr class="subcommittee"><th>{} Subcommittee</th><td>{}</td><td>Hearings held</td>'
+                '<td><a href="/congressional-report/x/{}">H. Rept. {}</a></td></tr>'.format(
+                    rng.choice(WORDS).title(), _date(rng, intro, 100).strftime('%m/%d/%Y'), k, k))
+
+    related = ''.join(
+        '<tr><td><a href="/bill/{0}th-congress/house-bill/{1}">H.R.{1}</a></td><td>{2}</td>'
+        '<td>Related bill</td><td>CRS</td><td>{3}</td></tr>'.format(
+            congress, rng.randrange(1, 5000), _text(rng, 6), _text(rng, 6))
+        for _ in range(5 * scale))
+
+    subjects = rng.sample(SUBJECTS, 3)
+    return (
+        '<html><body>\n'
+        '<h1 class="legDetail">\n{pad}H.R.{number} - {title}<span>{congress}th Congress '
+        '(2019-2020)</span></h1>\n'
+        '<div class="overview"><table>{overview}</table></div>\n'
+        '<ol class="bill_progress">{progress}</ol>\n'
+        '{titles}\n'
+        '<div id="actionsOverview-content"><table><tbody>{action_overview}</tbody></table></div>\n'
+        '<div id="allActions-content"><table><tbody>{actions}</tbody></table></div>\n'
+        '<div id="cosponsors-content"><table><tbody>{cosponsors}</tbody></table></div>\n'
+        '<div id="committees-content"><table><tbody>{committees}</tbody></table></div>\n'
+        '<table class="relatedBills"><tbody>{related}</tbody></table>\n'
+        '<div id="subjects-content"><div class="search-column-nav"><ul><li>'
+        '<a href="/search?q={main}">{main}</a></li></ul></div>'
+        '<div class="search-column-main"><ul>{others}</ul></div></div>\n'
+        '<div id="latestSummary-content">{summary}</div>\n'
+        '<div id="cboEstimate"></div>\n'
+        '</body></html>').format(
+        pad=' ' * 33, number=number, title=_text(rng, 6), congress=congress,
+        overview=''.join(overview), progress=progress, titles=titles,
+        action_overview=action_overview, actions=actions, cosponsors=''.join(cosponsors),
+        committees=''.join(committees), related=related, main=subjects[0],
+        others=''.join('<li><a href="/search?q={0}">{0}</a></li>'.format(s) for s in subjects[1:]),
+        summary=''.join('<p>{}</p>'.format(_text(rng, 60)) for _ in range(3 * scale)))
+
+
+def bill_text_page(rng, scale=1):
+    """
+    A bill's text page
+    """
+    lines = ['SEC. {}. {}.\n\n    {}'.format(i + 1, _text(rng, 4).upper(), _text(rng, 200))
+             for i in range(10 * scale)]
+    return '<html><body><pre id="billTextContainer">{}</pre></body></html>'.format(
+        '\n\n'.join(lines))
+
+
+def amendments_page(rng, congress, scale=1):
+    """
+    A bill's amendments page
+    """
+    items = []
+    for i in range(5 * scale):
+        _, path, name, _, _ = _member(rng, rng.randrange(400))
+        items.append(
+            '<li class="expanded">'
+            '<span class="amendment-heading"><a href="/amendment/{0}th-congress/house-amendment/{1}">'
+            'H.Amdt.{1}</a></span>'
+            '<span class="result-item"><strong>Purpose:</strong> {2}</span>'
+            '<span class="result-item"><strong>Sponsor:</strong> <a href="{3}">{4}</a></span>'
+            '<span class="result-item"><strong>Latest Action:</strong> {5} {6}</span>'
+            '<span class="result-item"><strong>Description:</strong> {7}</span>'
+            '</li>'.format(congress, rng.randrange(1, 1000), _text(rng, 12), path, name,
+                           _date(rng).strftime('%m/%d/%y'), _text(rng, 6), _text(rng, 20)))
+    return '<html><body><div id="main"><ol>{}</ol></div></body></html>'.format(''.join(items))
+
+
+def member_url(i):
+    return ROOT_URL + _member(random.Random(i), i)[1]
+
+
+def member_page(rng, i, scale=1):
+    """
+    A member's profile page
+    """
+    _, _, _, party, state = _member(rng, i)
+    start = rng.randrange(101, 114)
+    positions = ''.join(
+        '<tr><td>{}</td><td>{}</td><td>House: {}th-{}th ({}-{})</td></tr>'.format(
+            state, k + 1, start, 116, 1789 + 2 * (start - 1), 'Present')
+        for k in range(scale))
+    return (
+        '<html><body>'
+        '<h1 class="legDetail">Representative Pat Member{i}'
+        '<span class="birthdate">({birth} - )</span>'
+        '<span>In Congress {year} - Present</span></h1>'
+        '<div class="overview-member-column-picture"><img src="img/member/{i}.jpg"/></div>'
+        '<div class="overview-member-column-profile member_profile">'
+        '<table><thead><tr><th>State</th><th>District</th><th>In Congress</th></tr></thead>'
+        '<tbody>{positions}</tbody></table>'
+        '<table><tbody>'
+        '<tr><th>Website</th><td><a href="https://member{i}.house.gov">member{i}.house.gov</a></td></tr>'
+        '<tr><th>Contact</th><td>{i} Rayburn House Office Building<br/>Washington, DC 20515</td></tr>'
+        '<tr><th>Party</th><td>{party}</td></tr>'
+        '</tbody></table></div>'
+        '</body></html>').format(
+        i=i, birth=rng.randrange(1940, 1985), year=1789 + 2 * (start - 1),
+        positions=positions, party=dict(PARTIES)[party])
+
+
+def member_bills_page(rng, i, congress, pg, total, page_size=100, scale=1):
+    """
+    A page of a member's sponsored legislation (the profile URL with ?page=N)
+
+    :param pg: The page number, from 1 - int
+    :param total: The number of bills the member sponsored - int
+    """
+    first = (pg - 1) * page_size
+    numbers = range(first + 1, min(total, first + page_size) + 1)
+    results = ''.join(
+        '<li class="expanded"><span class="result-heading">'
+        '<a href="/bill/{}th-congress/house-bill/{}?r={}">H.R.{}</a></span>'
+        '<span class="result-item">{}</span></li>'.format(
+            congress, i * 1000 + n, n, i * 1000 + n, _text(rng, 10))
+        for n in numbers)
+    return member_page(rng, i, scale).replace(
+        '</body>',
+        '<span class="results-number">{}-{} of {}</span><ol class="basic-search-results-lists">'
+        '{}</ol></body>'.format(first + 1, first + len(numbers), total, results))
+
+
+def vote_url(year, roll):
+    return '{}/evs/{}/roll{:03d}.xml'.format(CLERK_URL, year, roll)
+
+
+def vote_xml(rng, congress, roll, members=435):
+    """
+    A roll call vote
+    """
+    recorded = []
+    totals = {p: {'Yea': 0, 'Nay': 0, 'Present': 0, 'Not Voting': 0} for p, _ in PARTIES}
+    for i in range(members):
+        mid, _, _, party, state = _member(rng, i)
+        vote = rng.choice(('Yea', 'Yea', 'Nay', 'Nay', 'Present', 'Not Voting'))
+        totals[party][vote] += 1
+        recorded.append(
+            '<recorded-vote><legislator name-id="{}" sort-field="Member{}" unaccented-name="Member{}" '
+            'party="{}" state="{}" role="legislator">Member{}</legislator><vote>{}</vote>'
+            '</recorded-vote>'.format(mid, i, i, party, state, i, vote))
+
+    def tot(t):
+        return ('<yea-total>{Yea}</yea-total><nay-total>{Nay}</nay-total>'
+                '<present-total>{Present}</present-total>'
+                '<not-voting-total>{Not Voting}</not-voting-total>').format(**t)
+
+    by_party = ''.join('<totals-by-party><party>{}</party>{}</totals-by-party>'.format(
+        name, tot(totals[p])) for p, name in PARTIES)
+    overall = {k: sum(t[k] for t in totals.values()) for k in ('Yea', 'Nay', 'Present', 'Not Voting')}
+    day = _date(rng)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<rollcall-vote><vote-metadata>'
+        '<majority>D</majority><congress>{congress}</congress><session>1st</session>'
+        '<chamber>U.S. House of Representatives</chamber><rollcall-num>{roll}</rollcall-num>'
+        '<legis-num>H R {num}</legis-num><vote-question>On Passage</vote-question>'
+        '<vote-type>YEA-AND-NAY</vote-type><vote-result>Passed</vote-result>'
+        '<action-date>{day}</action-date><action-time time-etz="{hour}:{minute:02d}">x</action-time>'
+        '<vote-desc>{desc}</vote-desc><vote-totals>{by_party}'
+        '<totals-by-vote><total-stub>Totals</total-stub>{overall}</totals-by-vote>'
+        '</vote-totals></vote-metadata><vote-data>{recorded}</vote-data></rollcall-vote>').format(
+        congress=congress, roll=roll, num=rng.randrange(1, 5000),
+        day='{}-{}-{}'.format(day.day, day.strftime('%b'), day.year),
+        hour=rng.randrange(9, 22), minute=rng.randrange(60), desc=_text(rng, 8),
+        by_party=by_party, overall=tot(overall), recorded=''.join(recorded))
+
+
+def floor_xml(rng, congress, days=10, actions=30):
+    """
+    A FloorProceedings file
+    """
+    blocks = []
+    day = date(2019, 1, 3)
+    for d in range(days):
+        items = []
+        for a in range(actions):
+            n = rng.randrange(1, 5000)
+            if a % 3 == 0:
+                link = '<a href="{}/bill/{}th-congress/house-bill/{}" rel="bill">H.R. {}</a>'.format(
+                    ROOT_URL, congress, n, n)
+            elif a % 3 == 1:
+                link = '<a href="{}" rel="vote">Roll no. {}</a>'.format(vote_url(day.year, n % 700 + 1), n)
+            else:
+                link = None
+            items.append(
+                '<floor_action act-id="H{:04d}" unique-id="{}-{}" update-date-time="{}">'
+                '<action_time for-search="{}T{:02d}:{:02d}:00">x</action_time>'
+                '{}<action_description>{} {}</action_description></floor_action>'.format(
+                    a, day.strftime('%Y%m%d'), a, day.isoformat(), day.isoformat(),
+                    10 + a * 10 // 60 % 12, a * 10 % 60,
+                    '<action_item>H.R. {}</action_item>'.format(n) if link else '',
+                    _text(rng, 15), link or ''))
+        blocks.append(
+            '<legislative_activity><legislative_day date="{}">{}</legislative_day>'
+            '<legislative_header>{}</legislative_header><language>en</language>'
+            '<floor_actions>{}</floor_actions></legislative_activity>'.format(
+                day.strftime('%Y%m%d'), day.strftime('%A, %B %d, %Y'), _text(rng, 6), ''.join(items)))
+        day += timedelta(days=rng.randrange(1, 4))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<legislative_activities>'
+            '<floor_summary><congress>{}</congress><session>1st</session>'
+            '{}</floor_summary></legislative_activities>'.format(congress, ''.join(blocks)))
+
+
+def _cache(root, directory, url):
+    """
+    The cache path a page's class reads it from (see e.g. Bill.load_from_url)
+    """
+    return os.path.join(root, 'data/us/federal/house', directory, 'web',
+                        url.split('://')[-1].replace('/', '_'))
+
+
+def make_dirs(root):
+    """
+    Makes the cache and JSON directories of every page type under a root
+    """
+    for directory in ('bills', 'votes', 'reps', 'session'):
+        for sub in ('web', 'json'):
+            os.makedirs(os.path.join(root, 'data/us/federal/house', directory, sub), exist_ok=True)
+
+
+def write_fixtures(root, bills=10, votes=10, members=10, floors=1, scale=1, seed=0):
+    """
+    Writes a set of fixture pages into the page caches under a root
+
+    :param root: The directory to treat as the working directory - str
+    :param bills: The number of bill pages - int
+    :param votes: The number of roll call votes - int
+    :param members: The number of member profiles - int
+    :param floors: The number of FloorProceedings files - int
+    :param scale: Multiplies the size of every page - int
+    :param seed: Seeds the generator, for reproducible fixtures - int
+    :return: dict of page type -> the URLs (or file names) to load
+    """
+    rng = random.Random(seed)
+    congress = 116
+    make_dirs(root)
+
+    def write(path, text):
+        with open(path, 'w+') as out_file:
+            out_file.write(text)
+
+    pages = {'bill': [], 'vote': [], 'rep': [], 'session': []}
+    for n in range(1, bills + 1):
+        url = bill_url(congress, n)
+        base = url[:-len('/all-info')]
+        write(_cache(root, 'bills', url), bill_page(rng, congress, n, scale))
+        write(_cache(root, 'bills', base + '/text?format=txt'), bill_text_page(rng, scale))
+        write(_cache(root, 'bills', base + '/amendments'), amendments_page(rng, congress, scale))
+        pages['bill'].append(url)
+
+    for n in range(1, votes + 1):
+        url = vote_url(2019, n)
+        write(_cache(root, 'votes', url), vote_xml(rng, congress, n, members=435))
+        pages['vote'].append(url)
+
+    for i in range(members):
+        url = member_url(i)
+        write(_cache(root, 'reps', url), member_page(rng, i, scale))
+        pages['rep'].append(url)
+
+    for f in range(floors):
+        name = 'HDoc-{}-{}-FloorProceedings.xml'.format(congress, f + 1)
+        write(os.path.join(root, 'data/us/federal/house/session/web', name),
+              floor_xml(rng, congress, days=10 * scale, actions=30))
+        pages['session'].append(name)
+
+    return pages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic House pages')
+    parser.add_argument('root', help='The directory to write data/us/federal/house/... under')
+    parser.add_argument('--bills', type=int, default=10)
+    parser.add_argument('--votes', type=int, default=10)
+    parser.add_argument('--members', type=int, default=10)
+    parser.add_argument('--floors', type=int, default=1)
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    written = write_fixtures(args.root, args.bills, args.votes, args.members,
+                             args.floors, args.scale, args.seed)
+    for kind, urls in written.items():
+        print('{} {} pages'.format(len(urls), kind))
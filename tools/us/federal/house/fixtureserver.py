@@ -0,0 +1,279 @@
+"""
+A local stand-in for congress.gov and clerk.house.gov, serving
+synthetic pages (see fixtures.py) at the URLs the scrapers request,
+with injected latency, errors and ETag behaviour.
+
+Point the scrapers at it with the HOUSE_ORIGIN environment variable
+(see utils.origin_url):
+
+    python fixtureserver.py --port 8000 --latency 0.2 --error-rate 0.05
+    HOUSE_ORIGIN=http://127.0.0.1:8000 python crawl.py --floor HDoc-116-1-FloorProceedings.xml
+
+Pages are generated from their paths, so the same URL always serves
+the same page, and every bill, member and roll call linked exists.
+GET /_stats gives the requests served by route and status.
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import fixtures
+
+BOM = '\ufeff'.encode()
+
+# Route -> path pattern
+ROUTES = (
+    ('bill', re.compile(r'^/bill/(\d+)th-congress/house-bill/(\d+)/all-info$')),
+    ('text', re.compile(r'^/bill/(\d+)th-congress/house-bill/(\d+)/text$')),
+    ('amendments', re.compile(r'^/bill/(\d+)th-congress/house-bill/(\d+)/amendments$')),
+    ('member', re.compile(r'^/member/[^/]+/[A-Z](\d+)$')),
+    ('vote', re.compile(r'^/evs/(\d{4})/roll(\d+)\.xml$')),
+    ('floor', re.compile(r'^/floorsummary/HDoc-(\d+)-(\d+)-FloorProceedings\.xml$'))
+)
+
+# How ETags are served:
+# - none     -> no ETag
+# - strong   -> a hash of the page, honouring If-None-Match with a 304
+# - weak     -> the same, as a weak validator (W/"...")
+# - unstable -> a new ETag on every response, so nothing revalidates
+ETAG_MODES = ('none', 'strong', 'weak', 'unstable')
+
+
+class FixtureServer:
+
+    """
+    Serves synthetic pages from a thread
+
+    :param host: str
+    :param port: 0 picks a free port - int
+    :param latency: Mean seconds added to each response - float
+    :param jitter: Latency varies uniformly by this fraction - float
+    :param error_rate: The fraction of responses that are errors - float
+    :param errors: The status codes errors are drawn from
+    :param etag: One of ETAG_MODES - str
+    :param scale: Multiplies the size of every page - int
+    :param sponsored: The bills each member sponsored - int
+    :param floor_days: Legislative days per floor proceedings file - int
+    :param seed: Seeds the pages and the injected faults - int
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.5,
+                 error_rate=0.0, errors=(500, 503, 429), etag='strong',
+                 scale=1, sponsored=150, floor_days=10, seed=0):
+        if etag not in ETAG_MODES:
+            raise ValueError('ETag mode {!r} is not one of {}'.format(etag, ETAG_MODES))
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.errors = tuple(errors)
+        self.etag = etag
+        self.scale = scale
+        self.sponsored = sponsored
+        self.floor_days = floor_days
+        self.seed = seed
+
+        self._faults = random.Random(seed)
+        self._lock = threading.Lock()
+        self._etags = 0
+
+        # (route, status) -> count
+        self.counts = defaultdict(int)
+        self.bytes_out = 0
+
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        """
+        Serves from a background thread
+
+        :return: The server's URL, to set as HOUSE_ORIGIN
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def stats(self):
+        """
+        The requests served, by route and by status
+
+        :return: dict
+        """
+        with self._lock:
+            res = {'routes': defaultdict(dict), 'statuses': defaultdict(int),
+                   'bytes_out': self.bytes_out}
+            for (route, status), n in self.counts.items():
+                res['routes'][route][str(status)] = n
+                res['statuses'][str(status)] += n
+            res['requests'] = sum(res['statuses'].values())
+            return res
+
+    def _count(self, route, status, size):
+        with self._lock:
+            self.counts[(route, status)] += 1
+            self.bytes_out += size
+
+    def _fault(self):
+        """
+        The delay and the error status (or None) of a response
+        """
+        with self._lock:
+            delay = self.latency * (1 + self.jitter * (2 * self._faults.random() - 1))
+            error = None
+            if self.error_rate and self._faults.random() < self.error_rate:
+                error = self._faults.choice(self.errors)
+            return max(delay, 0.0), error
+
+    def _next_etag(self, body):
+        if self.etag == 'unstable':
+            with self._lock:
+                self._etags += 1
+                return '"{}-{}"'.format(hashlib.sha1(body).hexdigest()[:16], self._etags)
+        tag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:16])
+        return 'W/' + tag if self.etag == 'weak' else tag
+
+    def page(self, route, match, query):
+        """
+        Generates the page of a route
+
+        :return: (content type, bytes)
+        """
+        path = match.group(0)
+        rng = random.Random('{}:{}?{}'.format(self.seed, path, sorted(query.items())))
+        if route == 'bill':
+            congress, number = map(int, match.groups())
+            return 'text/html', fixtures.bill_page(rng, congress, number, self.scale).encode()
+        if route == 'text':
+            return 'text/html', fixtures.bill_text_page(rng, self.scale).encode()
+        if route == 'amendments':
+            congress = int(match.group(1))
+            return 'text/html', fixtures.amendments_page(rng, congress, self.scale).encode()
+        if route == 'member':
+            i = int(match.group(1))
+            if 'page' in query:
+                pg = int(query['page'][0])
+                return 'text/html', fixtures.member_bills_page(
+                    rng, i, 116, pg, self.sponsored, scale=self.scale).encode()
+            return 'text/html', fixtures.member_page(rng, i, self.scale).encode()
+        if route == 'vote':
+            roll = int(match.group(2))
+            return 'text/xml', fixtures.vote_xml(rng, 116, roll).encode()
+        if route == 'floor':
+            congress = int(match.group(1))
+            # The clerk's files start with a byte order mark (see Session.load)
+            return 'text/xml', BOM + fixtures.floor_xml(
+                rng, congress, days=self.floor_days).encode()
+        raise KeyError(route)
+
+
+def _handler(server):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, body=b'', content_type='text/plain', headers=()):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def do_GET(self):
+            split = urlsplit(self.path)
+            if split.path == '/_stats':
+                self._send(200, json.dumps(server.stats()).encode(), 'application/json')
+                return
+
+            for route, pattern in ROUTES:
+                match = pattern.match(split.path)
+                if match:
+                    break
+            else:
+                server._count('unknown', 404, 0)
+                self._send(404, b'Not found')
+                return
+
+            delay, error = server._fault()
+            if delay:
+                time.sleep(delay)
+            if error:
+                body = '{} error'.format(error).encode()
+                headers = [('Retry-After', '1')] if error in (429, 503) else []
+                server._count(route, error, len(body))
+                self._send(error, body, headers=headers)
+                return
+
+            content_type, body = server.page(route, match, parse_qs(split.query))
+            headers = []
+            if server.etag != 'none':
+                etag = server._next_etag(body)
+                headers.append(('ETag', etag))
+                sent = [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]
+                if etag in sent or '*' in sent:
+                    server._count(route, 304, 0)
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+            server._count(route, 200, len(body))
+            self._send(200, body, content_type, headers)
+
+        do_HEAD = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve synthetic House pages')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Mean seconds added to each response')
+    parser.add_argument('--jitter', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--errors', default='500,503,429',
+                        help='The status codes to inject, comma separated')
+    parser.add_argument('--etag', choices=ETAG_MODES, default='strong')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--sponsored', type=int, default=150)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FixtureServer(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                           [int(e) for e in args.errors.split(',')], args.etag,
+                           args.scale, args.sponsored, seed=args.seed)
+    print('Serving on {}; set HOUSE_ORIGIN={}'.format(server.url, server.url))
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(json.dumps(server.stats(), indent=2, sort_keys=True))
@@ -0,0 +1,202 @@
+import re
+from statistics import median
+from collections import defaultdict
+
+from bill import STAGES, STAGE_CODES
+from utils import party_initial
+from committees import committee_key
+
+# Action text marking the day a stage was reached
+STAGE_ACTIONS = {
+    'Introduced': re.compile(r'^Introduced in (House|Senate)'),
+    'Agreed to in House': re.compile(r'Passed/agreed to in House|'
+                                     r'On agreeing to the resolution Agreed to', re.I),
+    'Passed House': re.compile(r'Passed/agreed to in House|On passage Passed', re.I),
+    'Agreed to in Senate': re.compile(r'Passed/agreed to in Senate', re.I),
+    'Passed Senate': re.compile(r'Passed/agreed to in Senate', re.I),
+    'Resolving Differences': re.compile(r'Resolving differences', re.I),
+    'To President': re.compile(r'Presented to President', re.I),
+    'Became Law': re.compile(r'Became Public Law|Signed by President', re.I)
+}
+
+DIMENSIONS = ('congress', 'subject', 'party', 'committee')
+
+# Simple and concurrent resolutions are agreed to rather than passed,
+# so they're funnelled apart from bills and joint resolutions
+RESOLUTION = re.compile(r'^[HS]\.(Con\.)?Res\.')
+
+
+def track(bill, mask=0):
+    """
+    The track of stages a bill moves along: 'resolution' for
+    simple and concurrent resolutions, otherwise 'bill'
+
+    :param bill: The Bill
+    :param mask: The bitmask of the stage codes it reached
+    :return: str
+    """
+    if RESOLUTION.match(bill.title or ''):
+        return 'resolution'
+    for code in range(len(STAGES)):
+        if mask >> code & 1 and STAGES[code].startswith('Agreed to'):
+            return 'resolution'
+    return 'bill'
+
+
+def _stage_times(bill):
+    """
+    The earliest timestamp each reached stage shows up in the actions
+
+    :param bill: The Bill
+    :return: dict of stage code -> timestamp
+    """
+    times = {}
+    for code in bill._stages_reached:
+        pattern = STAGE_ACTIONS.get(STAGES[code])
+        if not pattern:
+            continue
+        hits = [a['datetime'] for a in bill._actions if pattern.search(a['action'])]
+        if hits:
+            times[code] = min(hits)
+    if STAGE_CODES['Introduced'] not in times:
+        sponsor = bill.get_overview().get('sponsor', {})
+        if sponsor.get('date'):
+            times[STAGE_CODES['Introduced']] = sponsor['date']
+    return times
+
+
+def _groups(bill):
+    """
+    The (dimension, value) groups a bill falls in
+    """
+    overview = bill.get_overview()
+    groups = [
+        ('congress', bill.get_congress()),
+        ('subject', bill.subjects.get('main', {}).get('title')),
+        ('party', party_initial(overview.get('sponsor', {}).get('name')))
+    ]
+    for ck in dict.fromkeys(committee_key(c) for c in overview.get('committees', [])):
+        groups.append(('committee', ck))
+    return groups
+
+
+class ProgressFunnel:
+
+    """
+    How far bills get through the legislative process,
+    per congress, subject, sponsor party and committee.
+    Each bill is reduced at load to its track, a bitmask of stage codes
+    reached and the time it reached them; statistics per group and
+    track are computed from those and cached until the group changes.
+    """
+
+    def __init__(self):
+        # Bill -> (groups, track, reached bitmask, stage times)
+        self._bills = {}
+
+        # (dimension, value) -> set of bills
+        self._members = defaultdict(set)
+
+        # (dimension, value) -> computed statistics
+        self._cache = {}
+
+    def __contains__(self, bill):
+        return bill in self._bills
+
+    def __iter__(self):
+        return iter(list(self._bills))
+
+    def add(self, bill):
+        """
+        Adds a bill to the funnel
+        """
+        mask = 0
+        for code in bill._stages_reached:
+            mask |= 1 << code
+        groups = _groups(bill)
+        self._bills[bill] = (groups, track(bill, mask), mask, _stage_times(bill))
+        for g in groups:
+            self._members[g].add(bill)
+            self._cache.pop(g, None)
+
+    def remove(self, bill):
+        """
+        Removes a bill from the funnel
+        """
+        groups = self._bills.pop(bill, ([],))[0]
+        for g in groups:
+            self._members[g].discard(bill)
+            self._cache.pop(g, None)
+
+    def groups(self):
+        """
+        Every (dimension, value) group holding bills
+        """
+        return [g for g, bills in self._members.items() if bills]
+
+    def stats(self, dimension, value):
+        """
+        The funnel of a group of bills
+
+        :param dimension: 'congress', 'subject', 'party' or 'committee'
+        :param value: The value of the dimension; any form
+                      of a committee's name
+        :return: dict with, per track ('bill' or 'resolution') and per stage
+                 reached by any of its bills, the number of bills reaching it,
+                 the share of those at the previous stage that went on to
+                 reach it, and the median days taken from the previous stage
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError('ValueError: Unknown dimension {}.'.format(dimension))
+        if dimension == 'committee':
+            value = committee_key(value)
+
+        key = (dimension, value)
+        if key in self._cache:
+            return self._cache[key]
+
+        masks = defaultdict(list)
+        current = defaultdict(lambda: [0] * len(STAGES))
+        gaps = defaultdict(lambda: defaultdict(list))
+        for bill in self._members.get(key, ()):
+            _, tr, mask, times = self._bills[bill]
+            masks[tr].append(mask)
+            if bill._stage is not None:
+                current[tr][bill._stage] += 1
+            ordered = sorted(times.items(), key=lambda t: t[1])
+            for (a, ta), (b, tb) in zip(ordered, ordered[1:]):
+                gaps[tr][b].append((tb - ta) / 86400)
+
+        tracks = {}
+        for tr, ms in sorted(masks.items()):
+            stages = []
+            prev = None
+            for code in range(len(STAGES)):
+                bit = 1 << code
+                n = sum(1 for m in ms if m & bit)
+                if not n:
+                    continue
+                if prev is None:
+                    conversion = 1.0
+                else:
+                    # Of the bills at the previous stage, those that got here
+                    at_prev = [m for m in ms if m & prev]
+                    conversion = sum(1 for m in at_prev if m & bit) / len(at_prev)
+                stages.append({
+                    'stage': STAGES[code],
+                    'reached': n,
+                    'current': current[tr][code],
+                    'conversion': conversion,
+                    'median days': median(gaps[tr][code]) if gaps[tr][code] else None
+                })
+                prev = bit
+            tracks[tr] = {'bills': len(ms), 'stages': stages}
+
+        res = {
+            'dimension': dimension,
+            'value': value,
+            'bills': len(self._members.get(key, ())),
+            'tracks': tracks
+        }
+        self._cache[key] = res
+        return res
@@ -1,13 +1,144 @@
-from collections import defaultdict
+import os
+import time
+import threading
+from fnmatch import fnmatch
+from collections import defaultdict, OrderedDict
 
 from tqdm import tqdm
 
-from session import Session
+from session import Session, ingest_floor
 from bill import Bill
 from representative import Representative
 from vote import Vote
 
 from utils import get_jsons, download_file
+from changelog import CHANGELOG
+from image import write_image, IMAGE_PATH
+from analytics import VoteAnalytics
+from resolver import MemberResolver
+from network import NetworkAnalytics
+from minhash import LSHIndex
+from related import RelatedBills
+from timeline import EventTimeline
+from cube import TrendCube
+from funnel import ProgressFunnel
+from amendments import AmendmentIndex
+from committees import CommitteeIndex
+
+
+class CorpusSnapshot:
+
+    """
+    An immutable version of the loaded corpus.
+    Readers take the current snapshot and search it without locks;
+    writers build a new snapshot and publish it in one assignment.
+    """
+
+    def __init__(self, version, sessions, reps, bills, votes, loaded,
+                 vote_bill=None, bill_votes=None):
+        self.version = version
+
+        self.sessions = tuple(sessions)
+        self.reps = tuple(reps)
+        self.bills = tuple(bills)
+        self.votes = tuple(votes)
+
+        # JSON path -> (modification time, loaded object)
+        self.loaded = loaded
+
+        # Links between votes and the bills voted on
+        self.vote_bill = vote_bill or {}
+        self.bill_votes = bill_votes or {}
+
+        # Search (group, property, value) -> frozenset of results.
+        # Filled lazily; racing readers compute the same answer,
+        # so the first one stored wins and nothing is corrupted.
+        self._memo = {}
+
+        # Every published object, built on first membership test
+        self._members = None
+
+    def __contains__(self, obj):
+        """
+        Whether an object is published in this snapshot
+        """
+        members = self._members
+        if members is None:
+            members = self._members = frozenset(self.sessions + self.reps
+                                                + self.bills + self.votes)
+        return obj in members
+
+    def search(self, group, key, value):
+        """
+        Searches the snapshot for objects with a property value
+
+        :param group: 'reps' or 'bills'
+        :param key: The property searched
+        :param value: The value searched for
+        :return: A frozenset of the matching objects
+        """
+        memo_key = (group, key, value)
+        found = self._memo.get(memo_key)
+        if found is not None:
+            return found
+
+        if group == 'reps':
+            if key == 'sponsor':
+                found = self.search('bills', 'sponsor url', value)
+            elif key == 'cosponsor':
+                found = self.search('bills', 'cosponsor url', value)
+            else:
+                found = frozenset(filter(lambda r: r.search(key, value),
+                                         self.reps))
+        elif group == 'bills':
+            found = frozenset(filter(lambda r: r.search(key, value),
+                                     self.bills))
+        else:
+            print('Invalid search group: {}'.format(group))
+            return None
+
+        return self._memo.setdefault(memo_key, found)
+
+    def derive(self, replaced, **changes):
+        """
+        Creates the next version of this snapshot, carrying over
+        the cached searches patched for the replaced objects
+
+        :param replaced: Pairs of (old, new) objects,
+                         old is None if added, new is None if removed
+        :param changes: The new values of changed attributes
+        :return: The new CorpusSnapshot
+        """
+        attrs = {
+            'sessions': self.sessions,
+            'reps': self.reps,
+            'bills': self.bills,
+            'votes': self.votes,
+            'loaded': self.loaded,
+            'vote_bill': self.vote_bill,
+            'bill_votes': self.bill_votes
+        }
+        attrs.update(changes)
+        snap = CorpusSnapshot(self.version + 1, **attrs)
+
+        for (group, key, value), found in self._memo.items():
+            if group == 'reps' and key in ('sponsor', 'cosponsor'):
+                # Derived from the bill searches, recomputed on demand
+                continue
+            cls = Representative if group == 'reps' else Bill
+            for old, new in replaced:
+                if not isinstance(new if new is not None else old, cls):
+                    continue
+                hit = new is not None and new.search(key, value)
+                if old in found or hit:
+                    found = set(found)
+                    found.discard(old)
+                    if hit:
+                        found.add(new)
+                    found = frozenset(found)
+            snap._memo[(group, key, value)] = found
+
+        return snap
 
 
 class USHouse:
@@ -18,16 +149,78 @@ class USHouse:
 
     ROOT_DIR = 'data/us/federal/house/'
 
-    def __init__(self):
-        self._sessions = []
-
-        self._reps = []
-        self._bills = []
-        self._votes = []
-
-        # Search {object} by {property} for {value}
-        self._search_by = \
-            defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
+    # Classes whose JSONs are sharded by congress, with their snapshot field
+    SHARDED = [
+        (Session, 'sessions'),
+        (Bill, 'bills'),
+        (Vote, 'votes')
+    ]
+
+    # The class and snapshot field of each kind of change log record
+    LOGGED = {
+        'session': (Session, 'sessions'),
+        'rep': (Representative, 'reps'),
+        'bill': (Bill, 'bills'),
+        'vote': (Vote, 'votes')
+    }
+
+    def __init__(self, congresses=None, shard_budget=None):
+        """
+        :param congresses: The congresses kept resident - list of int
+                           (default: HOUSE_CONGRESSES, or every congress)
+        :param shard_budget: The MB of JSON that on-demand shards may
+                             occupy before the least recently used is
+                             evicted (default: HOUSE_SHARD_BUDGET)
+        """
+        if congresses is None and os.environ.get('HOUSE_CONGRESSES'):
+            congresses = [int(c) for c in
+                          os.environ['HOUSE_CONGRESSES'].split(',')]
+        if shard_budget is None and os.environ.get('HOUSE_SHARD_BUDGET'):
+            shard_budget = float(os.environ['HOUSE_SHARD_BUDGET'])
+
+        # When None every congress is resident and nothing is sharded
+        self._pinned = set(congresses) if congresses is not None else None
+        self._shard_budget = shard_budget
+
+        # Loaded shards: congress -> paths
+        self._shards = OrderedDict()
+
+        # Congress -> when its shard was last used. Stamped without
+        # a lock by readers; only eviction, under the write lock, reads it.
+        self._used = {}
+
+        # The published, immutable corpus
+        self._snapshot = CorpusSnapshot(0, [], [], [], [], {})
+
+        # Serializes writers; readers never take it
+        self._write_lock = threading.Lock()
+        self._watcher = None
+
+        # Vote matrices per congress and the snapshot they're current with
+        self._analytics = VoteAnalytics()
+        self._analytics_version = -1
+        self._analytics_lock = threading.Lock()
+
+        # Resolves the members of recorded votes before they're published,
+        # and the reps it was built from
+        self._resolver = None
+        self._resolver_reps = ()
+
+        # Cosponsorship network metrics, cached on disk per congress
+        self._network = NetworkAnalytics()
+
+        # Indexes maintained alongside the snapshots: name ->
+        # [index, version of the snapshot it's current with, lock, fields]
+        self._indexes = {
+            'similar': [LSHIndex(), -1, threading.Lock(), ('bills',)],
+            'related': [RelatedBills(), -1, threading.Lock(), ('bills',)],
+            'timeline': [EventTimeline(), -1, threading.Lock(),
+                         ('bills', 'sessions', 'votes')],
+            'trends': [TrendCube(), -1, threading.Lock(), ('bills',)],
+            'funnel': [ProgressFunnel(), -1, threading.Lock(), ('bills',)],
+            'amendments': [AmendmentIndex(), -1, threading.Lock(), ('bills',)],
+            'committees': [CommitteeIndex(), -1, threading.Lock(), ('bills',)]
+        }
 
         # congresses = list(range(109, 117))
         # sessions = list(range(1, 3))
@@ -37,61 +230,645 @@ class USHouse:
         # for floor in floors:
         #     self.get_floor(floor)
 
+        # Reads the changes logged from here on, which ingest publishes;
+        # taken before reading, so writes made meanwhile are replayed
+        self._changes = CHANGELOG.consumer()
+
         self.read_files()
 
+    def snapshot(self, congresses=()):
+        """
+        Returns the current corpus snapshot.
+        Hold on to it for the duration of a request to get
+        consistent results while writers publish newer versions.
+
+        :param congresses: Congresses the snapshot will be searched for;
+                           their shards are loaded first (see load_congress)
+        """
+        for congress in congresses:
+            self.load_congress(congress)
+        return self._snapshot
+
+    @property
+    def _sessions(self):
+        return self._snapshot.sessions
+
+    @property
+    def _reps(self):
+        return self._snapshot.reps
+
+    @property
+    def _bills(self):
+        return self._snapshot.bills
+
+    @property
+    def _votes(self):
+        return self._snapshot.votes
+
     def get_floor(self, floor='HDoc-116-1-FloorProceedings.xml',
-                  force_reload=True):
+                  force_reload=True, feed=None):
         """
-        Retrieves a congressional XML file
+        Retrieves a congressional XML file, parsing only the legislative
+        days and floor actions not already stored (see session.ingest_floor)
 
         :param floor: The name of the file
         :param force_reload: Whether or not to refresh the file
+        :param feed: Given the (kind, url) links of the new floor actions,
+                     e.g. workqueue.WorkQueue().push
+        :return: The floor actions added
         """
-        self._sessions.append(Session(url=floor, force_reload=force_reload))
+        session, actions = ingest_floor(floor, force_reload=force_reload)
+        path = session._sources['json']
+
+        with self._write_lock:
+            snap = self._snapshot
+            loaded = dict(snap.loaded)
+            old = loaded.get(path, (None, None))[1]
+            sessions = list(snap.sessions)
+            if old in sessions:
+                sessions[sessions.index(old)] = session
+            else:
+                sessions.append(session)
+            loaded[path] = (os.stat(path).st_mtime_ns, session)
+            self._snapshot = snap.derive(
+                [(old, session)], sessions=tuple(sessions), loaded=loaded)
+
+        if feed and actions:
+            feed(session.get_links(actions))
+        return actions
 
     def read_files(self):
         """
         Reads JSON paths of Reps, Bills, and Votes
         """
-        print('Loading sessions.')
-        ses_paths = get_jsons(Session.ROOT_DIR)
-        self._sessions = [Session(filename=p) for p in tqdm(ses_paths)]
+        loaded = {}
+
+        # Indexes fed in the same pass as the bills load: the amendments,
+        # and the text signatures of the similar bills index
+        fed = [self._indexes[name] for name in ('amendments', 'similar')]
+
+        def on_load(obj):
+            if isinstance(obj, Bill):
+                for entry in fed:
+                    entry[0].add(obj)
 
         print('Loading reps.')
-        rep_paths = get_jsons(Representative.ROOT_DIR)
-        self._reps = [Representative(filename=p) for p in tqdm(rep_paths)]
+        reps = self._load_paths(Representative,
+                                get_jsons(Representative.ROOT_DIR), loaded)
 
-        print('Loading bills.')
-        bill_paths = get_jsons(Bill.ROOT_DIR)
-        self._bills = [Bill(filename=p) for p in tqdm(bill_paths)]
+        with fed[0][2], fed[1][2]:
+            if self._pinned is None:
+                print('Loading sessions.')
+                sessions = self._load_paths(Session, get_jsons(Session.ROOT_DIR), loaded)
 
-        print('Loading votes.')
-        vote_paths = get_jsons(Vote.ROOT_DIR)
-        self._votes = [Vote(filename=p) for p in tqdm(vote_paths)]
+                print('Loading bills.')
+                bills = self._load_paths(Bill, get_jsons(Bill.ROOT_DIR), loaded, on_load)
+
+                print('Loading votes.')
+                votes = self._load_paths(Vote, get_jsons(Vote.ROOT_DIR), loaded)
+            else:
+                sessions, bills, votes = [], [], []
+                for congress in sorted(self._pinned):
+                    print('Loading congress {}.'.format(congress))
+                    paths, shard = self._load_shard(congress, loaded, on_load)
+                    sessions += shard['sessions']
+                    bills += shard['bills']
+                    votes += shard['votes']
+                    self._shards[congress] = paths
+                    self._used[congress] = time.monotonic()
+
+            with self._write_lock:
+                self._resolve(votes, reps)
+                self._snapshot = CorpusSnapshot(self._snapshot.version + 1,
+                                                sessions, reps, bills, votes,
+                                                loaded)
+            for entry in fed:
+                entry[1] = self._snapshot.version
+
+        print('Linking related bills.')
+        self.related_graph()
+
+        print('Building timeline.')
+        self._index('timeline')
+
+        print('Building trend cube.')
+        self._index('trends')
+
+        print('Building progress funnel.')
+        self._index('funnel')
+
+        print('Indexing committees.')
+        self._index('committees')
 
         # self._check_votes()
 
+    def _shard_paths(self, congress):
+        """
+        The JSON paths of a congress's shard
+
+        :param congress: The congress - int
+        :return: dict of class -> list of paths
+        """
+        return {cls: get_jsons(cls.ROOT_DIR, cls.SHARD_PATTERN.format(congress))
+                for cls, _ in self.SHARDED}
+
+    def _load_shard(self, congress, loaded, on_load=None):
+        """
+        Loads the sessions, bills and votes of a single congress
+
+        :param congress: The congress - int
+        :param loaded: Where to record path -> (mtime, object) - dict
+        :param on_load: Called with each object loaded
+        :return: The paths read and the loaded objects by snapshot field
+        """
+        paths = self._shard_paths(congress)
+        shard = {attr: self._load_paths(cls, paths[cls], loaded, on_load)
+                 for cls, attr in self.SHARDED}
+        return [p for ps in paths.values() for p in ps], shard
+
+    def _resident_paths(self, cls):
+        """
+        The JSON paths of a class that belong to resident shards
+        """
+        if self._pinned is None or cls not in dict(self.SHARDED):
+            return get_jsons(cls.ROOT_DIR)
+        return [p for c in self._shards
+                for p in get_jsons(cls.ROOT_DIR, cls.SHARD_PATTERN.format(c))]
+
+    def load_congress(self, congress):
+        """
+        Makes a congress resident, loading its shard if needed
+        and evicting least recently used shards over the budget
+
+        :param congress: The congress - int
+        """
+        if self._pinned is None:
+            return
+
+        if congress in self._shards:
+            self._used[congress] = time.monotonic()
+            return
+
+        with self._write_lock:
+            self._used[congress] = time.monotonic()
+            if congress in self._shards:
+                return
+
+            snap = self._snapshot
+            loaded = dict(snap.loaded)
+            paths, shard = self._load_shard(congress, loaded)
+            self._shards[congress] = paths
+
+            self._resolve(shard['votes'], snap.reps)
+            replaced = [(None, o) for objs in shard.values() for o in objs]
+            changes = {attr: getattr(snap, attr) + tuple(shard[attr])
+                       for _, attr in self.SHARDED}
+
+            for c in self._evictable(congress):
+                self._used.pop(c, None)
+                for p in self._shards.pop(c):
+                    old = loaded.pop(p, None)
+                    if old:
+                        replaced.append((old[1], None))
+                evicted = {o for o, n in replaced if n is None}
+                changes = {attr: tuple(o for o in objs if o not in evicted)
+                           for attr, objs in changes.items()}
+                print('Evicted congress {}.'.format(c))
+
+            self._snapshot = snap.derive(replaced, loaded=loaded, **changes)
+
+        self._index('similar')
+
+    def _evictable(self, loading):
+        """
+        The least recently used, unpinned shards to evict
+        to get back under the shard budget
+
+        :param loading: The congress just loaded, never evicted - int
+        """
+        if self._shard_budget is None:
+            return []
+
+        def size(paths):
+            return sum(os.stat(p).st_size for p in paths if os.path.exists(p))
+
+        unpinned = sorted((c for c in self._shards if c not in self._pinned),
+                          key=lambda c: (c == loading, self._used.get(c, 0.0)))
+        total = sum(size(self._shards[c]) for c in unpinned)
+        evict = []
+        for c in unpinned[:-1]:
+            if total <= self._shard_budget * 2 ** 20:
+                break
+            total -= size(self._shards[c])
+            evict.append(c)
+        return evict
+
+    @staticmethod
+    def _load_paths(cls, paths, loaded, on_load=None):
+        """
+        Loads objects from JSON paths, remembering when each was read
+
+        :param cls: The class to load (Session, Bill, ...)
+        :param paths: The JSON paths
+        :param loaded: Where to record path -> (mtime, object) - dict
+        :param on_load: Called with each object loaded, e.g. to
+                        index it in the same pass
+        :return: The list of loaded objects
+        """
+        objs = []
+        for p in tqdm(paths):
+            mtime = os.stat(p).st_mtime_ns
+            obj = cls(filename=p)
+            loaded[p] = (mtime, obj)
+            objs.append(obj)
+            if on_load:
+                on_load(obj)
+        return objs
+
+    def _resident_shard(self, cls, path):
+        """
+        Where a JSON path of a class belongs, if it's resident
+
+        :return: The congress of its resident shard, True if the
+                 class isn't sharded, or None if it isn't resident
+        """
+        if self._pinned is None or cls not in dict(self.SHARDED):
+            return True if fnmatch(path, cls.ROOT_DIR + 'json/*.json') else None
+        for c in self._shards:
+            if fnmatch(path, cls.ROOT_DIR + cls.SHARD_PATTERN.format(c)):
+                return c
+        return None
+
+    def ingest(self, rescan=False):
+        """
+        Publishes a new snapshot with the JSON files written since the
+        last ingest, read from the change log (see changelog.ChangeLog),
+        and without the objects whose files have been deleted.
+        Files of shards that aren't resident are left to load_congress.
+
+        :param rescan: Also check every resident file, to pick up files
+                       changed or deleted without persist.write_json - bool
+        :return: The number of files ingested or evicted
+        """
+        attrs = dict(self.LOGGED.values())
+
+        with self._write_lock:
+            snap = self._snapshot
+            loaded = dict(snap.loaded)
+
+            # Path -> class, in the order they were changed
+            paths = {}
+            for record in self._changes.poll():
+                if record.get('kind') in self.LOGGED and record.get('path'):
+                    paths[os.path.normpath(record['path'])] = self.LOGGED[record['kind']][0]
+            if rescan:
+                for p, (_, obj) in snap.loaded.items():
+                    paths.setdefault(p, type(obj))
+                for cls in attrs:
+                    for p in self._resident_paths(cls):
+                        paths.setdefault(p, cls)
+
+            changes = {}
+            replaced = []
+
+            def objs(attr):
+                if attr not in changes:
+                    changes[attr] = list(getattr(snap, attr))
+                return changes[attr]
+
+            for p, cls in paths.items():
+                shard = self._resident_shard(cls, p)
+                if shard is None:
+                    continue
+                attr = attrs[cls]
+                old = loaded.get(p)
+
+                try:
+                    mtime = os.stat(p).st_mtime_ns
+                except FileNotFoundError:
+                    if old:
+                        del loaded[p]
+                        objs(attr).remove(old[1])
+                        replaced.append((old[1], None))
+                    continue
+
+                if old and old[0] == mtime:
+                    continue
+
+                try:
+                    new = cls(filename=p)
+                except ValueError:
+                    # Not a complete JSON; logged writes are atomic,
+                    # so it was written some other way
+                    continue
+
+                group = objs(attr)
+                loaded[p] = (mtime, new)
+                if old:
+                    group[group.index(old[1])] = new
+                else:
+                    group.append(new)
+                    if shard is not True:
+                        # Evicted along with the rest of its shard
+                        self._shards[shard].append(p)
+                replaced.append((old[1] if old else None, new))
+
+            if replaced:
+                self._resolve([n for _, n in replaced if isinstance(n, Vote)],
+                              changes.get('reps', snap.reps))
+                self._snapshot = snap.derive(replaced, loaded=loaded,
+                                             **changes)
+            self._changes.commit()
+
+        # Keep the similar bills index current here, off the request threads
+        if replaced:
+            self._index('similar')
+        return len(replaced)
+
+    def watch(self, interval=5, rescan=300):
+        """
+        Starts a background thread that ingests the JSON files
+        written every interval seconds (see ingest)
+
+        :param interval: Seconds between polls - float
+        :param rescan: Seconds between polls that also check every
+                       resident file, or None never to - float
+        """
+        if self._watcher:
+            return
+
+        def poll():
+            last = time.monotonic()
+            while True:
+                time.sleep(interval)
+                full = rescan is not None and time.monotonic() - last >= rescan
+                if full:
+                    last = time.monotonic()
+                try:
+                    n = self.ingest(rescan=full)
+                except Exception as e:
+                    print('Ingest failed: {}'.format(e))
+                else:
+                    if n:
+                        print('Ingested {} files.'.format(n))
+
+        self._watcher = threading.Thread(target=poll, name='house-watcher',
+                                         daemon=True)
+        self._watcher.start()
+
+    def vote_analytics(self, congress):
+        """
+        Gets the members x votes matrix of a congress,
+        first adding any votes loaded since it was last asked for
+
+        :param congress: The congress - int
+        :return: analytics.VoteMatrix, which later updates leave as it is
+        """
+        with self._analytics_lock:
+            snap = self._snapshot
+            if snap.version != self._analytics_version:
+                self._analytics.update(snap.votes)
+                self._analytics_version = snap.version
+            return self._analytics.matrix(congress)
+
+    def network(self, congress):
+        """
+        Gets the cosponsorship network metrics of a congress
+        (see network.NetworkAnalytics)
+
+        :param congress: The congress - int
+        :return: dict of member ID -> metrics
+        """
+        self.load_congress(congress)
+        snap = self._snapshot
+        return self._network.metrics(congress, snap.search('bills', 'congress', congress),
+                                     snap.version)
+
+    def _index(self, name):
+        """
+        Gets an index, first adding the objects published and
+        removing the objects dropped since it was last used
+
+        :param name: The name of the index
+        :return: The index and the lock guarding it
+        """
+        entry = self._indexes[name]
+        index, _, lock, fields = entry
+        with lock:
+            snap = self._snapshot
+            if snap.version != entry[1]:
+                current = set()
+                for field in fields:
+                    current.update(getattr(snap, field))
+                for obj in [o for o in index if o not in current]:
+                    index.remove(obj)
+                for obj in tqdm([o for o in current if o not in index]):
+                    index.add(obj)
+                entry[1] = snap.version
+            return index, lock
+
+    def similar_index(self):
+        """
+        Gets the LSH index of bill texts,
+        brought up to date with the current snapshot.
+        Read it under the lock _index('similar') returns, as
+        ingest may update it from another thread.
+
+        :return: minhash.LSHIndex
+        """
+        return self._index('similar')[0]
+
+    def similar_bills(self, bill, threshold=0.5, snap=None):
+        """
+        Finds bills with text similar to a bill, e.g.
+        companion bills or reintroductions in later congresses
+
+        :param bill: The Bill
+        :param threshold: The minimum estimated Jaccard similarity - float
+        :param snap: The snapshot the caller reads, if any - CorpusSnapshot.
+                     The index follows the current snapshot, so bills not
+                     published in this one are left out.
+        :return: List of (Bill, similarity), most similar first
+        """
+        index, lock = self._index('similar')
+        with lock:
+            res = index.similar(bill, threshold)
+        if snap is not None:
+            res = [(b, sim) for b, sim in res if b in snap]
+        return res
+
+    def related_graph(self):
+        """
+        Gets the graph of related bills,
+        brought up to date with the current snapshot.
+        Read it under the lock _index('related') returns, as
+        ingest may update it from another thread.
+
+        :return: related.RelatedBills
+        """
+        return self._index('related')[0]
+
+    def related_bills(self, bill, snap=None):
+        """
+        Gets every bill in the same family as a bill
+
+        :param bill: The Bill
+        :param snap: The snapshot the caller reads, if any - CorpusSnapshot.
+                     Bills not published in it are given as not loaded.
+        :return: List of (key, Bill or None if not loaded)
+        """
+        index, lock = self._index('related')
+        with lock:
+            res = index.family(bill)
+        if snap is not None:
+            res = [(k, b if b in snap else None) for k, b in res]
+        return res
+
+    def timeline(self, start=None, end=None, types=None, chamber=None,
+                 bill=None, limit=None, after=None):
+        """
+        Gets the events between two timestamps, a page at a time
+        (see timeline.EventTimeline.between)
+
+        :return: List of event dicts, oldest first
+        """
+        index, lock = self._index('timeline')
+        with lock:
+            return index.between(start, end, types, chamber, bill, limit, after)
+
+    def trends(self, group_by=(), **filters):
+        """
+        Counts bills by subject, committee, month, etc.
+        (see cube.TrendCube.query)
+
+        :return: dict of group tuple -> count
+        """
+        index, lock = self._index('trends')
+        with lock:
+            return index.query(group_by, **filters)
+
+    def funnel(self, dimension, value):
+        """
+        Gets the progress funnel of a group of bills
+        (see funnel.ProgressFunnel.stats)
+
+        :param dimension: 'congress', 'subject', 'party' or 'committee'
+        :param value: The value of the dimension
+        :return: dict
+        """
+        index, lock = self._index('funnel')
+        with lock:
+            return index.stats(dimension, value)
+
+    def funnels(self):
+        """
+        Gets the progress funnel of every group of bills
+
+        :return: List of dicts (see funnel.ProgressFunnel.stats)
+        """
+        index, lock = self._index('funnel')
+        with lock:
+            return [index.stats(d, v) for d, v in index.groups()]
+
+    def amendment_index(self):
+        """
+        Gets the index of amendments,
+        brought up to date with the current snapshot
+
+        :return: amendments.AmendmentIndex
+        """
+        return self._index('amendments')[0]
+
+    def amendments(self, sponsor=None, bill=None, congress=None, status=None):
+        """
+        Finds amendments (see amendments.AmendmentIndex.search)
+
+        :return: List of amendment records
+        """
+        index, lock = self._index('amendments')
+        with lock:
+            return index.search(sponsor, bill, congress, status)
+
+    def committees(self):
+        """
+        Gets every committee with its workload per congress
+        (see committees.CommitteeIndex.committees)
+        """
+        index, lock = self._index('committees')
+        with lock:
+            return index.committees()
+
+    def committee(self, name, congress=None):
+        """
+        Gets the bills, actions, reports and meetings of a committee
+        (see committees.CommitteeIndex.committee)
+        """
+        index, lock = self._index('committees')
+        with lock:
+            return index.committee(name, congress)
+
+    def _resolve(self, votes, reps):
+        """
+        Attaches member IDs to the recorded votes of Votes about to be
+        published, rebuilding the resolver only when the reps change.
+        Call with the write lock held.
+
+        :param votes: The new Votes
+        :param reps: The reps they'll be published with
+        """
+        reps = tuple(reps)
+        if self._resolver is None or reps != self._resolver_reps:
+            self._resolver = MemberResolver(reps)
+            self._resolver_reps = reps
+        self._resolver.resolve_votes(votes)
+
+    def resolve_members(self, snap=None):
+        """
+        Reports how the members of a snapshot's recorded votes resolve
+        (the Votes got their member IDs before they were published)
+
+        :param snap: The snapshot (default: the current one)
+        :return: The resolution report (see MemberResolver.resolve_votes)
+        """
+        snap = snap or self._snapshot
+        return MemberResolver(snap.reps).resolve_votes(snap.votes, attach=False)
+
+    def write_image(self, path=IMAGE_PATH):
+        """
+        Writes a memory-mappable image of the loaded corpus
+        that web workers can share (see image.CorpusImage)
+
+        :param path: Where to write the image - str
+        """
+        write_image(self, path)
+
     def _check_votes(self):
         """
         Verifies that the data present in votes is accounted for elsewhere.
         """
         # Verify bills voted on
         print('Verifying bills versus votes')
-        for vote in tqdm(self._votes):
-            bills = set(self._bills)
+        snap = self.snapshot()
+        added = []
+        vote_bill = dict(snap.vote_bill)
+        bill_votes = defaultdict(set)
+        for bill, votes in snap.bill_votes.items():
+            bill_votes[bill] |= votes
+
+        for vote in tqdm(snap.votes):
+            bills = set(snap.bills)
 
             # Filter by congress
             congress = int(vote._congress['congress'])
-            bills &= self.search('bills', 'congress', congress)
+            bills &= snap.search('bills', 'congress', congress)
 
             # Filter by Legislation #
             legisname = vote._congress['legis_num']
-            bills &= self.search('bills', 'title', legisname)
+            bills &= snap.search('bills', 'title', legisname)
 
             if len(bills) > 1:
-                print('Too many bills left!')
-                import pdb
-                pdb.set_trace()
+                print('Too many bills left for {}!'.format(vote))
+                continue
             elif len(bills) == 0:
                 try:
                     num = legisname.split()[-1]
@@ -122,51 +899,49 @@ class USHouse:
                 elif legisname == 'MOTION':
                     tp = None
                 else:
-                    import pdb
-                    pdb.set_trace()
+                    print('Unknown legislation {}'.format(legisname))
+                    tp = None
 
                 if tp:
                     bl = Bill(
                         url='https://www.congress.gov/bill/{}th-congress/{}/{}/all-info'.format(
                             congress, tp, num))
-                    self._bills.append(bl)
+                    added.append(bl)
                     bills = set()
                     bills.add(bl)
             if bills:
                 bill = list(bills)[0]
-                self._search_by['bill']['vote'][vote] = bill
-                self._search_by['vote']['bill'][bill].add(vote)
+                vote_bill[vote] = bill
+                bill_votes[bill].add(vote)
+
+        with self._write_lock:
+            snap = self._snapshot
+            self._snapshot = snap.derive(
+                [(None, b) for b in added],
+                bills=snap.bills + tuple(added),
+                vote_bill=vote_bill,
+                bill_votes={b: frozenset(v) for b, v in bill_votes.items()})
 
     def search(self, group, key, value):
-        if value in self._search_by[group][key]:
-            return self._search_by[group][key][value]
-        else:
-            if group == 'reps':
-                if key == 'sponsor':
-                    self._search_by[group][key][value] = \
-                        self.search('bills', 'sponsor url', value)
-                elif key == 'cosponsor':
-                    self._search_by[group][key][value] = \
-                        self.search('bills', 'cosponsor url', value)
-                else:
-                    self._search_by[group][key][value] = \
-                        set(filter(lambda r: r.search(key, value), self._reps))
-                return self._search_by[group][key][value]
-            elif group == 'bills':
-                self._search_by[group][key][value] = \
-                    set(filter(lambda r: r.search(key, value), self._bills))
-                return self._search_by[group][key][value]
-            else:
-                print('Invalid search group: {}'.format(group))
+        """
+        Searches the current snapshot (see CorpusSnapshot.search),
+        first loading the shard of any congress searched for
+        """
+        if group == 'bills' and key == 'congress':
+            self.load_congress(value)
+        return self._snapshot.search(group, key, value)
 
 
 HOUSE = USHouse()
 
+if os.environ.get('HOUSE_WATCH'):
+    HOUSE.watch(float(os.environ['HOUSE_WATCH']))
+
 if __name__ == '__main__':
     reps = HOUSE.search('reps', 'name', 'Dwight Evans')
     if reps:
         rep = list(reps)[0]
-        rep.download_all_bills()
+        rep.download_all_bills(known={b.get_key() for b in HOUSE._bills})
 
         import pdb
         pdb.set_trace()
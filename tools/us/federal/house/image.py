@@ -0,0 +1,545 @@
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+from array import array
+from collections import defaultdict
+
+from tqdm import tqdm
+
+from resolver import member_id
+from timeline import select
+from funnel import ProgressFunnel
+
+
+MAGIC = b'DNCI'
+VERSION = 2
+
+# magic, version, length of the table of contents
+HEADER = struct.Struct('<4sIQ')
+
+# Codes used in the vote matrix
+VOTE_CODES = {
+    'Yea': 1,
+    'Aye': 1,
+    'Nay': 2,
+    'No': 2,
+    'Present': 3,
+    'Not Voting': 4
+}
+
+IMAGE_PATH = 'data/us/federal/house/corpus.img'
+
+# Seconds between checks for a newly swapped-in image (see current_image)
+CHECK_INTERVAL = 1.0
+
+
+def _bill_header(bill):
+    """
+    The compact, JSON-able summary of a bill stored in the image
+
+    :param bill: The Bill
+    :return: dict
+    """
+    overview = bill.get_overview()
+    sponsor = overview.get('sponsor', {})
+    return {
+        'key': bill.get_key(),
+        'title': bill.title,
+        'congress': bill.get_congress(),
+        'introduced': bill.get_introduced_date() if sponsor.get('date') else None,
+        'url': bill._sources.get('url'),
+        'json': bill._sources.get('json'),
+        'sponsor': {
+            'name': sponsor.get('name'),
+            'url': sponsor.get('url'),
+            'date': sponsor.get('date')
+        },
+        'progress': bill.get_progress(),
+        'latest_action': overview.get('latest_action'),
+        'subject': bill.subjects.get('main', {}).get('title')
+    }
+
+
+def _rep_header(rep):
+    """
+    The compact, JSON-able summary of a representative stored in the image
+
+    :param rep: The Representative
+    :return: dict
+    """
+    return {
+        'id': member_id(rep),
+        'name': rep.basics['name'],
+        'title': rep.basics['title'],
+        'age': rep.get_age(),
+        'death': rep.basics['death'],
+        'service': rep.get_service(),
+        'url': rep.sources.get('url'),
+        'img': rep.sources.get('img'),
+        'party': rep.get_current_party(),
+        'state': rep.get_state(),
+        'district': rep.get_district(),
+        'active': rep.get_active()
+    }
+
+
+def _vote_header(vote):
+    """
+    The compact, JSON-able summary of a vote stored in the image
+
+    :param vote: The Vote
+    :return: dict
+    """
+    return {
+        'congress': vote._congress.get('congress'),
+        'session': vote._congress.get('session'),
+        'legis_num': vote._congress.get('legis_num'),
+        'question': vote._votes.get('question'),
+        'result': vote._votes.get('result'),
+        'datetime': vote._votes.get('datetime'),
+        'by_party': vote._votes.get('totals', {}).get('by_party', {}),
+        'recorded': 'recorded' in vote._votes,
+        'url': vote._sources.get('url')
+    }
+
+
+def _bill_ref(bill):
+    """
+    How a bill is linked to from another bill's record
+    """
+    return {'key': bill.get_key(), 'title': bill.title, 'congress': bill.get_congress()}
+
+
+class _Writer:
+
+    """
+    Accumulates sections of the image, tracking their offsets
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.toc = {}
+
+    def _append(self, data):
+        # Keep every section 8-byte aligned so arrays can be cast in place
+        pad = -self.size % 8
+        if pad:
+            self.chunks.append(b'\0' * pad)
+            self.size += pad
+        start = self.size
+        self.chunks.append(data)
+        self.size += len(data)
+        return start
+
+    def records(self, name, records):
+        """
+        Adds a table of JSON records, addressable by position
+        """
+        blobs = [json.dumps(r, separators=(',', ':')).encode() for r in records]
+        offsets = array('Q', [0])
+        for b in blobs:
+            offsets.append(offsets[-1] + len(b))
+        self.toc[name] = {
+            'count': len(blobs),
+            'offsets': self._append(offsets.tobytes()),
+            'data': self._append(b''.join(blobs))
+        }
+
+    def index(self, name, postings):
+        """
+        Adds an inverted index of value -> sorted record ids
+        """
+        directory = {}
+        for value, ids in postings.items():
+            ids = array('I', sorted(ids))
+            directory[json.dumps(value)] = [self._append(ids.tobytes()), len(ids)]
+        self.toc.setdefault('indexes', {})[name] = directory
+
+    def array(self, name, values):
+        """
+        Adds an array.array, e.g. of the timestamps of a table
+        """
+        self.toc[name] = {
+            'type': values.typecode,
+            'count': len(values),
+            'data': self._append(values.tobytes())
+        }
+
+    def matrix(self, name, rows, cols, data):
+        """
+        Adds a dense rows x cols matrix of unsigned bytes
+        """
+        self.toc[name] = {
+            'rows': rows,
+            'cols': cols,
+            'data': self._append(bytes(data))
+        }
+
+
+def write_image(house, path=IMAGE_PATH):
+    """
+    Writes a read-only image of the corpus held by a USHouse.
+    The image is written beside its destination and atomically
+    swapped in, so processes already mapping the old image
+    are never exposed to a partially written file.
+
+    :param house: The loaded USHouse
+    :param path: Where to write the image - str
+    """
+    # Imported here, as analytics imports this module
+    from analytics import member_key
+
+    writer = _Writer()
+
+    snap = house.snapshot()
+    bills = list(snap.bills)
+    reps = list(snap.reps)
+    votes = list(snap.votes)
+
+    print('Imaging bills.')
+    headers = []
+    for bill in tqdm(bills):
+        header = _bill_header(bill)
+        header['related'] = [dict(_bill_ref(b), key=k) if b else {'key': k}
+                             for k, b in house.related_bills(bill, snap=snap)]
+        header['similar'] = [dict(_bill_ref(b), similarity=sim)
+                             for b, sim in house.similar_bills(bill, snap=snap)]
+        headers.append(header)
+    writer.records('bills', headers)
+
+    print('Imaging reps.')
+    writer.records('reps', [_rep_header(r) for r in tqdm(reps)])
+
+    print('Imaging votes.')
+    writer.records('votes', [_vote_header(v) for v in tqdm(votes)])
+
+    # Indexes
+    postings = defaultdict(lambda: defaultdict(set))
+    for i, bill in enumerate(bills):
+        postings['bills congress'][bill.get_congress()].add(i)
+        postings['bills title'][(bill.get_congress(), bill.title.lower())].add(i)
+        sponsor = bill.get_overview().get('sponsor', {})
+        if 'url' in sponsor:
+            postings['bills sponsor url'][sponsor['url']].add(i)
+        for co in bill._cosponsors:
+            postings['bills cosponsor url'][co['cosponsors']['url']].add(i)
+    for i, rep in enumerate(reps):
+        postings['reps party'][rep.get_current_party()].add(i)
+        postings['reps state'][rep.get_state()].add(i)
+        postings['reps active'][rep.get_active()].add(i)
+    for i, vote in enumerate(votes):
+        try:
+            postings['votes congress'][int(vote._congress.get('congress'))].add(i)
+        except (TypeError, ValueError):
+            pass
+
+    print('Imaging the timeline.')
+    events = house.timeline()
+    writer.records('events', [{k: v for k, v in ev.items() if k != 'source'}
+                              for ev in events])
+    writer.array('event_times', array('d', [ev['time'] for ev in events]))
+    for i, ev in enumerate(events):
+        if ev['bill']:
+            postings['events bill'][ev['bill']].add(i)
+
+    print('Imaging the progress funnel.')
+    funnels = house.funnels()
+    writer.records('funnel', funnels)
+    for i, stats in enumerate(funnels):
+        postings['funnel group'][(stats['dimension'], stats['value'])].add(i)
+
+    # Members x votes matrix, a row per member (see analytics.member_key)
+    members = {}
+    for vote in votes:
+        for rec in vote._votes.get('recorded', []):
+            key = member_key(rec)
+            if key not in members:
+                members[key] = (len(members), {
+                    'member_id': rec.get('member_id'),
+                    'name': rec['name'],
+                    'state': rec['state'],
+                    'party': rec['party']
+                })
+    matrix = bytearray(len(members) * len(votes))
+    for j, vote in enumerate(votes):
+        for rec in vote._votes.get('recorded', []):
+            i = members[member_key(rec)][0]
+            matrix[i * len(votes) + j] = VOTE_CODES.get(rec['vote'], 4)
+    writer.records('members', [m for _, m in members.values()])
+    writer.matrix('vote_matrix', len(members), len(votes), matrix)
+
+    for name, post in postings.items():
+        writer.index(name, post)
+
+    toc = json.dumps(writer.toc, separators=(',', ':')).encode()
+    base = HEADER.size + len(toc)
+    base += -base % 8
+
+    tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmp, 'wb') as out_file:
+        out_file.write(HEADER.pack(MAGIC, VERSION, len(toc)))
+        out_file.write(toc)
+        out_file.write(b'\0' * (base - HEADER.size - len(toc)))
+        for chunk in writer.chunks:
+            out_file.write(chunk)
+        out_file.flush()
+        os.fsync(out_file.fileno())
+    os.replace(tmp, path)
+
+
+class CorpusImage:
+
+    """
+    A read-only view of the corpus, memory-mapped from an image
+    written by write_image.  Every process mapping the same file
+    shares its pages, so the corpus is paid for once per host.
+    """
+
+    def __init__(self, path=IMAGE_PATH):
+        self._path = path
+        self._stat = None
+        self._map = None
+        self._toc = {}
+        self._base = 0
+
+        self._open()
+
+    def _open(self):
+        """
+        Maps the image currently at the path
+        """
+        with open(self._path, 'rb') as in_file:
+            stat = os.fstat(in_file.fileno())
+            mm = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, toc_len = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            raise ValueError('ValueError: {} is not a corpus image.'.format(self._path))
+
+        self._toc = json.loads(mm[HEADER.size:HEADER.size + toc_len])
+        self._base = HEADER.size + toc_len
+        self._base += -self._base % 8
+        self._map = mm
+        self._stat = (stat.st_ino, stat.st_mtime_ns)
+
+        # Congress -> analytics.VoteMatrix, built on first use
+        self._matrices = {}
+
+    @property
+    def version(self):
+        """
+        Identifies the image file mapped: its (inode, modification time)
+        """
+        return self._stat
+
+    def swapped(self):
+        """
+        Whether a new image has been swapped in since this one was mapped
+        """
+        stat = os.stat(self._path)
+        return (stat.st_ino, stat.st_mtime_ns) != self._stat
+
+    def refresh(self):
+        """
+        Re-maps the image if a new one has been swapped in.
+        Not safe while other threads read this object;
+        they should share images through current_image.
+
+        :return: True if a new image was mapped
+        """
+        if not self.swapped():
+            return False
+
+        # The old map is left to the garbage collector so
+        # in-flight readers holding views of it remain valid
+        self._open()
+        return True
+
+    def _view(self, offset, size, fmt='B'):
+        start = self._base + offset
+        return memoryview(self._map)[start:start + size].cast(fmt)
+
+    def count(self, table):
+        """
+        The number of records in a table
+        ('bills', 'reps', 'votes', 'events', 'funnel', 'members')
+        """
+        return self._toc[table]['count']
+
+    def record(self, table, i):
+        """
+        Decodes a single record from a table
+
+        :param table: The table name - str
+        :param i: The position of the record - int
+        :return: dict
+        """
+        t = self._toc[table]
+        if not 0 <= i < t['count']:
+            raise IndexError(i)
+        offsets = self._view(t['offsets'], 8 * (t['count'] + 1), 'Q')
+        start = self._base + t['data']
+        return json.loads(self._map[start + offsets[i]:start + offsets[i + 1]])
+
+    def records(self, table):
+        """
+        Iterates over every record of a table
+        """
+        for i in range(self.count(table)):
+            yield self.record(table, i)
+
+    def lookup(self, group, key, value):
+        """
+        Searches an index of the image
+
+        :param group: 'bills', 'reps', 'votes', 'events' or 'funnel'
+        :param key: The indexed property
+        :param value: The value searched for
+        :return: A sequence of record positions
+        """
+        directory = self._toc.get('indexes', {}).get('{} {}'.format(group, key), {})
+        try:
+            offset, size = directory[json.dumps(value)]
+        except KeyError:
+            return []
+        return self._view(offset, 4 * size, 'I')
+
+    def _array(self, name):
+        a = self._toc[name]
+        return self._view(a['data'], a['count'] * array(a['type']).itemsize, a['type'])
+
+    def timeline(self, start=None, end=None, types=None, chamber=None,
+                 bill=None, limit=None, after=None):
+        """
+        Gets the events between two timestamps, a page at a time
+        (see timeline.EventTimeline.between)
+
+        :return: List of event dicts, oldest first
+        """
+        times = self._array('event_times')
+        if bill:
+            ids = self.lookup('events', 'bill', bill)
+            times = [times[i] for i in ids]
+            events = _Records(self, 'events', ids)
+        else:
+            events = _Records(self, 'events')
+        return select(times, events, start, end, types, chamber, limit, after)
+
+    def funnel(self, dimension, value):
+        """
+        Gets the progress funnel of a group of bills
+        (see funnel.ProgressFunnel.stats)
+
+        :param dimension: 'congress', 'subject', 'party' or 'committee'
+        :param value: The value of the dimension
+        :return: dict
+        :raise ValueError: For an unknown dimension
+        """
+        # The funnel of no bills, with the value normalized as stored
+        empty = ProgressFunnel().stats(dimension, value)
+        ids = self.lookup('funnel', 'group', [dimension, empty['value']])
+        return self.record('funnel', ids[0]) if len(ids) else empty
+
+    def vote_matrix(self, congress):
+        """
+        Gets the members x votes matrix of a congress, its rows keyed
+        by member ID (see analytics.member_key). It's built from the
+        image on first use and kept while the image is mapped.
+
+        :param congress: The congress - int
+        :return: analytics.VoteMatrix
+        """
+        matrix = self._matrices.get(congress)
+        if matrix is None:
+            # Imported here, as analytics imports this module
+            from analytics import VoteMatrix
+
+            matrix = VoteMatrix(congress)
+            m = self._toc['vote_matrix']
+            codes = self._view(m['data'], m['rows'] * m['cols'])
+            members = list(self.records('members'))
+            for j in self.lookup('votes', 'congress', congress):
+                vote = self.record('votes', j)
+                if not vote['recorded']:
+                    continue
+                positions = [(members[i], code)
+                             for i, code in enumerate(codes[j::m['cols']]) if code]
+                matrix.add_column(vote['url'], positions, vote['by_party'])
+            # Racing readers build equal matrices; either may be kept
+            self._matrices[congress] = matrix
+        return matrix
+
+
+class _Records:
+
+    """
+    A table of an image, or some of its records, as a sequence
+    that decodes records only as they're read
+    """
+
+    def __init__(self, image, table, ids=None):
+        self._image = image
+        self._table = table
+        self._ids = ids
+
+    def __len__(self):
+        return self._image.count(self._table) if self._ids is None else len(self._ids)
+
+    def __getitem__(self, i):
+        return self._image.record(self._table, i if self._ids is None else self._ids[i])
+
+
+# Path -> (the CorpusImage mapping it, when the file was last checked)
+_current = {}
+_current_lock = threading.Lock()
+
+
+def current_image(path=IMAGE_PATH):
+    """
+    The image of a path, shared by the threads of a process.
+    At most every CHECK_INTERVAL seconds the file is checked for a new
+    image swapped in by write_image, which is then mapped as a new
+    CorpusImage; readers still holding the old one keep a valid map,
+    so take the image once per request.
+
+    :param path: The image's path - str
+    :return: CorpusImage
+    :raise FileNotFoundError: If no image has been written yet
+    """
+    now = time.monotonic()
+    entry = _current.get(path)
+    if entry and now - entry[1] < CHECK_INTERVAL:
+        return entry[0]
+
+    with _current_lock:
+        entry = _current.get(path)
+        if entry and now - entry[1] < CHECK_INTERVAL:
+            return entry[0]
+        image = entry[0] if entry else None
+        if image is None or image.swapped():
+            image = CorpusImage(path)
+        _current[path] = (image, now)
+        return image
+
+
+def update_image(path=IMAGE_PATH):
+    """
+    Loads the corpus from its JSONs and writes its image, e.g. once a
+    scrape or crawl finishes, so web workers (see current_image)
+    serve what it added
+    """
+    # Imported here, as house imports this module and loads on import
+    from house import HOUSE
+    # Picks up what was written since, if house was imported before
+    HOUSE.ingest()
+    print('Writing the corpus image.')
+    write_image(HOUSE, path)
+
+
+if __name__ == '__main__':
+    update_image()
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from collections import defaultdict
+
+ROOT_DIR = 'data/us/federal/house/metrics/'
+
+# Histogram bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Data directories -> page types
+PAGE_TYPES = {
+    'bills': 'bill',
+    'reps': 'rep',
+    'votes': 'vote',
+    'session': 'session'
+}
+
+HELP = {
+    'house_fetch_seconds': 'Time spent downloading a page',
+    'house_cache_requests_total': 'Page requests by whether the local cache had the page',
+    'house_bytes_in_total': 'Bytes downloaded',
+    'house_bytes_out_total': 'Bytes written to the page cache and to JSON files',
+    'house_fetch_errors_total': 'Failed downloads',
+    'house_load_seconds': 'Time spent loading a page, downloads and extraction included',
+    'house_load_errors_total': 'Pages that failed to load',
+    'house_extract_seconds': 'Time spent in each extraction step',
+    'house_crawl_errors_total': 'Failed crawl attempts'
+}
+
+
+def page_type(path):
+    """
+    The page type of a file under the data directory,
+    e.g. 'data/us/federal/house/bills/web/...' -> 'bill'
+
+    :param path: str
+    :return: str
+    """
+    for part in path.split('/'):
+        if part in PAGE_TYPES:
+            return PAGE_TYPES[part]
+    return 'other'
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+
+    """
+    Counters and histograms keyed by name and labels,
+    safe to update from several threads.  Processes each keep
+    their own, to be combined with snapshot and merge.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # (name, labels) -> value
+        self._counters = defaultdict(float)
+
+        # (name, labels) -> [bucket bounds, counts per bucket (+Inf last), sum]
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds to a counter
+        """
+        with self._lock:
+            self._counters[(name, _labels(labels))] += value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """
+        Records a value in a histogram
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [buckets, [0] * (len(buckets) + 1), 0.0]
+            i = 0
+            while i < len(buckets) and value > buckets[i]:
+                i += 1
+            hist[1][i] += 1
+            hist[2] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Records the seconds spent in a with block in a histogram
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """
+        Everything recorded, as JSON-able data (see merge)
+        """
+        with self._lock:
+            return {
+                'counters': [[n, dict(l), v] for (n, l), v in self._counters.items()],
+                'histograms': [[n, dict(l), list(b), list(c), s]
+                               for (n, l), (b, c, s) in self._histograms.items()]
+            }
+
+    def merge(self, snap):
+        """
+        Adds in what another process recorded (see snapshot)
+        """
+        with self._lock:
+            for name, labels, value in snap['counters']:
+                self._counters[(name, _labels(labels))] += value
+            for name, labels, buckets, counts, total in snap['histograms']:
+                key = (name, _labels(labels))
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = self._histograms[key] = [tuple(buckets), [0] * len(counts), 0.0]
+                hist[1] = [a + b for a, b in zip(hist[1], counts)]
+                hist[2] += total
+
+    def reset(self):
+        """
+        Forgets everything recorded
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def prometheus(self):
+        """
+        Everything recorded in the Prometheus text exposition format
+
+        :return: str
+        """
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                                  for k, v in pairs) + '}'
+
+        snap = self.snapshot()
+        by_name = defaultdict(list)
+        for name, labels, value in snap['counters']:
+            by_name[name].append(('counter', labels, value))
+        for name, labels, buckets, counts, total in snap['histograms']:
+            by_name[name].append(('histogram', labels, (buckets, counts, total)))
+
+        lines = []
+        for name in sorted(by_name):
+            kind = by_name[name][0][0]
+            if name in HELP:
+                lines.append('# HELP {} {}'.format(name, HELP[name]))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for _, labels, value in sorted(by_name[name], key=lambda x: sorted(x[1].items())):
+                labels = sorted(labels.items())
+                if kind == 'counter':
+                    lines.append('{}{} {}'.format(name, fmt(labels), value))
+                    continue
+                buckets, counts, total = value
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(name, fmt(labels, [('le', bound)]), cumulative))
+                lines.append('{}_sum{} {}'.format(name, fmt(labels), total))
+                lines.append('{}_count{} {}'.format(name, fmt(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        A readable summary: counter totals, histogram counts,
+        means and estimated percentiles, and the cache hit ratio
+
+        :return: dict
+        """
+        snap = self.snapshot()
+        res = {'counters': defaultdict(dict), 'histograms': defaultdict(dict)}
+
+        def label_key(labels):
+            return ','.join('{}={}'.format(k, v) for k, v in sorted(labels.items())) or 'all'
+
+        for name, labels, value in snap['counters']:
+            res['counters'][name][label_key(labels)] = value
+
+        for name, labels, buckets, counts, total in snap['histograms']:
+            n = sum(counts)
+            stats = {'count': n, 'sum': total, 'mean': total / n if n else None}
+            for q in (50, 90, 99):
+                stats['p{}'.format(q)] = _quantile(buckets, counts, q / 100)
+            res['histograms'][name][label_key(labels)] = stats
+
+        hits = misses = 0
+        for name, labels, value in snap['counters']:
+            if name == 'house_cache_requests_total':
+                if labels.get('result') == 'hit':
+                    hits += value
+                else:
+                    misses += value
+        res['cache_hit_ratio'] = hits / (hits + misses) if hits + misses else None
+        return res
+
+    def export(self, name, root=ROOT_DIR):
+        """
+        Writes the Prometheus text and the JSON summary of a run,
+        as <root>/<name>.prom and <root>/<name>.json
+
+        :param name: The name of the run, e.g. 'crawl' - str
+        :return: The two paths
+        """
+        os.makedirs(root, exist_ok=True)
+        paths = []
+        for ext, text in (('prom', self.prometheus()),
+                          ('json', json.dumps(self.summary(), indent=2, sort_keys=True))):
+            path = os.path.join(root, '{}.{}'.format(name, ext))
+            tmp = path + '.tmp'
+            with open(tmp, 'w+') as out_file:
+                out_file.write(text)
+            os.replace(tmp, path)
+            paths.append(path)
+        return paths
+
+
+def _quantile(buckets, counts, q):
+    """
+    Estimates a quantile as the upper bound of the bucket it falls in
+    """
+    n = sum(counts)
+    if not n:
+        return None
+    cumulative = 0
+    for bound, count in zip(list(buckets) + [float('inf')], counts):
+        cumulative += count
+        if cumulative >= q * n:
+            return bound
+    return float('inf')
+
+
+METRICS = Metrics()
+
+
+def loader(page):
+    """
+    Decorates a page's load method to time it and
+    count the errors it raises, by page type
+
+    :param page: The page type, e.g. 'bill' - str
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                METRICS.inc('house_load_errors_total', page=page, error=type(e).__name__)
+                raise
+            finally:
+                METRICS.observe('house_load_seconds', time.perf_counter() - start, page=page)
+        return wrapper
+    return decorate
+
+
+def extractor(page):
+    """
+    Decorates an extraction step to time it, by page type and step
+
+    :param page: The page type, e.g. 'bill' - str
+    """
+    def decorate(func):
+        step = func.__name__.lstrip('_')
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe('house_extract_seconds', time.perf_counter() - start,
+                                page=page, step=step)
+        return wrapper
+    return decorate
@@ -0,0 +1,165 @@
+import re
+import json
+import hashlib
+from collections import defaultdict
+
+from tqdm import tqdm
+
+from utils import UnionFind
+
+# Signature length, split into BANDS bands of ROWS rows for LSH.
+# With 32 x 4 a pair is likely to become a candidate from ~0.4 similarity.
+PERMUTATIONS = 128
+BANDS = 32
+ROWS = PERMUTATIONS // BANDS
+
+SHINGLE_SIZE = 5
+
+_MAX = 2 ** 64
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    The set of word n-grams of a text, ignoring case and punctuation
+
+    :param text: str
+    :param size: The number of words per shingle - int
+    :return: set of str
+    """
+    words = re.findall(r'[a-z0-9]+', text.lower())
+    return {' '.join(words[i:i + size])
+            for i in range(max(1, len(words) - size + 1))} if words else set()
+
+
+def signature(text):
+    """
+    The MinHash signature of a text.
+    Uses one-permutation hashing: each shingle is hashed once and the
+    hash space split into PERMUTATIONS bins, keeping the minimum per bin.
+    Empty bins borrow from the next non-empty one so signatures of
+    short texts stay comparable.
+
+    :param text: str
+    :return: list of int (empty if the text has no words)
+    """
+    mins = [_MAX] * PERMUTATIONS
+    for sh in shingles(text):
+        h = int.from_bytes(hashlib.blake2b(sh.encode(), digest_size=8).digest(),
+                           'little')
+        b = h % PERMUTATIONS
+        v = h // PERMUTATIONS
+        if v < mins[b]:
+            mins[b] = v
+
+    if all(m == _MAX for m in mins):
+        return []
+
+    sig = []
+    for b in range(PERMUTATIONS):
+        offset = 0
+        while mins[(b + offset) % PERMUTATIONS] == _MAX:
+            offset += 1
+        sig.append(mins[(b + offset) % PERMUTATIONS] + offset * _MAX)
+    return sig
+
+
+def similarity(a, b):
+    """
+    The Jaccard similarity estimated from two signatures
+    """
+    if not a or not b:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / PERMUTATIONS
+
+
+class LSHIndex:
+
+    """
+    Banded locality-sensitive hashing over bill signatures,
+    so similar bills are found without comparing every pair
+    """
+
+    def __init__(self):
+        self._buckets = defaultdict(set)
+        self._signatures = {}
+
+    def __contains__(self, bill):
+        return bill in self._signatures
+
+    def __iter__(self):
+        return iter(self._signatures)
+
+    def _bands(self, sig):
+        for i in range(BANDS):
+            yield i, tuple(sig[i * ROWS:(i + 1) * ROWS])
+
+    def add(self, bill):
+        """
+        Indexes a bill by its signature (bills without text are skipped)
+        """
+        sig = bill.get_minhash()
+        if not sig:
+            return
+        self._signatures[bill] = sig
+        for band in self._bands(sig):
+            self._buckets[band].add(bill)
+
+    def remove(self, bill):
+        """
+        Drops a bill from the index
+        """
+        sig = self._signatures.pop(bill, None)
+        if sig:
+            for band in self._bands(sig):
+                self._buckets[band].discard(bill)
+
+    def candidates(self, sig):
+        """
+        The bills sharing at least one band with a signature
+        """
+        found = set()
+        for band in self._bands(sig):
+            found |= self._buckets.get(band, set())
+        return found
+
+    def similar(self, bill, threshold=0.5):
+        """
+        The bills estimated to be at least threshold similar to a bill
+
+        :param bill: The Bill
+        :param threshold: The minimum estimated Jaccard similarity - float
+        :return: List of (Bill, similarity), most similar first
+        """
+        sig = self._signatures.get(bill) or bill.get_minhash()
+        res = []
+        for other in self.candidates(sig):
+            if other is bill:
+                continue
+            sim = similarity(sig, self._signatures[other])
+            if sim >= threshold:
+                res.append((other, sim))
+        return sorted(res, key=lambda x: x[1], reverse=True)
+
+    def clusters(self, threshold=0.8):
+        """
+        Groups the indexed bills into clusters of near duplicates
+
+        :param threshold: The minimum estimated Jaccard similarity - float
+        :return: List of lists of Bills, for clusters of 2 or more
+        """
+        uf = UnionFind()
+        for bill in tqdm(list(self._signatures)):
+            uf.find(bill)
+            for other, _ in self.similar(bill, threshold):
+                uf.union(bill, other)
+        return [g for g in uf.groups().values() if len(g) > 1]
+
+
+if __name__ == '__main__':
+    from house import HOUSE
+
+    print('Clustering near-duplicate bills.')
+    clusters = HOUSE.similar_index().clusters()
+    json.dump([sorted(b._sources['url'] for b in c) for c in clusters],
+              open(HOUSE.ROOT_DIR + 'bills/clusters.json', 'w+'))
+    print('Found {} clusters.'.format(len(clusters)))
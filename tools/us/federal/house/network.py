@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+from collections import defaultdict
+
+from resolver import url_member_id
+from utils import party_initial
+from persist import write_json
+
+
+def _collaborations(bill):
+    """
+    The sponsor and (non-withdrawn) cosponsors of a bill
+
+    :param bill: The Bill
+    :return: (sponsor (id, party), list of cosponsor (id, party))
+    """
+    sponsor = bill.get_overview().get('sponsor', {})
+    if 'url' not in sponsor:
+        return None, []
+
+    cosponsors = [
+        (url_member_id(co['cosponsors']['url']), party_initial(co['cosponsors']['rep']))
+        for co in bill._cosponsors if 'date withdrawn' not in co
+    ]
+    return (url_member_id(sponsor['url']), party_initial(sponsor.get('name'))), cosponsors
+
+
+def fingerprint(bills):
+    """
+    A hash over everything in a set of bills that shapes the network
+
+    :param bills: An iterable of Bills
+    :return: str
+    """
+    rows = []
+    for bill in bills:
+        sponsor, cosponsors = _collaborations(bill)
+        rows.append([bill._sources.get('url', ''), sponsor,
+                     sorted(cosponsors, key=lambda c: c[0])])
+    rows.sort(key=lambda r: r[0])
+    return hashlib.sha1(json.dumps(rows).encode()).hexdigest()
+
+
+class CosponsorNetwork:
+
+    """
+    The weighted sponsor -> cosponsor network of a congress,
+    kept as a sparse adjacency of member ID -> {member ID: weight}
+    """
+
+    def __init__(self, bills):
+        self.out_edges = defaultdict(lambda: defaultdict(int))
+        self.in_edges = defaultdict(lambda: defaultdict(int))
+        self.parties = {}
+
+        for bill in bills:
+            sponsor, cosponsors = _collaborations(bill)
+            if not sponsor:
+                continue
+            sid, sparty = sponsor
+            self.parties.setdefault(sid, sparty)
+            for cid, cparty in cosponsors:
+                if cid == sid:
+                    continue
+                self.parties.setdefault(cid, cparty)
+                self.out_edges[sid][cid] += 1
+                self.in_edges[cid][sid] += 1
+
+    def nodes(self):
+        return set(self.parties)
+
+    def degrees(self):
+        """
+        The distinct and weighted collaborators of every member
+
+        :return: dict of member ID -> dict
+        """
+        return {n: {
+            'cosponsors attracted': len(self.out_edges.get(n, {})),
+            'cosponsorships attracted': sum(self.out_edges.get(n, {}).values()),
+            'sponsors supported': len(self.in_edges.get(n, {})),
+            'cosponsorships given': sum(self.in_edges.get(n, {}).values())
+        } for n in self.nodes()}
+
+    def pagerank(self, damping=0.85, iterations=100, tol=1e-9):
+        """
+        Weighted PageRank where each cosponsorship
+        passes credit from the cosponsor to the sponsor
+
+        :return: dict of member ID -> score
+        """
+        nodes = list(self.nodes())
+        if not nodes:
+            return {}
+        n = len(nodes)
+        rank = dict.fromkeys(nodes, 1 / n)
+        # Credit flows along cosponsor -> sponsor, i.e. in_edges
+        given = {c: sum(s.values()) for c, s in self.in_edges.items()}
+
+        for _ in range(iterations):
+            dangling = sum(rank[c] for c in nodes if not given.get(c))
+            new = dict.fromkeys(nodes, (1 - damping) / n + damping * dangling / n)
+            for c, sponsors in self.in_edges.items():
+                share = damping * rank[c] / given[c]
+                for s, w in sponsors.items():
+                    new[s] += share * w
+            delta = sum(abs(new[k] - rank[k]) for k in nodes)
+            rank = new
+            if delta < tol:
+                break
+
+        return rank
+
+    def bipartisanship(self):
+        """
+        The share of each member's weighted collaborations,
+        given or attracted, with members of another party
+
+        :return: dict of member ID -> score (None if party unknown)
+        """
+        res = {}
+        for n in self.nodes():
+            party = self.parties.get(n)
+            total = cross = 0
+            for edges in (self.out_edges.get(n, {}), self.in_edges.get(n, {})):
+                for other, w in edges.items():
+                    total += w
+                    if party and self.parties.get(other) and self.parties[other] != party:
+                        cross += w
+            res[n] = cross / total if total and party else None
+        return res
+
+
+class NetworkAnalytics:
+
+    """
+    Computes network metrics per congress,
+    caching them on disk until the congress's bills change
+    """
+
+    ROOT_DIR = 'data/us/federal/house/network/'
+
+    def __init__(self):
+        # Congress -> (the snapshot version it was checked at, metrics)
+        self._memory = {}
+
+    def metrics(self, congress, bills, version=None):
+        """
+        The metrics of a congress's cosponsorship network
+
+        :param congress: The congress - int
+        :param bills: The Bills of that congress
+        :param version: The version of the snapshot the bills are from;
+                        the bills are only fingerprinted once per version - int
+        :return: dict of member ID -> metrics
+        """
+        seen, cached = self._memory.get(congress, (None, None))
+        if cached and version is not None and seen == version:
+            return cached['members']
+
+        bills = list(bills)
+        fp = fingerprint(bills)
+        if cached and cached['fingerprint'] == fp:
+            self._memory[congress] = (version, cached)
+            return cached['members']
+
+        path = self.ROOT_DIR + '{}.json'.format(congress)
+        try:
+            with open(path) as in_file:
+                cached = json.load(in_file)
+        except (FileNotFoundError, ValueError):
+            cached = None
+
+        if not cached or cached['fingerprint'] != fp:
+            print('Computing cosponsorship network for congress {}.'.format(congress))
+            net = CosponsorNetwork(bills)
+            degrees = net.degrees()
+            rank = net.pagerank()
+            bip = net.bipartisanship()
+            cached = {
+                'fingerprint': fp,
+                'members': {n: dict(degrees[n], party=net.parties.get(n),
+                                    pagerank=rank.get(n),
+                                    bipartisanship=bip.get(n))
+                            for n in net.nodes()}
+            }
+            os.makedirs(self.ROOT_DIR, exist_ok=True)
+            write_json(path, cached)
+
+        self._memory[congress] = (version, cached)
+        return cached['members']
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from changelog import CHANGELOG
+from metrics import METRICS, page_type
+
+# path -> (mtime, size, digest, field digests) of the files this
+# process has seen, so unchanged files aren't read again to be compared
+_digests = {}
+
+
+def canonical(data):
+    """
+    Serializes data canonically: sorted keys and no whitespace,
+    so equal data always has equal bytes
+
+    :param data: A JSON-able object
+    :return: bytes
+    """
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+
+def content_hash(blob):
+    """
+    The hash of serialized data
+
+    :param blob: bytes
+    :return: str
+    """
+    return hashlib.sha1(blob).hexdigest()
+
+
+def field_hashes(data):
+    """
+    The content hash of every top-level field of a JSON object
+
+    :param data: dict
+    :return: dict of field -> str
+    """
+    if not isinstance(data, dict):
+        return {}
+    return {k: content_hash(canonical(v)) for k, v in data.items()}
+
+
+def _stored(path):
+    """
+    The content hash and field hashes of the file at a path
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        _digests.pop(path, None)
+        return None, {}
+
+    cached = _digests.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2:]
+
+    with open(path, 'rb') as in_file:
+        blob = in_file.read()
+    # Files written before canonical serialization hash as their data would
+    try:
+        data = json.loads(blob)
+        digest, fields = content_hash(canonical(data)), field_hashes(data)
+    except ValueError:
+        digest, fields = content_hash(blob), {}
+    _digests[path] = (stat.st_mtime_ns, stat.st_size, digest, fields)
+    return digest, fields
+
+
+def stored_hash(path):
+    """
+    The content hash of the file at a path
+
+    :param path: str
+    :return: str, or None if there is no file
+    """
+    return _stored(path)[0]
+
+
+def write_json(path, data, kind=None, key=None):
+    """
+    Writes data to a JSON file, unless the file already holds it.
+    Changed files are written beside their destination and atomically
+    swapped in, so readers never see a partial file.
+    Changes to corpus entities (those given a kind and key)
+    are appended to the change log (see changelog.ChangeLog),
+    and swapped in only once logged, so no change goes unlogged.
+
+    :param path: The file path - str
+    :param data: A JSON-able object
+    :param kind: The kind of entity, e.g. 'bill' - str
+    :param key: The key of the entity - str
+    :return: The change record, or None if nothing changed:
+             {'path', 'kind', 'key', 'type', 'fields',
+              'hash', 'previous', 'time'}
+    """
+    blob = canonical(data)
+    digest = content_hash(blob)
+    previous, old_fields = _stored(path)
+    if digest == previous:
+        return None
+    fields = field_hashes(data)
+
+    # Unique per thread, as scrapers write from several threads
+    tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmp, 'wb') as out_file:
+        out_file.write(blob)
+
+    change = {
+        'path': path,
+        'kind': kind,
+        'key': key,
+        'type': 'updated' if previous else 'created',
+        'fields': sorted(k for k in set(fields) | set(old_fields)
+                         if fields.get(k) != old_fields.get(k)),
+        'hash': digest,
+        'previous': previous,
+        'time': time.time()
+    }
+
+    def swap():
+        os.replace(tmp, path)
+
+    if kind:
+        # Swapped in under the log's lock, once the change is logged
+        change = CHANGELOG.append(change, apply=swap)
+    else:
+        swap()
+    METRICS.inc('house_bytes_out_total', len(blob), page=page_type(path), target='json')
+
+    stat = os.stat(path)
+    _digests[path] = (stat.st_mtime_ns, stat.st_size, digest, fields)
+    return change
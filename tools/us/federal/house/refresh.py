@@ -0,0 +1,285 @@
+"""
+Refreshes the bills and members most likely to have changed.
+
+Every bill and member gets a priority from how recently it saw
+action, how far along it is, and how often past refreshes found
+it changed. The highest priorities are refreshed, within a budget
+of requests, and what each refresh found is remembered for the
+next run:
+
+    python refresh.py -b 500
+"""
+
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import argparse
+from datetime import datetime
+
+from tqdm import tqdm
+
+from bill import Bill, STAGE_CODES
+from representative import Representative
+
+from utils import get_jsons
+from metrics import METRICS
+
+DAY = 24 * 60 * 60
+
+# Bills at these stages are done; they rarely change again
+SETTLED = {STAGE_CODES['Became Law']}
+
+# Priority multipliers
+SETTLED_WEIGHT = 0.05
+PAST_CONGRESS_WEIGHT = 0.1
+INACTIVE_REP_WEIGHT = 0.05
+
+# Days over which the pull of a recent action decays
+RECENCY_DAYS = 30
+
+# Days before a checked item is fully due again
+RECHECK_DAYS = 7
+
+# Pages requested to refresh an item: a bill's all-info,
+# text and amendments pages, and a member's profile
+PAGE_COSTS = {
+    'bill': 3,
+    'rep': 1
+}
+
+
+def digest(obj):
+    """
+    A hash of everything a Bill or Representative holds
+
+    :param obj: The Bill or Representative
+    :return: str
+    """
+    data = json.dumps(vars(obj), sort_keys=True, default=str)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def last_activity(bill):
+    """
+    The time of a bill's latest action, from its actions
+    or, failing that, from the overview's latest action
+
+    :param bill: The Bill
+    :return: timestamp, or None
+    """
+    times = [a['datetime'] for a in bill._actions if a.get('datetime')]
+    if times:
+        return max(times)
+    m = re.search(r'\d{2}/\d{2}/\d{4}', bill.get_overview().get('latest_action') or '')
+    if m:
+        return datetime.strptime(m.group(), '%m/%d/%Y').timestamp()
+    return None
+
+
+class RefreshScheduler:
+
+    """
+    Chooses what to refresh within a request budget,
+    keeping a persistent record of what each refresh found
+    """
+
+    PATH = 'data/us/federal/house/refresh/state.json'
+
+    def __init__(self, path=PATH, now=None):
+        self._path = path
+        self.now = now or time.time()
+
+        # URL -> {'kind', 'checks', 'changes', 'last_checked',
+        #         'last_changed', 'digest'}
+        self.state = {}
+        try:
+            with open(path) as in_file:
+                self.state = json.load(in_file)
+        except FileNotFoundError:
+            pass
+
+    def _record(self, kind, url):
+        if url not in self.state:
+            self.state[url] = {
+                'kind': kind,
+                'checks': 0,
+                'changes': 0,
+                'last_checked': None,
+                'last_changed': None,
+                'digest': None
+            }
+        return self.state[url]
+
+    def change_rate(self, url):
+        """
+        The share of refreshes that found a change,
+        smoothed so unchecked items start at one half
+        """
+        rec = self.state.get(url, {})
+        return (rec.get('changes', 0) + 1) / (rec.get('checks', 0) + 2)
+
+    def due(self, url):
+        """
+        How due an item is for a check, from 0 (just checked) to 1
+        """
+        last = self.state.get(url, {}).get('last_checked')
+        if last is None:
+            return 1.0
+        return 1 - math.exp(-(self.now - last) / (RECHECK_DAYS * DAY))
+
+    def bill_priority(self, bill, current_congress):
+        """
+        The priority of refreshing a bill
+
+        :param bill: The Bill
+        :param current_congress: The congress now in session - int
+        :return: float
+        """
+        url = bill._sources['url']
+        last = last_activity(bill)
+        if last is None:
+            recency = 1.0
+        else:
+            recency = math.exp(-max(0.0, self.now - last) / (RECENCY_DAYS * DAY))
+
+        weight = 1.0
+        if bill._stage in SETTLED:
+            weight *= SETTLED_WEIGHT
+        if bill.get_congress() and bill.get_congress() < current_congress:
+            weight *= PAST_CONGRESS_WEIGHT
+
+        return weight * (0.1 + recency) * self.change_rate(url) * self.due(url)
+
+    def rep_priority(self, rep):
+        """
+        The priority of refreshing a representative
+
+        :param rep: The Representative
+        :return: float
+        """
+        url = rep.sources['url']
+        weight = 1.0 if rep.get_active() else INACTIVE_REP_WEIGHT
+        return weight * self.change_rate(url) * self.due(url)
+
+    def plan(self, bills, reps, budget):
+        """
+        Chooses what to refresh
+
+        :param bills: The candidate Bills
+        :param reps: The candidate Representatives
+        :param budget: The number of pages that may be requested - int
+        :return: List of (priority, kind, object), highest first,
+                 whose page costs (see PAGE_COSTS) fit the budget
+        """
+        bills = list(bills)
+        congresses = [b.get_congress() for b in bills if b.get_congress()]
+        current = max(congresses) if congresses else 0
+
+        ranked = [(self.bill_priority(b, current), 'bill', b) for b in bills]
+        ranked += [(self.rep_priority(r), 'rep', r) for r in reps]
+        ranked.sort(key=lambda x: x[0], reverse=True)
+
+        chosen = []
+        for item in ranked:
+            cost = PAGE_COSTS[item[1]]
+            if cost <= budget:
+                chosen.append(item)
+                budget -= cost
+            if budget < min(PAGE_COSTS.values()):
+                break
+        return chosen
+
+    def refresh(self, kind, obj):
+        """
+        Refreshes a single item, recording whether it changed
+
+        :param kind: 'bill' or 'rep'
+        :param obj: The Bill or Representative
+        :return: True if it changed
+        """
+        url = obj._sources['url'] if kind == 'bill' else obj.sources['url']
+        before = digest(obj)
+        obj.refresh(force_reload=True)
+        after = digest(obj)
+
+        rec = self._record(kind, url)
+        # The first check compares against the JSON on disk
+        changed = after != (rec['digest'] or before)
+        rec['checks'] += 1
+        rec['last_checked'] = self.now
+        rec['digest'] = after
+        if changed:
+            rec['changes'] += 1
+            rec['last_changed'] = self.now
+        return changed
+
+    def run(self, bills, reps, budget):
+        """
+        Refreshes the highest priority items within the budget
+
+        :param bills: The candidate Bills
+        :param reps: The candidate Representatives
+        :param budget: The number of pages that may be requested - int
+        :return: A report of the run
+        """
+        report = {
+            'refreshed': 0,
+            'changed': [],
+            'failed': {}
+        }
+        try:
+            for priority, kind, obj in tqdm(self.plan(bills, reps, budget)):
+                url = obj._sources['url'] if kind == 'bill' else obj.sources['url']
+                try:
+                    if self.refresh(kind, obj):
+                        report['changed'].append(url)
+                except Exception as e:
+                    report['failed'][url] = '{}: {}'.format(type(e).__name__, e)
+                report['refreshed'] += 1
+        finally:
+            self.save()
+        return report
+
+    def save(self):
+        """
+        Writes the state beside its path and atomically swaps it in
+        """
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w+') as out_file:
+            json.dump(self.state, out_file)
+        os.replace(tmp, self._path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh what is likely to have changed')
+    parser.add_argument('-b', '--budget', type=int, default=500,
+                        help='The number of pages to request')
+    parser.add_argument('--plan', action='store_true',
+                        help='Show what would be refreshed and exit')
+    args = parser.parse_args()
+
+    print('Loading bills.')
+    bills = [Bill(filename=f) for f in tqdm(get_jsons(Bill.ROOT_DIR))]
+    print('Loading reps.')
+    reps = [Representative(filename=f) for f in tqdm(get_jsons(Representative.ROOT_DIR))]
+
+    scheduler = RefreshScheduler()
+    if args.plan:
+        for priority, kind, obj in scheduler.plan(bills, reps, args.budget):
+            print('{:.4f}\t{}\t{}'.format(priority, kind, obj))
+        raise SystemExit
+
+    report = scheduler.run(bills, reps, args.budget)
+    print('Refreshed {}, {} changed, {} failed.'.format(
+        report['refreshed'], len(report['changed']), len(report['failed'])))
+    for url, error in report['failed'].items():
+        print('Failed {} ({})'.format(url, error))
+    print('Metrics written to {} and {}.'.format(*METRICS.export('refresh')))
+
+    if report['changed']:
+        from image import update_image
+        update_image()
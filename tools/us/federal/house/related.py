@@ -0,0 +1,128 @@
+from collections import defaultdict
+
+from utils import UnionFind, bill_key
+
+
+class RelatedBills:
+
+    """
+    The graph of related bills, keyed by canonical bill key,
+    with relationship types on its edges and its connected
+    components ("bill families") kept in a union-find
+    """
+
+    def __init__(self):
+        # key -> {other key -> set of relationships}
+        self._edges = defaultdict(lambda: defaultdict(set))
+
+        # key -> the edges it contributed, so replacing a bill retracts them
+        self._contributed = {}
+
+        # key -> loaded Bill
+        self._bills = {}
+
+        self._families = UnionFind()
+        self._stale = False
+        self._groups = None
+
+    def __contains__(self, bill):
+        return self._bills.get(bill.get_key()) is bill
+
+    def __iter__(self):
+        return iter(list(self._bills.values()))
+
+    def add(self, bill):
+        """
+        Adds a bill and the relationships it lists
+        """
+        key = bill.get_key()
+        if not key:
+            return
+        if key in self._bills:
+            self.remove(self._bills[key])
+
+        self._bills[key] = bill
+        self._families.find(key)
+        self._groups = None
+
+        edges = []
+        for r in bill._related:
+            other = bill_key(r['bill']['url'])
+            if not other or other == key:
+                continue
+            rel = r['relationship'].strip()
+            self._edges[key][other].add(rel)
+            self._edges[other][key].add(rel)
+            self._families.union(key, other)
+            edges.append((other, rel))
+        self._contributed[key] = edges
+
+    def remove(self, bill):
+        """
+        Removes a bill and the relationships it contributed
+        """
+        key = bill.get_key()
+        if self._bills.get(key) is not bill:
+            return
+        del self._bills[key]
+
+        for other, rel in self._contributed.pop(key, []):
+            # Keep edges the other bill lists itself
+            if any(o == key and r == rel for o, r in self._contributed.get(other, [])):
+                continue
+            self._edges[key][other].discard(rel)
+            self._edges[other][key].discard(rel)
+            if not self._edges[key][other]:
+                del self._edges[key][other]
+                del self._edges[other][key]
+
+        # Union-find can't split, rebuild the families on next use
+        self._stale = True
+        self._groups = None
+
+    def _rebuild(self):
+        self._families = UnionFind()
+        for key, others in self._edges.items():
+            self._families.find(key)
+            for other in others:
+                self._families.union(key, other)
+        for key in self._bills:
+            self._families.find(key)
+        self._stale = False
+
+    def related(self, bill):
+        """
+        The bills directly related to a bill
+
+        :param bill: The Bill
+        :return: List of (key, Bill or None if not loaded, set of relationships)
+        """
+        return [(other, self._bills.get(other), rels)
+                for other, rels in sorted(self._edges.get(bill.get_key(), {}).items())]
+
+    def family(self, bill):
+        """
+        Every bill connected to a bill through relationships
+
+        :param bill: The Bill
+        :return: List of (key, Bill or None if not loaded), excluding the bill
+        """
+        if self._stale:
+            self._rebuild()
+
+        key = bill.get_key()
+        root = self._families.find(key)
+        return [(k, self._bills.get(k))
+                for k in self.families().get(root, [key]) if k != key]
+
+    def families(self):
+        """
+        Every connected component of the graph
+
+        :return: dict of representative key -> list of keys
+        """
+        if self._stale:
+            self._rebuild()
+        if self._groups is None:
+            self._groups = self._families.groups()
+        return self._groups
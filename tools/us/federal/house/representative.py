@@ -1,9 +1,9 @@
 import re
 import json
+import math
 import datetime
-import requests
 
-from glob import glob
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 from pprint import pprint
@@ -11,8 +11,25 @@ from pprint import pprint
 import us
 import pylcs
 
-from utils import download_file, get_representative_urls
-from bill import Bill
+from utils import download_file, get_representative_urls, bill_key, fetch, ParseError
+from bill import stored_bill_keys, fetch_bills
+from persist import write_json
+from metrics import METRICS, loader, extractor
+from resolver import member_id
+
+
+def name_matches(query, name):
+    """
+    Whether a name search matches a name: the letters of the
+    query, in order, ignoring case and anything but letters
+
+    :param query: The name searched for - str
+    :param name: A representative's name - str
+    :return: True or False
+    """
+    v = ''.join([let for let in query.lower() if 'a' <= let <= 'z'])
+    name = ''.join([let for let in name.lower() if 'a' <= let <= 'z'])
+    return pylcs.lcs(v, name) == len(v)
 
 
 class Representative:
@@ -44,6 +61,7 @@ class Representative:
                                            self.get_state(),
                                            self.get_district())
 
+    @loader('rep')
     def load(self, url, force_reload=False):
         cache = url.split('://')[-1].replace('/', '_')
         self.sources['url'] = url
@@ -51,7 +69,8 @@ class Representative:
 
         data = download_file(self.sources['url'], self.sources['html'],
                              force_reload)
-        soup = BeautifulSoup(data, 'html.parser')
+        with METRICS.timer('house_extract_seconds', page='rep', step='soup'):
+            soup = BeautifulSoup(data, 'html.parser')
 
         details = soup.find('h1', attrs={'class': 'legDetail'})
         self._extractbasics(details)
@@ -67,6 +86,7 @@ class Representative:
 
         self.to_json()
 
+    @extractor('rep')
     def _extractbasics(self, details):
         """
         Extracts basic details
@@ -88,6 +108,7 @@ class Representative:
         last = spans[-1]
         self.basics['in congress'] = next(last.strings)
 
+    @extractor('rep')
     def _extract_overview(self, prof):
         """
         Extracts the overview
@@ -152,40 +173,79 @@ class Representative:
                     s.strip() for s in td.strings
                 ]
             else:
-                print('New Info!')
-                import pdb
-                pdb.set_trace()
+                raise ParseError('New info {!r} in {}'.format(
+                    th, self.sources['url']))
 
-    def download_all_bills(self):
-        pg = 1
-        urls = set()
+    # Results per page of a member's sponsored legislation
+    PAGE_SIZE = 100
 
-        lns = -1
-        while len(urls) % 100 == 0 and lns != len(urls):
-            lns = len(urls)
-            html = requests.get(
-                self.sources['url'] + '?page={}'.format(pg)).text
-            soup = BeautifulSoup(html, 'html.parser')
+    def _bill_page(self, pg):
+        """
+        Gets a page of the member's sponsored legislation
 
-            for sp in soup.find_all('span', attrs={'class': 'result-heading'}):
-                url = sp.find('a').get('href')
-                url = url.split('?')[0] + '/all-info'
-                urls.add(url)
+        :param pg: The page number, from 1 - int
+        :return: (the bill URLs listed, the page's soup)
+        """
+        html = fetch(self.sources['url'] + '?page={}'.format(pg)).text
+        soup = BeautifulSoup(html, 'html.parser')
 
-            pg += 1
+        urls = set()
+        for sp in soup.find_all('span', attrs={'class': 'result-heading'}):
+            url = sp.find('a').get('href')
+            url = url.split('?')[0] + '/all-info'
+            urls.add(url)
+        return urls, soup
 
-        old_urls = set()
-        for f in tqdm(glob('data/us/federal/house/bills/json/*.json')):
-            data = json.load(open(f))
+    def _page_count(self, soup):
+        """
+        The number of result pages, read from the result count
+        (e.g. '1-100 of 345') or, failing that, the pagination links of a page
 
-            if 'all-info' not in data['sources']['url']:
-                old_urls.add(data['sources']['url'] + '/all-info')
-            else:
-                old_urls.add(data['sources']['url'])
+        :param soup: A page of results - BeautifulSoup
+        :return: int, or None if the page doesn't say
+        """
+        counts = soup.find(attrs={'class': 'results-number'})
+        m = re.search(r'of\s+([\d,]+)', counts.text) if counts else None
+        if m:
+            return max(1, math.ceil(int(m.group(1).replace(',', '')) / self.PAGE_SIZE))
+
+        # Only the pagination links; results and sidebars link to other searches
+        pages = [int(p) for nav in soup.find_all(class_=re.compile('pagination'))
+                 for a in nav.find_all('a', href=True)
+                 for p in re.findall(r'[?&]page=(\d+)', a['href'])]
+        return max(pages) if pages else None
+
+    def download_all_bills(self, known=None, workers=8):
+        """
+        Downloads the bills the member sponsored that aren't stored yet.
+        The first page of results gives the number of pages, and the
+        rest are fetched concurrently.
+
+        :param known: The keys of the bills already held
+                      (default: those stored on disk, see bill.stored_bill_keys)
+        :param workers: The number of requests in flight - int
+        :return: (the new Bills, dict of URL -> exception for those that failed)
+        """
+        urls, soup = self._bill_page(1)
+        count = self._page_count(soup)
 
-        new_urls = urls - old_urls
-        for u in tqdm(new_urls):
-            Bill(url=u)
+        if count is not None:
+            with ThreadPoolExecutor(workers) as pool:
+                for page, _ in pool.map(self._bill_page, range(2, count + 1)):
+                    urls |= page
+        else:
+            # No page count; walk the pages until one comes up short
+            pg = 1
+            page = urls
+            while len(page) == self.PAGE_SIZE:
+                pg += 1
+                page, _ = self._bill_page(pg)
+                urls |= page
+
+        if known is None:
+            known = stored_bill_keys()
+        new_urls = [u for u in urls if bill_key(u) not in known]
+        return fetch_bills(tqdm(new_urls), workers=workers)
 
     def refresh(self, force_reload=False):
         """
@@ -197,15 +257,18 @@ class Representative:
 
     def to_json(self):
         """
-        Dumps the Representative to a JSON readable format
+        Dumps the Representative to a JSON readable format,
+        unless the file already holds it
+
+        :return: The change record, or None if unchanged (see persist.write_json)
         """
         filename = '{}.json'.format(self.basics['name'])
         self.sources['json'] = self.ROOT_DIR + 'json/' + filename
-        json.dump({
+        return write_json(self.sources['json'], {
             'sources': self.sources,
             'basics': self.basics,
             'overview': self.overview
-        }, open(self.ROOT_DIR + 'json/' + filename, 'w+'))
+        }, kind='rep', key=member_id(self))
 
     def from_json(self, filename):
         """
@@ -239,8 +302,7 @@ class Representative:
                     return pa
             return None
         else:
-            import pdb
-            pdb.set_trace()
+            raise ParseError('No party for {}'.format(self.sources['url']))
 
     def get_state(self):
         """
@@ -316,12 +378,7 @@ class Representative:
         if key == 'source':
             return value in self.sources.values()
         elif key == 'name':
-            v = value.lower()
-            v = ''.join([let for let in v if 'a' <= let <= 'z'])
-            name = self.basics['name'].lower()
-            name = ''.join([let for let in name if 'a' <= let <= 'z'])
-            lcs = pylcs.lcs(v, name)
-            return lcs == len(v)
+            return name_matches(value, self.basics['name'])
         elif key == 'chamber':
             if value == 'House':
                 return self.basics['title'] == 'Representative'
@@ -353,3 +410,6 @@ if __name__ == '__main__':
 
     for url in tqdm(old):
         Representative(url=url).refresh()
+
+    from image import update_image
+    update_image()
@@ -0,0 +1,178 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+import us
+
+# Name parts that never identify a legislator on a roll call
+SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv'}
+
+
+def normalize(name):
+    """
+    Lowercases a name and strips it to unaccented letters
+
+    :param name: str
+    :return: str
+    """
+    name = unicodedata.normalize('NFKD', name)
+    return ''.join([let for let in name.lower() if 'a' <= let <= 'z'])
+
+
+def url_member_id(url):
+    """
+    The bioguide ID that ends a congress.gov member URL,
+    absolute or relative
+
+    :param url: str
+    :return: str
+    """
+    return url.split('?')[0].rstrip('/').split('/')[-1] or url
+
+
+def member_id(rep):
+    """
+    The stable ID of a Representative: the bioguide ID
+    that ends its congress.gov URL
+
+    :param rep: The Representative
+    :return: str
+    """
+    return url_member_id(rep.sources.get('url', ''))
+
+
+def _parties(rep):
+    """
+    The initials of every party a representative belonged to
+    """
+    info = rep.overview.get('info', {})
+    parties = set()
+    if info.get('party'):
+        parties.add(info['party'][:1])
+    for text in info.get('party history', []):
+        if text:
+            parties.add(text[:1])
+    return parties
+
+
+def _surnames(name):
+    """
+    Every normalized trailing run of a full name,
+    so multi-word surnames ('Van Drew') are indexed too
+    """
+    tokens = [t for t in re.split(r'[\s,]+', name)
+              if t and normalize(t) not in SUFFIXES]
+    if not tokens:
+        return set()
+    return {normalize(' '.join(tokens[i:])) for i in range(len(tokens))}
+
+
+def _legislator(record):
+    """
+    Splits a roll call display name, e.g. 'Johnson (GA)'
+    or 'Davis, Rodney', into a surname and a given name hint
+
+    :param record: An entry of Vote._votes['recorded'] - dict
+    :return: (surname, given name) normalized
+    """
+    name = record['name'].split(' (')[0]
+    surname, _, given = name.partition(', ')
+    return normalize(surname), normalize(given)
+
+
+class MemberResolver:
+
+    """
+    Links the legislators of recorded votes to Representative
+    records through an index of
+    (state, surname, party, congress) -> member IDs
+    """
+
+    def __init__(self, reps):
+        self._index = defaultdict(set)
+        self._given = {}
+
+        for rep in reps:
+            mid = member_id(rep)
+            self._given[mid] = normalize(rep.basics['name'].split()[0])
+            parties = _parties(rep)
+            surnames = _surnames(rep.basics['name'])
+            for pos in rep.overview.get('positions', []):
+                if pos['In Congress']['chamber'] != 'House':
+                    continue
+                try:
+                    state = us.states.lookup(pos['State']).abbr
+                except AttributeError:
+                    continue
+                for congress in pos['In Congress']['congresses']:
+                    for surname in surnames:
+                        for party in parties:
+                            self._index[(state, surname, party, congress)].add(mid)
+                        # Party-agnostic entry, for members who switched
+                        self._index[(state, surname, None, congress)].add(mid)
+
+        # Resolutions already made for a (name, state, party, congress)
+        self._memo = {}
+
+    def resolve(self, record, congress):
+        """
+        Resolves a single recorded vote to a member ID
+
+        :param record: An entry of Vote._votes['recorded'] - dict
+        :param congress: The congress of the vote - int
+        :return: (member ID or None, candidate IDs)
+        """
+        if record.get('name_id'):
+            return record['name_id'], {record['name_id']}
+
+        key = (record['name'], record['state'], record['party'], congress)
+        if key in self._memo:
+            return self._memo[key]
+
+        surname, given = _legislator(record)
+        found = self._index.get((record['state'], surname, record['party'], congress)) or \
+            self._index.get((record['state'], surname, None, congress), set())
+
+        if len(found) > 1 and given:
+            narrowed = {m for m in found if self._given[m].startswith(given[:3])}
+            found = narrowed or found
+
+        res = (next(iter(found)) if len(found) == 1 else None, found)
+        self._memo[key] = res
+        return res
+
+    def resolve_votes(self, votes, attach=True):
+        """
+        Attaches a 'member_id' to every recorded vote that resolves.
+        Only attach to Votes not yet published in a snapshot.
+
+        :param votes: An iterable of Votes
+        :param attach: False to only report, leaving the Votes as they are
+        :return: A report of the matched count and the ambiguous
+                 and unmatched legislators
+        """
+        report = {
+            'matched': 0,
+            'ambiguous': {},
+            'unmatched': set()
+        }
+        for vote in votes:
+            try:
+                congress = int(vote._congress['congress'])
+            except (KeyError, ValueError):
+                continue
+            for rec in vote._votes.get('recorded', []):
+                if rec.get('member_id'):
+                    report['matched'] += 1
+                    continue
+                mid, found = self.resolve(rec, congress)
+                if mid:
+                    if attach:
+                        rec['member_id'] = mid
+                    report['matched'] += 1
+                elif found:
+                    report['ambiguous'][(rec['name'], rec['state'], congress)] = \
+                        sorted(found)
+                else:
+                    report['unmatched'].add((rec['name'], rec['state'], congress))
+        return report
@@ -1,10 +1,35 @@
+import os
+import re
 import json
 import datetime
 
-import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
+from persist import write_json
+from metrics import METRICS, loader, extractor
+import utils
+from utils import bill_key, bill_url, fetch, write_cache, CacheMiss
+
+LEG_ACT = re.compile(r'<legislative_activity\b.*?</legislative_activity>', re.S)
+LEG_DAY = re.compile(r'<legislative_day\b[^>]*\bdate="(\d{8})"')
+
+
+def _tag(xml, tag):
+    """
+    The text of the first element with a tag, without parsing the XML
+    """
+    m = re.search(r'<{0}\b[^>]*>(.*?)</{0}>'.format(tag), xml, re.S)
+    return m.group(1).strip() if m else None
+
+
+def _action_key(action):
+    """
+    The identity of a floor action: its unique-id,
+    or its time and description for actions without one
+    """
+    return action['unique_id'] or (action['time'], action['desc'])
+
 
 class Session:
 
@@ -16,6 +41,9 @@ class Session:
     ROOT_URL = 'http://clerk.house.gov/floorsummary/'
     ROOT_DIR = 'data/us/federal/house/session/'
 
+    # The JSONs of a single congress
+    SHARD_PATTERN = 'json/HDoc-{}-*.json'
+
     def __init__(self, url='', filename='', force_reload=False):
 
         self._overview = {}
@@ -31,10 +59,15 @@ class Session:
         elif filename:
             self.from_json(filename)
 
+    @loader('session')
     def load(self, force_reload=False):
         """
-        Loads from the URL
+        Loads from the URL. Only the legislative days not already
+        held, and the newest day held (which may have grown),
+        are parsed; floor actions already held are skipped.
+
         :param force_reload: Whether or not to force a refresh
+        :return: The floor actions added
         """
         try:
             if force_reload:
@@ -42,30 +75,63 @@ class Session:
 
             with open(self.ROOT_DIR + 'web/' + self._sources['xml'], 'r+') as infile:
                 xml = infile.read()
+            METRICS.inc('house_cache_requests_total', page='session', result='hit')
         except FileNotFoundError:
+            METRICS.inc('house_cache_requests_total', page='session', result='miss')
+            if utils.CACHE_ONLY:
+                raise CacheMiss('{} is not cached'.format(self._sources['url']))
             # TODO: Verify if this char issue is just an issue with 2019 data
-            xml = requests.get(self.ROOT_URL + self._sources['url']).text[3:]
+            with METRICS.timer('house_fetch_seconds', page='session'):
+                response = fetch(self.ROOT_URL + self._sources['url'])
+            xml = response.text[3:]
+            METRICS.inc('house_bytes_in_total', len(response.content), page='session')
 
-            with open(self.ROOT_DIR + 'web/' + self._sources['xml'], 'w+') as out_file:
-                out_file.write(xml)
-
-        soup = BeautifulSoup(xml, 'xml')
+            write_cache(self.ROOT_DIR + 'web/' + self._sources['xml'], xml)
+            METRICS.inc('house_bytes_out_total', len(xml.encode()), page='session', target='cache')
 
         self._overview = {
-            'congress': soup.find('congress').text,
-            'session': soup.find('session').text
+            'congress': _tag(xml, 'congress'),
+            'session': _tag(xml, 'session')
         }
 
-        for leg in soup.find_all('legislative_activity'):
-            self._extract_leg_act(leg)
+        days = self._days()
+        held = set(days)
+        newest = max(held) if held else None
+        seen = {_action_key(fa) for act in self._activities for fa in act['floor_actions']}
+
+        added = []
+        for block in LEG_ACT.findall(xml):
+            m = LEG_DAY.search(block)
+            if m and m.group(1) in held and m.group(1) != newest:
+                continue
+            leg = BeautifulSoup(block, 'xml').find('legislative_activity')
+            added += self._extract_leg_act(leg, seen, days)
 
         self.to_json()
+        return added
+
+    def _days(self):
+        """
+        The activities held, by legislative day ('YYYYMMDD')
+        """
+        days = {}
+        for act in self._activities:
+            day = act['overview'].get('day') or \
+                datetime.datetime.fromtimestamp(act['overview']['time']).strftime('%Y%m%d')
+            days[day] = act
+        return days
 
-    def _extract_leg_act(self, leg):
+    @extractor('session')
+    def _extract_leg_act(self, leg, seen=(), days=None):
         """
-        Extracts the information from a legislative activity
+        Extracts the information from a legislative activity,
+        adding to the day's activity if already held
 
         :param leg: The portion of the XML that's activity
+        :param seen: The keys of the floor actions already held
+        :param days: The activities held by day (see _days), kept up to
+                     date with the days added, so a load builds it once
+        :return: The floor actions added
         """
         date = leg.find('legislative_day').get('date')
         dt = datetime.datetime(int(date[0:4]), int(date[4:6]),
@@ -73,21 +139,32 @@ class Session:
         _overview = {
             'header': leg.find('legislative_header').text,
             'lang': leg.find('language').text,
-            'time': dt.timestamp()
+            'time': dt.timestamp(),
+            'day': date
         }
 
         print('Legislative Action: {}'.format(dt))
 
-        _floor_actions = []
+        if days is None:
+            days = self._days()
+        activity = days.get(date)
+        if activity is None:
+            activity = {
+                'overview': _overview,
+                'floor_actions': []
+            }
+            self._activities.append(activity)
+            days[date] = activity
 
+        added = []
         actions = leg.find('floor_actions')
         for action in tqdm(actions.find_all('floor_action')):
             d = self._extract_floor_act(action, date)
-            _floor_actions.append(d)
-        self._activities.append({
-            'overview': _overview,
-            'floor_actions': _floor_actions
-        })
+            if _action_key(d) in seen:
+                continue
+            activity['floor_actions'].append(d)
+            added.append(d)
+        return added
 
     def _extract_floor_act(self, action, date):
         """
@@ -123,16 +200,40 @@ class Session:
 
     def to_json(self):
         """
-        Dumps the legislative session to a JSON file
+        Dumps the legislative session to a JSON file,
+        unless the file already holds it
+
+        :return: The change record, or None if unchanged (see persist.write_json)
         """
         filename = self._sources['xml'].replace('.xml', '.json')
         self._sources['json'] = self.ROOT_DIR + 'json/' + filename
 
-        json.dump({
+        return write_json(self._sources['json'], {
             'sources': self._sources,
             'overview': self._overview,
             'activities': self._activities
-        }, open(self._sources['json'], 'w+'))
+        }, kind='session', key=filename.replace('.json', ''))
+
+    def get_links(self, actions=None):
+        """
+        The bills and votes taken up on the floor
+
+        :param actions: Only these floor actions (default: all)
+        :return: List of (kind, url), kind 'bill' or 'vote'
+        """
+        if actions is None:
+            actions = [fa for act in self._activities for fa in act['floor_actions']]
+
+        links = []
+        for fl in actions:
+            item = fl['item']
+            if not item or not item['link']:
+                continue
+            if item['type'] == 'bill' and bill_key(item['link']):
+                links.append(('bill', bill_url(bill_key(item['link']))))
+            elif item['type'] == 'vote' and 'clerk.house.gov' in item['link']:
+                links.append(('vote', item['link']))
+        return links
 
     def from_json(self, f):
         """
@@ -146,3 +247,21 @@ class Session:
 
     def __repr__(self):
         return 'US House: {}'.format(self._overview)
+
+
+def ingest_floor(floor, force_reload=True):
+    """
+    Brings a floor proceedings file up to date, parsing
+    only what isn't already stored (see Session.load)
+
+    :param floor: The file name, e.g. 'HDoc-116-1-FloorProceedings.xml'
+    :param force_reload: Whether to download the file again - bool
+    :return: (the Session, the floor actions added)
+    """
+    path = Session.ROOT_DIR + 'json/' + floor.replace('.xml', '.json')
+    if not os.path.exists(path):
+        session = Session(url=floor, force_reload=force_reload)
+        return session, [fa for act in session._activities for fa in act['floor_actions']]
+
+    session = Session(filename=path)
+    return session, session.load(force_reload=force_reload)
@@ -0,0 +1,131 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+import utils
+import workqueue
+from workqueue import WorkQueue, canonical_url, work, DONE, LEASED
+
+URL = 'https://clerk.house.gov/evs/2019/roll{:03d}.xml'
+
+# Where the fake parses log the pages they parsed
+PARSE_LOG = None
+
+
+def _slow_parse(kind, url):
+    """
+    Stands in for crawl._parse: every fifth page takes longer
+    than a lease, so only the heartbeat keeps it from being
+    leased to another worker
+    """
+    time.sleep(0.8 if int(url[-7:-4]) % 5 == 0 else 0.01)
+    with open(PARSE_LOG, 'a') as log:
+        log.write(url + '\n')
+    return [], 0.0, {}, None
+
+
+def _throttled_parse(kind, url):
+    """
+    Stands in for crawl._parse: makes one request's worth of
+    throttling, logging when the request would have been sent
+    """
+    utils.THROTTLE.wait(url)
+    with open(PARSE_LOG, 'a') as log:
+        log.write('{!r}\n'.format(time.time()))
+    return [], 0.0, {}, None
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.home = os.getcwd()
+        self.dir = tempfile.mkdtemp(prefix='house-workqueue-')
+        os.chdir(self.dir)
+        self.path = os.path.join(self.dir, 'queue.db')
+
+    def tearDown(self):
+        os.chdir(self.home)
+        shutil.rmtree(self.dir)
+
+    def test_expired_lease_is_reclaimed(self):
+        queue = WorkQueue(self.path, lease_seconds=0.1)
+        queue.push([('vote', URL.format(1))])
+
+        self.assertEqual(queue.lease('a'), [('vote', URL.format(1))])
+        self.assertEqual(queue.lease('b'), [])
+        time.sleep(0.2)
+        self.assertEqual(queue.lease('b'), [('vote', URL.format(1))])
+
+        # The first worker lost its lease; only the second can finish
+        self.assertFalse(queue.renew('a', URL.format(1)))
+        self.assertFalse(queue.complete('a', URL.format(1)))
+        self.assertTrue(queue.complete('b', URL.format(1)))
+        self.assertEqual(queue.stats()[DONE], {'vote': 1})
+
+    def test_canonical_url_keeps_scheme(self):
+        self.assertEqual(canonical_url('vote', URL.format(1).replace('https', 'http') + '#top'),
+                         'http://clerk.house.gov/evs/2019/roll001.xml')
+        self.assertEqual(canonical_url('vote', URL.format(1) + '/'), URL.format(1))
+
+    def test_workers_share_host_delay(self):
+        global PARSE_LOG
+        PARSE_LOG = os.path.join(self.dir, 'sent.log')
+        WorkQueue(self.path).push(('vote', URL.format(i)) for i in range(1, 13))
+
+        parse = workqueue._parse
+        workqueue._parse = _throttled_parse
+        try:
+            ctx = multiprocessing.get_context('fork')
+            procs = [ctx.Process(target=work, args=(self.path, 'worker-{}'.format(i)),
+                                 kwargs={'delay': 0.1, 'idle': 2.0})
+                     for i in range(3)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join(60)
+                self.assertEqual(p.exitcode, 0)
+        finally:
+            workqueue._parse = parse
+
+        with open(PARSE_LOG) as log:
+            sent = sorted(float(t) for t in log.read().split())
+        self.assertEqual(len(sent), 12)
+        # Three workers, yet one request to the host per delay:
+        # spaced per worker, the requests would span about 0.3s
+        self.assertGreaterEqual(sent[-1] - sent[0], 0.8)
+
+    def test_workers_complete_each_page_once(self):
+        global PARSE_LOG
+        PARSE_LOG = os.path.join(self.dir, 'parsed.log')
+        urls = [URL.format(i) for i in range(1, 41)]
+        WorkQueue(self.path).push(('vote', u) for u in urls)
+
+        parse = workqueue._parse
+        workqueue._parse = _slow_parse
+        try:
+            ctx = multiprocessing.get_context('fork')
+            procs = [ctx.Process(target=work, args=(self.path, 'worker-{}'.format(i)),
+                                 kwargs={'batch': 3, 'idle': 2.0, 'lease_seconds': 0.3})
+                     for i in range(4)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join(60)
+                self.assertEqual(p.exitcode, 0)
+        finally:
+            workqueue._parse = parse
+
+        with open(PARSE_LOG) as log:
+            parsed = log.read().split()
+        self.assertEqual(sorted(parsed), urls)
+
+        stats = WorkQueue(self.path).stats()
+        self.assertEqual(stats[DONE], {'vote': len(urls)})
+        self.assertEqual(stats[LEASED], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from bill import Bill
+from session import Session
+from vote import Vote
+from utils import bill_key, legis_key
+
+
+def _events(obj):
+    """
+    The dated events of a Bill, Session or Vote
+
+    :param obj: The object
+    :return: List of (timestamp, event dict)
+    """
+    events = []
+    if isinstance(obj, Bill):
+        key = obj.get_key()
+        for act in obj._actions:
+            events.append((act['datetime'], {
+                'type': 'action',
+                'chamber': act.get('chamber'),
+                'bill': key,
+                'desc': act['action']
+            }))
+        for act in obj._action_overview:
+            events.append((act['date'], {
+                'type': 'action overview',
+                'chamber': None,
+                'bill': key,
+                'desc': act['action']
+            }))
+    elif isinstance(obj, Session):
+        for act in obj._activities:
+            for fl in act['floor_actions']:
+                item = fl['item'] or {}
+                events.append((fl['time'], {
+                    'type': 'floor action',
+                    'chamber': 'House',
+                    'bill': bill_key(item.get('link')) if item.get('type') == 'bill' else None,
+                    'desc': fl['desc']
+                }))
+    elif isinstance(obj, Vote):
+        if 'datetime' in obj._votes:
+            events.append((obj._votes['datetime'], {
+                'type': 'vote',
+                'chamber': 'House',
+                'bill': legis_key(obj._congress.get('congress'),
+                                  obj._congress.get('legis_num')),
+                'desc': '{}: {}'.format(obj._votes.get('question'),
+                                        obj._votes.get('result')),
+                'url': obj._sources.get('url')
+            }))
+    return events
+
+
+class EventTimeline:
+
+    """
+    Every dated event of the corpus (bill actions, floor actions
+    and roll call votes) kept in time order, so any date range
+    is found by bisection rather than a scan
+    """
+
+    def __init__(self):
+        # Parallel, time-sorted arrays
+        self._times = []
+        self._events = []
+
+        # Bill key -> time-sorted list of (timestamp, event)
+        self._by_bill = defaultdict(list)
+
+        # Events added since the arrays were last merged
+        self._pending = []
+
+        # The objects indexed, and those removed but not yet compacted
+        self._sources = set()
+        self._removed = set()
+
+    def __contains__(self, obj):
+        return obj in self._sources
+
+    def __iter__(self):
+        return iter(list(self._sources))
+
+    def add(self, obj):
+        """
+        Adds the events of a Bill, Session or Vote.
+        They're merged into the sorted arrays on the next query,
+        so bulk loads are sorted once rather than inserted one by one.
+        """
+        self._sources.add(obj)
+        self._removed.discard(obj)
+        for t, ev in _events(obj):
+            ev['time'] = t
+            ev['source'] = obj
+            self._pending.append((t, ev))
+
+    def remove(self, obj):
+        """
+        Removes the events of an object; space is reclaimed lazily
+        """
+        if obj in self._sources:
+            self._sources.discard(obj)
+            self._removed.add(obj)
+
+    def _merge(self):
+        """
+        Merges pending events in and drops those of removed objects
+        """
+        if self._removed:
+            keep = [i for i, ev in enumerate(self._events)
+                    if ev['source'] not in self._removed]
+            self._times = [self._times[i] for i in keep]
+            self._events = [self._events[i] for i in keep]
+            for key in list(self._by_bill):
+                self._by_bill[key] = [e for e in self._by_bill[key]
+                                      if e[1]['source'] not in self._removed]
+            self._pending = [e for e in self._pending
+                             if e[1]['source'] not in self._removed]
+            self._removed = set()
+
+        if not self._pending:
+            return
+
+        self._pending.sort(key=lambda e: e[0])
+        if not self._times or self._pending[0][0] >= self._times[-1]:
+            self._times.extend(e[0] for e in self._pending)
+            self._events.extend(e[1] for e in self._pending)
+        else:
+            # Two sorted runs, which the sort merges in linear time
+            merged = list(zip(self._times, self._events)) + self._pending
+            merged.sort(key=lambda e: e[0])
+            self._times = [e[0] for e in merged]
+            self._events = [e[1] for e in merged]
+
+        touched = set()
+        for t, ev in self._pending:
+            if ev['bill']:
+                self._by_bill[ev['bill']].append((t, ev))
+                touched.add(ev['bill'])
+        for key in touched:
+            self._by_bill[key].sort(key=lambda e: e[0])
+
+        self._pending = []
+
+    def between(self, start=None, end=None, types=None, chamber=None, bill=None,
+                limit=None, after=None):
+        """
+        The events in a time range, oldest first
+
+        :param start: The first timestamp included - float (default: all)
+        :param end: The last timestamp included - float (default: all)
+        :param types: The event types to keep - collection of str
+        :param chamber: The chamber to keep - str
+        :param bill: The bill key to keep - str
+        :param limit: The most events to return - int
+        :param after: Where a previous page stopped, as (timestamp, the
+                      number of events at that timestamp it returned);
+                      see next_cursor
+        :return: List of event dicts
+        """
+        self._merge()
+
+        if bill:
+            series = self._by_bill.get(bill, [])
+            times = [e[0] for e in series]
+            events = [e[1] for e in series]
+        else:
+            times = self._times
+            events = self._events
+
+        return select(times, events, start, end, types, chamber, limit, after)
+
+
+def select(times, events, start=None, end=None, types=None, chamber=None,
+           limit=None, after=None):
+    """
+    A page of time-sorted events (see EventTimeline.between)
+
+    :param times: The events' timestamps, sorted - sequence of float
+    :param events: The events, read only as far as the page goes
+                   - sequence of event dicts
+    :return: List of event dicts
+    """
+    lo = bisect_left(times, start) if start is not None else 0
+    hi = bisect_right(times, end) if end is not None else len(times)
+
+    skip = 0
+    if after is not None:
+        lo = max(lo, bisect_left(times, after[0]))
+        skip = after[1]
+
+    res = []
+    for i in range(lo, hi):
+        ev = events[i]
+        if types and ev['type'] not in types:
+            continue
+        if chamber and ev['chamber'] != chamber:
+            continue
+        if skip and times[i] == after[0]:
+            skip -= 1
+            continue
+        res.append(ev)
+        if limit is not None and len(res) >= limit:
+            break
+    return res
+
+
+def next_cursor(events, after=None):
+    """
+    Where the next page starts after a page of events (see EventTimeline.between)
+
+    :param events: The page, oldest first
+    :param after: The cursor the page was read from
+    :return: (timestamp, the number of events at that timestamp returned so far)
+    """
+    if not events:
+        return after
+    last = events[-1]['time']
+    n = sum(1 for ev in events if ev['time'] == last)
+    if after is not None and after[0] == last:
+        n += after[1]
+    return last, n
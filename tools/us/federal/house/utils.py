@@ -1,10 +1,154 @@
+import os
+import re
 import json
+import time
+import threading
 from glob import glob
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
 
 from tqdm import tqdm
 
 import requests
 
+from metrics import METRICS, page_type
+
+
+class ParseError(Exception):
+
+    """
+    Raised when a page doesn't have the markup its parser expects
+    """
+
+
+class CacheMiss(Exception):
+
+    """
+    Raised by download_file for a page not in the cache
+    while fetching is turned off (see CACHE_ONLY)
+    """
+
+
+# When True, download_file only reads the cache, e.g. in crawl's
+# parse workers, which are handed pages the fetchers have cached
+CACHE_ONLY = False
+
+# Statuses whose Retry-After header is honoured
+RETRY_STATUSES = (429, 503)
+
+
+class Throttle:
+
+    """
+    Spaces out the requests made to each host, across threads,
+    and holds a host's requests back while it has asked us to
+    wait (the Retry-After of a 429 or 503)
+    """
+
+    def __init__(self, delay=0.0):
+        """
+        :param delay: The least seconds between requests to a host - float
+        """
+        self.delay = delay
+        self._lock = threading.Lock()
+
+        # Host -> the earliest time of its next request
+        self._next = {}
+
+    def wait(self, url):
+        """
+        Waits for a request to a URL's host to be allowed,
+        reserving the slot after it for the next request
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next.get(host, 0.0))
+            self._next[host] = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def back_off(self, url, seconds):
+        """
+        Holds back requests to a URL's host for some seconds
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            self._next[host] = max(self._next.get(host, 0.0), time.time() + seconds)
+
+
+THROTTLE = Throttle()
+
+
+def retry_after(response):
+    """
+    The seconds a response asks us to wait, from its Retry-After header
+
+    :param response: requests.Response
+    :return: float, or None
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def origin_url(url):
+    """
+    The URL to request a page from: the page's own URL, or, when the
+    HOUSE_ORIGIN environment variable names another origin
+    (e.g. http://127.0.0.1:8000, a fixture server - see fixtureserver.py),
+    the same path and query on that origin.
+    Pages are still cached and keyed by their own URLs.
+
+    :param url: str
+    :return: str
+    """
+    origin = os.environ.get('HOUSE_ORIGIN')
+    if not origin:
+        return url
+    return re.sub(r'^https?://[^/]+', origin.rstrip('/'), url)
+
+
+def fetch(url):
+    """
+    Requests a page, from HOUSE_ORIGIN if set (see origin_url),
+    spacing out requests to each host (see THROTTLE)
+
+    :param url: str
+    :return: requests.Response
+    :raise requests.HTTPError: For an error status, after holding back
+                               the host for as long as it asked
+    """
+    url = origin_url(url)
+    THROTTLE.wait(url)
+    response = requests.get(url)
+    if response.status_code in RETRY_STATUSES:
+        wait = retry_after(response)
+        if wait:
+            THROTTLE.back_off(url, wait)
+    response.raise_for_status()
+    return response
+
+
+def write_cache(file, data):
+    """
+    Writes a page to the cache beside its path and atomically
+    swaps it in, so a crash never leaves a partial page
+    that would later be read as cached
+    """
+    tmp = '{}.{}.{}.tmp'.format(file, os.getpid(), threading.get_ident())
+    with open(tmp, 'w+') as out_file:
+        out_file.write(data)
+    os.replace(tmp, file)
+
 
 def download_file(url, file, force_reload=False):
     """
@@ -17,16 +161,29 @@ def download_file(url, file, force_reload=False):
                          (default: False)
     :return: The data downloaded
     """
+    page = page_type(file)
     try:
         if force_reload:
             raise FileNotFoundError
 
         with open(file, 'r+') as in_file:
             data = in_file.read()
+        METRICS.inc('house_cache_requests_total', page=page, result='hit')
     except FileNotFoundError:
-        data = requests.get(url).text
-        with open(file, 'w+') as out_file:
-            out_file.write(data)
+        METRICS.inc('house_cache_requests_total', page=page, result='miss')
+        if CACHE_ONLY:
+            raise CacheMiss('{} is not cached at {}'.format(url, file))
+        try:
+            with METRICS.timer('house_fetch_seconds', page=page):
+                response = fetch(url)
+        except Exception as e:
+            METRICS.inc('house_fetch_errors_total', page=page, error=type(e).__name__)
+            raise
+        data = response.text
+        METRICS.inc('house_bytes_in_total', len(response.content), page=page)
+
+        write_cache(file, data)
+        METRICS.inc('house_bytes_out_total', len(data.encode()), page=page, target='cache')
 
     return data
 
@@ -117,8 +274,7 @@ def get_vote_urls():
                     if fl['item']['type'] == 'vote':
                         v = fl['item']['link']
                         if 'clerk.house.gov' not in v:
-                            import pdb
-                            pdb.set_trace()
+                            print('Skipping unknown vote link {}'.format(v))
                         else:
                             new_urls.add(v)
 
@@ -126,6 +282,101 @@ def get_vote_urls():
     return new_urls, old_urls
 
 
+def bill_key(url):
+    """
+    The canonical key of a bill from any of its congress.gov URLs,
+    e.g. '/bill/116th-congress/house-bill/123/all-info' -> '116-house-bill-123'
+
+    :param url: The bill URL, absolute or relative - str
+    :return: The key, or None if the URL isn't a bill's
+    """
+    m = re.search(r'/bill/(\d+)[a-z]{2}-congress/([a-z-]+)/(\d+)', url or '')
+    if not m:
+        return None
+    return '{}-{}-{}'.format(*m.groups())
+
+
+# Roll call legislation number prefixes -> congress.gov bill types
+LEGIS_TYPES = [
+    ('H CON RES', 'house-concurrent-resolution'),
+    ('H J RES', 'house-joint-resolution'),
+    ('H RES', 'house-resolution'),
+    ('H R', 'house-bill'),
+    ('S CON RES', 'senate-concurrent-resolution'),
+    ('S J RES', 'senate-joint-resolution'),
+    ('S RES', 'senate-resolution'),
+    ('S', 'senate-bill')
+]
+
+
+def ordinal(n):
+    """
+    The ordinal of a number, e.g. 116 -> '116th', 101 -> '101st'
+    """
+    n = int(n)
+    if 10 <= n % 100 <= 20:
+        return '{}th'.format(n)
+    return '{}{}'.format(n, {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th'))
+
+
+def bill_url(key):
+    """
+    The congress.gov all-info URL of a bill key (see bill_key),
+    e.g. '116-house-bill-123' ->
+    'https://www.congress.gov/bill/116th-congress/house-bill/123/all-info'
+
+    :param key: The bill key - str
+    :return: str
+    """
+    congress, rest = key.split('-', 1)
+    tp, num = rest.rsplit('-', 1)
+    return 'https://www.congress.gov/bill/{}-congress/{}/{}/all-info'.format(
+        ordinal(congress), tp, num)
+
+
+def legis_key(congress, legis_num):
+    """
+    The canonical bill key of a roll call's legislation number,
+    e.g. (116, 'H R 123') -> '116-house-bill-123'
+
+    :param congress: The congress - int or str
+    :param legis_num: The legis-num of the vote - str
+    :return: The key, or None if it isn't a bill (e.g. 'MOTION')
+    """
+    parts = (legis_num or '').split()
+    if len(parts) < 2 or not parts[-1].isdigit():
+        return None
+    prefix = ' '.join(parts[:-1])
+    for code, tp in LEGIS_TYPES:
+        if prefix == code:
+            return '{}-{}-{}'.format(congress, tp, parts[-1])
+    return None
+
+
+def title_key(congress, title):
+    """
+    The canonical bill key of a bill's title,
+    e.g. (116, 'H.Con.Res.5') -> '116-house-concurrent-resolution-5'
+
+    :param congress: The congress - int or str
+    :param title: The title, as in Bill.title - str
+    :return: The key, or None if it isn't recognised
+    """
+    return legis_key(congress, (title or '').replace('.', ' ').upper())
+
+
+def party_initial(text):
+    """
+    The party initial of a congress.gov display name,
+    e.g. 'Rep. Evans, Dwight [D-PA-3]' -> 'D'
+
+    :param text: str
+    :return: str, or None if the name carries no party
+    """
+    m = re.search(r'\[([A-Z]+)-', text or '')
+    return m.group(1)[:1] if m else None
+
+
 def get_jsons(path, pattern='json/*.json'):
     """
     Given a path, extracts all the JSON files
@@ -134,3 +385,43 @@ def get_jsons(path, pattern='json/*.json'):
     :return: The list of JSON paths
     """
     return list(glob(path + pattern))
+
+
+class UnionFind:
+
+    """
+    Disjoint sets over hashable items, with path compression
+    """
+
+    def __init__(self):
+        self._parent = {}
+
+    def find(self, x):
+        """
+        Returns the representative of x's set, adding x if unseen
+        """
+        root = self._parent.setdefault(x, x)
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while x != root:
+            parent = self._parent[x]
+            self._parent[x] = root
+            x = parent
+        return root
+
+    def union(self, a, b):
+        """
+        Merges the sets of a and b
+        """
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self._parent[rb] = ra
+
+    def groups(self):
+        """
+        Returns the sets as a dict of representative -> list of items
+        """
+        res = {}
+        for x in list(self._parent):
+            res.setdefault(self.find(x), []).append(x)
+        return res
@@ -5,7 +5,9 @@ from collections import defaultdict
 
 from bs4 import BeautifulSoup
 
-from utils import download_file, get_vote_urls
+from utils import download_file, get_vote_urls, ParseError
+from persist import write_json
+from metrics import METRICS, loader, extractor
 
 
 class Vote:
@@ -17,6 +19,9 @@ class Vote:
 
     ROOT_DIR = 'data/us/federal/house/votes/'
 
+    # The JSONs of a single congress
+    SHARD_PATTERN = 'json/house_{}_*.json'
+
     def __init__(self, url=None, filename=None):
 
         self._congress = {}
@@ -42,6 +47,7 @@ class Vote:
                                              self._votes['totals']['totals']['Nay'],
                                              self._votes['result'])
 
+    @loader('vote')
     def load_from_url(self, url, force_reload=False):
         """
         Given a URL, this will generate the values
@@ -56,7 +62,8 @@ class Vote:
         self._sources['xml'] = self.ROOT_DIR + 'web/' + cache
 
         xml = download_file(self._sources['url'], self._sources['xml'], force_reload)
-        soup = BeautifulSoup(xml, 'xml')
+        with METRICS.timer('house_extract_seconds', page='vote', step='soup'):
+            soup = BeautifulSoup(xml, 'xml')
 
         try:
             self._congress['majority'] = soup.find('majority').text
@@ -73,6 +80,7 @@ class Vote:
 
         self.to_json()
 
+    @extractor('vote')
     def _extract_congressional_info(self, soup):
         """
         Extracts the available congressional information
@@ -82,8 +90,7 @@ class Vote:
         try:
             self._congress['majority'] = soup.find('majority').text
         except AttributeError:
-            import pdb
-            pdb.set_trace()
+            raise ParseError('No majority in {}'.format(self._sources['url']))
         self._congress['congress'] = soup.find('congress').text
         self._congress['session'] = soup.find('session').text
         self._congress['legis_num'] = soup.find('legis-num').text
@@ -96,6 +103,7 @@ class Vote:
             # a committee for some reason
             self._congress['chamber'] = soup.find('committee').text
 
+    @extractor('vote')
     def _extract_basic_vote(self, soup):
         """
         Extracts the basic information from the vote
@@ -107,6 +115,7 @@ class Vote:
         self._votes['result'] = soup.find('vote-result').text
         self._votes['desc'] = soup.find('vote-desc').text
 
+    @extractor('vote')
     def _extract_totals(self, soup):
         """
         Extracts the vote totals
@@ -130,6 +139,7 @@ class Vote:
             'Not Voting': int(totals.find('not-voting-total').text)
         }
 
+    @extractor('vote')
     def _extract_votes(self, soup):
         """
         Extracts the vote
@@ -141,6 +151,7 @@ class Vote:
             leg = v.find('legislator')
             vot = v.find('vote')
             self._votes['recorded'].append({
+                'name_id': leg.get('name-id'),
                 'party': leg.get('party'),
                 'role': leg.get('role'),
                 'state': leg.get('state'),
@@ -148,6 +159,7 @@ class Vote:
                 'vote': vot.text
             })
 
+    @extractor('vote')
     def _process_datetime(self, soup):
         """
         Extracts the time of the vote
@@ -169,16 +181,19 @@ class Vote:
 
     def to_json(self):
         """
-        Dumps the Bill to a JSON readable format
+        Dumps the Vote to a JSON readable format,
+        unless the file already holds it
+
+        :return: The change record, or None if unchanged (see persist.write_json)
         """
         filename = 'house_{}_{}.json'.format(self._congress['congress'],
                                              self._congress['legis_num'].replace(' ', ''))
         self._sources['json'] = self.ROOT_DIR + 'json/' + filename
-        json.dump({
+        return write_json(self._sources['json'], {
             'congress': self._congress,
             'votes': self._votes,
             'sources': self._sources
-        }, open(self.ROOT_DIR + 'json/' + filename, 'w+'))
+        }, kind='vote', key=filename.replace('.json', ''))
 
     def from_json(self, filename):
         """
@@ -200,3 +215,6 @@ if __name__ == '__main__':
     new, old = get_vote_urls()
     for f in tqdm(new):
         v = Vote(url=f)
+
+    from image import update_image
+    update_image()
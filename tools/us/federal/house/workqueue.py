@@ -0,0 +1,458 @@
+"""
+A crawl work queue shared by workers on several hosts.
+
+The queue is a SQLite file on storage every host can lock, and
+the pages each worker fetches land in the shared data/ tree, so
+run the workers from a directory where data/ is the shared mount:
+
+    python workqueue.py seed --floor HDoc-116-1-FloorProceedings.xml
+    python workqueue.py work -w 4 --delay 1
+    python workqueue.py status
+
+Workers lease pages for a while; a page whose worker dies is leased
+again once its lease runs out. Pages are deduplicated by canonical
+URL, retried on failure and set aside after too many failures.
+Requests to each host are spaced out across every worker through
+the queue (see SharedThrottle).
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from urllib.parse import urlsplit
+from multiprocessing import Process
+
+import utils
+
+from session import Session, ingest_floor
+
+from crawl import KINDS, ROOT_URL, _parse
+from utils import Throttle, get_jsons, bill_key, bill_url
+from metrics import METRICS, Metrics
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def canonical_url(kind, url):
+    """
+    The one URL a page is queued under, whatever form it was linked by.
+    The scheme is kept, as stored pages (e.g. clerk votes, see
+    utils.get_vote_urls) are keyed by the URL they were linked by.
+
+    :param kind: 'bill', 'rep' or 'vote'
+    :param url: str
+    :return: str
+    """
+    if kind == 'bill' and bill_key(url):
+        return bill_url(bill_key(url))
+    url = url.split('#')[0].split('?')[0].rstrip('/')
+    if url.startswith('/'):
+        url = ROOT_URL + url
+    return url
+
+
+class WorkQueue:
+
+    """
+    A queue of pages to crawl kept in a SQLite file, with leases,
+    retries and deduplication by canonical URL.  Every operation is
+    a short transaction, so any number of processes can share it.
+    """
+
+    PATH = 'data/us/federal/house/crawl/queue.db'
+
+    def __init__(self, path=PATH, lease_seconds=300, max_attempts=3):
+        self._path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                expires REAL,
+                error TEXT,
+                updated REAL
+            )""")
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS pages_state ON pages (state, expires)')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS hosts (
+                host TEXT PRIMARY KEY,
+                next REAL NOT NULL
+            )""")
+
+    def push(self, links):
+        """
+        Queues pages not already queued
+
+        :param links: An iterable of (kind, url)
+        :return: The number of pages newly queued
+        """
+        now = time.time()
+        rows = {canonical_url(k, u): k for k, u in links if k in KINDS}
+        cur = self._db.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            before = self._db.total_changes
+            cur.executemany(
+                'INSERT OR IGNORE INTO pages (url, kind, state, updated) VALUES (?, ?, ?, ?)',
+                [(u, k, QUEUED, now) for u, k in rows.items()])
+            added = self._db.total_changes - before
+        except BaseException:
+            cur.execute('ROLLBACK')
+            raise
+        cur.execute('COMMIT')
+        return added
+
+    def lease(self, owner, n=1):
+        """
+        Leases the next pages: those queued, and those
+        whose lease expired without being completed
+
+        :param owner: The worker's ID - str
+        :param n: The most pages to lease - int
+        :return: List of (kind, url)
+        """
+        now = time.time()
+        cur = self._db.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            rows = cur.execute(
+                'SELECT url, kind FROM pages WHERE state = ? OR (state = ? AND expires < ?) '
+                'ORDER BY attempts, updated LIMIT ?',
+                (QUEUED, LEASED, now, n)).fetchall()
+            cur.executemany(
+                'UPDATE pages SET state = ?, owner = ?, expires = ?, updated = ? WHERE url = ?',
+                [(LEASED, owner, now + self.lease_seconds, now, url) for url, _ in rows])
+        except BaseException:
+            cur.execute('ROLLBACK')
+            raise
+        cur.execute('COMMIT')
+        return [(kind, url) for url, kind in rows]
+
+    def renew(self, owner, url):
+        """
+        Extends a lease still held
+
+        :return: True if the lease was still held
+        """
+        now = time.time()
+        cur = self._db.execute(
+            'UPDATE pages SET expires = ? WHERE url = ? AND state = ? AND owner = ?',
+            (now + self.lease_seconds, url, LEASED, owner))
+        return cur.rowcount == 1
+
+    def complete(self, owner, url, links=()):
+        """
+        Marks a leased page done and queues the pages it links to
+
+        :param owner: The worker's ID - str
+        :param url: The canonical URL - str
+        :param links: An iterable of (kind, url)
+        :return: True if the lease was still held
+        """
+        # Queue the links first, so a crash in between can't lose them
+        self.push(links)
+        cur = self._db.execute(
+            'UPDATE pages SET state = ?, owner = NULL, error = NULL, updated = ? '
+            'WHERE url = ? AND state = ? AND owner = ?',
+            (DONE, time.time(), url, LEASED, owner))
+        return cur.rowcount == 1
+
+    def fail(self, owner, url, error):
+        """
+        Records a failed attempt at a leased page; it's queued
+        again until it has failed max_attempts times
+
+        :return: The page's new state, or None if the lease was lost
+        """
+        cur = self._db.execute(
+            'UPDATE pages SET attempts = attempts + 1, owner = NULL, error = ?, updated = ?, '
+            'state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END '
+            'WHERE url = ? AND state = ? AND owner = ?',
+            ('{}: {}'.format(type(error).__name__, error), time.time(),
+             self.max_attempts, FAILED, QUEUED, url, LEASED, owner))
+        if cur.rowcount != 1:
+            return None
+        return self._db.execute('SELECT state FROM pages WHERE url = ?', (url,)).fetchone()[0]
+
+    def retry_failed(self):
+        """
+        Queues every failed page again
+
+        :return: The number of pages queued
+        """
+        cur = self._db.execute(
+            'UPDATE pages SET state = ?, attempts = 0, updated = ? WHERE state = ?',
+            (QUEUED, time.time(), FAILED))
+        return cur.rowcount
+
+    def reserve(self, host, delay):
+        """
+        Reserves the next request to a host, at least delay seconds
+        after the last request reserved by any worker
+
+        :param host: The host, e.g. 'www.congress.gov' - str
+        :param delay: The least seconds between requests to it - float
+        :return: (the time of the request, now); wait until the former
+        """
+        now = time.time()
+        cur = self._db.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            row = cur.execute('SELECT next FROM hosts WHERE host = ?', (host,)).fetchone()
+            start = max(now, row[0] if row else 0.0)
+            cur.execute('INSERT OR REPLACE INTO hosts (host, next) VALUES (?, ?)',
+                        (host, start + delay))
+        except BaseException:
+            cur.execute('ROLLBACK')
+            raise
+        cur.execute('COMMIT')
+        return start, now
+
+    def hold_host(self, host, until):
+        """
+        Holds back every worker's requests to a host until a time,
+        e.g. when it answered with a Retry-After
+        """
+        self._db.execute(
+            'INSERT INTO hosts (host, next) VALUES (?, ?) '
+            'ON CONFLICT (host) DO UPDATE SET next = MAX(next, excluded.next)',
+            (host, until))
+
+    def stats(self):
+        """
+        The number of pages by state, and by kind within state
+
+        :return: dict
+        """
+        res = {s: {} for s in (QUEUED, LEASED, DONE, FAILED)}
+        for state, kind, n in self._db.execute(
+                'SELECT state, kind, COUNT(*) FROM pages GROUP BY state, kind'):
+            res[state][kind] = n
+        return res
+
+    def failures(self):
+        """
+        The failed pages and their last errors
+
+        :return: List of (kind, url, error)
+        """
+        return self._db.execute(
+            'SELECT kind, url, error FROM pages WHERE state = ? ORDER BY url',
+            (FAILED,)).fetchall()
+
+
+class Heartbeat:
+
+    """
+    Renews a worker's leases from a background thread while it works
+    through them, so a slow page isn't leased to another worker.
+    The thread has its own connection to the queue.
+    """
+
+    def __init__(self, path, owner, lease_seconds):
+        """
+        :param path: The queue's path - str
+        :param owner: The worker's ID - str
+        :param lease_seconds: The queue's lease length; leases are
+                              renewed three times per lease - float
+        """
+        self._path = path
+        self._owner = owner
+        self._lease_seconds = lease_seconds
+        self._urls = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def hold(self, url):
+        with self._lock:
+            self._urls.add(url)
+
+    def drop(self, url):
+        with self._lock:
+            self._urls.discard(url)
+
+    def _run(self):
+        queue = WorkQueue(self._path, lease_seconds=self._lease_seconds)
+        while not self._stop.wait(self._lease_seconds / 3):
+            with self._lock:
+                urls = list(self._urls)
+            for url in urls:
+                if not queue.renew(self._owner, url):
+                    # The lease ran out and was taken; stop claiming it
+                    self.drop(url)
+
+
+class SharedThrottle(Throttle):
+
+    """
+    A utils.Throttle that spaces out the requests made to each host
+    across every worker sharing a queue, rather than within one process.
+    The hosts' next request times are kept in the queue, so the workers'
+    clocks should agree to within the delay.
+    """
+
+    def __init__(self, queue, delay=0.0):
+        """
+        :param queue: The WorkQueue; used from the thread that made it
+        :param delay: The least seconds between requests to a host - float
+        """
+        super().__init__(delay)
+        self._queue = queue
+
+    def wait(self, url):
+        start, now = self._queue.reserve(urlsplit(url).netloc, self.delay)
+        if start > now:
+            time.sleep(start - now)
+
+    def back_off(self, url, seconds):
+        self._queue.hold_host(urlsplit(url).netloc, time.time() + seconds)
+
+
+def work(path, owner, delay=0.0, batch=1, idle=5.0, limit=None, lease_seconds=300):
+    """
+    Runs a worker: leases pages, fetches and parses them,
+    and queues what they link to, until the queue is drained
+
+    :param path: The queue's path - str
+    :param owner: The worker's ID - str
+    :param delay: The least seconds between requests to a host,
+                  across every worker of the queue - float
+    :param batch: Pages to lease at a time - int
+    :param idle: Seconds to wait for pages leased by others
+                 to finish or expire before stopping - float
+    :param limit: Stop after this many pages - int
+    :param lease_seconds: How long pages are leased for; a heartbeat
+                          renews the leases of the pages in hand - float
+    :return: The number of pages parsed and failed; the worker's
+             metrics are exported as metrics/workqueue-<owner>
+    """
+    queue = WorkQueue(path, lease_seconds=lease_seconds)
+    # Pages are fetched through utils.fetch, which waits on utils.THROTTLE
+    throttle, utils.THROTTLE = utils.THROTTLE, SharedThrottle(queue, delay)
+    try:
+        return _work(queue, owner, batch, idle, limit, lease_seconds)
+    finally:
+        utils.THROTTLE = throttle
+
+
+def _work(queue, owner, batch, idle, limit, lease_seconds):
+    # _parse resets the metrics of each page, so they're gathered here
+    totals = Metrics()
+    parsed = failed = 0
+    waited = 0.0
+    with Heartbeat(queue._path, owner, lease_seconds) as heartbeat:
+        while limit is None or parsed + failed < limit:
+            pages = queue.lease(owner, batch)
+            if not pages:
+                if not queue.stats()[LEASED] or waited >= idle:
+                    break
+                time.sleep(1)
+                waited += 1
+                continue
+            waited = 0.0
+
+            for kind, url in pages:
+                heartbeat.hold(url)
+            for kind, url in pages:
+                try:
+                    links, _, _, error = _parse(kind, url)
+                    if error:
+                        raise error
+                except Exception as e:
+                    totals.inc('house_crawl_errors_total', page=kind, error=type(e).__name__)
+                    state = queue.fail(owner, url, e)
+                    failed += 1
+                    if state == FAILED:
+                        print('{}: gave up on {} ({}: {})'.format(owner, url, type(e).__name__, e))
+                else:
+                    queue.complete(owner, url, links)
+                    parsed += 1
+                heartbeat.drop(url)
+                totals.merge(METRICS.snapshot())
+    totals.export('workqueue-{}'.format(owner))
+    return parsed, failed
+
+
+def _worker(path, owner, delay, batch, limit):
+    parsed, failed = work(path, owner, delay=delay, batch=batch, limit=limit)
+    print('{}: parsed {}, failed {}'.format(owner, parsed, failed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shared crawl work queue')
+    parser.add_argument('--queue', default=WorkQueue.PATH)
+    sub = parser.add_subparsers(dest='command')
+
+    seed = sub.add_parser('seed', help='Queue the pages linked from floor sessions')
+    seed.add_argument('--floor', action='append', default=[],
+                      help='Floor proceedings to seed from, e.g. HDoc-116-1-FloorProceedings.xml')
+
+    run = sub.add_parser('work', help='Run workers on this host')
+    run.add_argument('-w', '--workers', type=int, default=1)
+    run.add_argument('--delay', type=float, default=0.0,
+                     help='Least seconds between requests to a host, across all workers')
+    run.add_argument('--batch', type=int, default=1)
+    run.add_argument('-n', '--limit', type=int, default=None,
+                     help='Pages per worker')
+    run.add_argument('--no-image', action='store_true',
+                     help="Don't rewrite the corpus image when done")
+
+    sub.add_parser('status', help='Show the queue')
+    sub.add_parser('retry', help='Queue the failed pages again')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    if args.command == 'seed':
+        links = []
+        for f in get_jsons(Session.ROOT_DIR):
+            links += Session(filename=f).get_links()
+        for floor in args.floor:
+            session, actions = ingest_floor(floor)
+            links += session.get_links(actions)
+        print('Queued {} new pages.'.format(queue.push(links)))
+    elif args.command == 'work':
+        host = socket.gethostname()
+        start = time.perf_counter()
+        procs = [Process(target=_worker, args=(args.queue, '{}-{}-{}'.format(host, os.getpid(), i),
+                                               args.delay, args.batch, args.limit))
+                 for i in range(args.workers)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        print('Finished in {:.1f}s.'.format(time.perf_counter() - start))
+        if not args.no_image:
+            from image import update_image
+            update_image()
+    elif args.command == 'retry':
+        print('Queued {} failed pages again.'.format(queue.retry_failed()))
+
+    for state, kinds in queue.stats().items():
+        print('{:<7} {}'.format(state, ', '.join(
+            '{} {}s'.format(n, k) for k, n in sorted(kinds.items())) or '-'))
+    if args.command == 'status':
+        for kind, url, error in queue.failures():
+            print('Failed {} {} ({})'.format(kind, url, error))